@@ -0,0 +1,27 @@
+# Gunicorn settings, read automatically when gunicorn starts in this directory:
+#   gunicorn myBackend.wsgi:application
+
+import multiprocessing
+
+# Load Django once in the master so workers fork with it already imported
+preload_app = True
+
+# Each open /api/events/ stream holds a thread for as long as the browser stays
+# connected, so use threaded workers: with the default sync worker one stream
+# would take a whole worker. Events go through the change_events table, so
+# every worker's streams see every write (myapp/events.py).
+worker_class = 'gthread'
+workers = multiprocessing.cpu_count() * 2 + 1
+threads = 32
+
+
+def post_worker_init(worker):
+    # Runs in each worker before it accepts requests: open its own DB
+    # connections and fill its caches so the first request is not slow
+    from myapp.warmup import warm_up
+    warm_up(logger=worker.log)
+    # With hot SKUs configured, start the reservation thread now rather than on the
+    # first hot sale: it also reclaims the holds of workers that crashed
+    from myapp.reservations import hot_products, pool
+    if hot_products():
+        pool.start()
@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve through this module (e.g. ``uvicorn myBackend.asgi:application``) when
+many clients use the /api/events/ Server-Sent Events stream, so that
+long-lived connections wait on the event loop instead of tying up worker
+threads (under gunicorn's WSGI workers each stream holds a thread; see
+gunicorn.conf.py). Events reach every worker process through the
+change_events outbox, so any number of workers can be run.
 """
 
 import os
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +47,10 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Add this FIRST
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'myapp.middleware.RateLimitMiddleware',  # Per-client rate limits and heavy-endpoint admission control
+    'myapp.middleware.ReadReplicaMiddleware',  # get_* endpoints read from replicas; writers stay on the primary briefly
+    'myapp.middleware.ProfilingMiddleware',  # cProfile + SQL log for requests with X-Profile or sampled ones
+    'myapp.middleware.SlowQueryMiddleware',  # Tags slow-query log entries with the view that ran them
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -86,8 +92,60 @@ DATABASES = {
     }
 }
 
+# Inventory sharding (myapp/sharding.py)
+# List database aliases here to split the inventory table across databases by
+# warehouse, e.g. ['inventory_shard_0', 'inventory_shard_1'] with matching
+# entries in DATABASES. Warehouses go to shard warehouse_id % len(shards)
+# unless pinned in INVENTORY_SHARD_MAP ({warehouse_id: alias}). Run
+# database/create_id_sequences_table.sql once, then
+# `python manage.py setup_inventory_shards` after adding a shard.
+INVENTORY_SHARDS = []
+INVENTORY_SHARD_MAP = {}
+
+# Read replicas (myapp/replicas.py)
+# Aliases in DATABASES that replicate 'default'. GET requests to get_* endpoints
+# read from them; run `python manage.py replica_heartbeat` against the primary
+# so replica lag can be measured.
+READ_REPLICAS = []
+# Replicas of each inventory shard, e.g. {'inventory_shard_0': ['inventory_shard_0_replica']}.
+# Fanned-out inventory reads use them the same way; `setup_inventory_shards`
+# creates the heartbeat table on replicated shards.
+SHARD_READ_REPLICAS = {}
+REPLICA_MAX_LAG_SECONDS = 10     # Replicas further behind than this are skipped
+REPLICA_LAG_CHECK_INTERVAL = 2   # Seconds between lag checks of each replica
+READ_YOUR_WRITES_SECONDS = 5     # How long a client reads from the primary after a write
+
+# Local replica testing with two SQLite files: primary.sqlite3 and replica.sqlite3.
+# Copy primary.sqlite3 over replica.sqlite3 to "replicate".
+if os.environ.get('LOCAL_SQLITE_REPLICA'):
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'primary.sqlite3'},
+        'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'},
+    }
+    READ_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['myapp.sharding.WarehouseShardRouter', 'myapp.replicas.ReadReplicaRouter']
+
+
 
 
+# Cache
+# Holds the data-version counters and pre-compressed bodies of cached read
+# endpoints (myapp/response_cache.py); the SKU index (myapp/sku_index.py) also
+# rebuilds from these versions. Every web worker, run_jobs and the management
+# commands must share it, so the default is a table in the database: create it
+# once with `python manage.py createcachetable`. Redis is faster if available:
+#   CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#                         'LOCATION': 'redis://127.0.0.1:6379'}}
+# A per-process LocMemCache is only safe for a single process that does all the writes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'api_cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,6 +183,32 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Server-Sent Events (myapp/events.py): writers insert into the change_events
+# outbox and each process with open /api/events/ streams polls it
+EVENT_POLL_SECONDS = 0.5          # Delay before an event reaches the streams
+EVENT_RETENTION_SECONDS = 60 * 60  # Events kept for Last-Event-ID replay
+
+# Files written by background jobs (exports) and served by /api/jobs/<id>/result/
+JOB_RESULTS_DIR = BASE_DIR / 'job_results'
+JOB_RESULTS_MAX_AGE_DAYS = 7     # run_jobs deletes result and upload files older than this
+
+# GET paths each worker requests once at boot (myapp/warmup.py, gunicorn.conf.py)
+# so the cached read endpoints are primed before real traffic arrives
+WARMUP_PATHS = ['/api/products/', '/api/inventory/', '/api/categories/', '/api/suppliers/', '/api/warehouses/']
+
+# Request profiling (myapp/profiling.py)
+# Send `X-Profile: <PROFILING_TOKEN>` to profile one request; the token also
+# guards /api/profiles/ and /api/admin/slow-queries/. Leave it empty to disable header-triggered profiling.
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = 0.0      # Fraction of all requests profiled (0 = off)
+PROFILES_DIR = BASE_DIR / 'profiles'
+PROFILES_MAX_FILES = 50          # Oldest profiles are deleted beyond this
+
+# Slow-query log (myapp/slow_queries.py), read through /api/admin/slow-queries/
+SLOW_QUERY_LOG_ENABLED = True
+SLOW_QUERY_THRESHOLD_MS = 200    # Statements at least this slow are logged and explained
+SLOW_QUERY_LOG_SIZE = 200        # Entries kept per process; the oldest are dropped
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -135,3 +219,63 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+
+from corsheaders.defaults import default_headers
+
+CORS_ALLOW_HEADERS = (
+    *default_headers,
+    'idempotency-key',
+    'x-profile',
+    'if-match',
+)
+CORS_EXPOSE_HEADERS = ['ETag']  # Lets the frontend read the version to send back in If-Match
+
+# Idempotency keys for order and stock-mutating requests
+IDEMPOTENCY_CACHE_SIZE = 1000        # Responses kept in the in-process LRU
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60   # Seconds a stored response can be replayed
+IDEMPOTENCY_WAIT_SECONDS = 30        # How long a concurrent duplicate waits for the first request
+IDEMPOTENCY_CLAIM_TIMEOUT = 120      # Unfinished claims older than this (a dead worker's) are taken over
+
+# How create_order_item splits a quantity across warehouses when the request
+# does not name a policy: 'largest', 'fewest_splits' or 'preferred'
+ALLOCATION_POLICY = 'largest'
+
+# Reserved stock for hot SKUs (myapp/reservations.py, database/create_stock_reservation_tables.sql).
+# Sales of these products take units from a per-worker budget reserved in
+# blocks, and are written to inventory in batches instead of locking the row per sale.
+STOCK_RESERVATION_PRODUCTS = []         # Product IDs sold from reserved budgets (empty = off)
+STOCK_RESERVATION_BLOCK = 50            # Units a worker reserves at a time
+STOCK_RESERVATION_FLUSH_SECONDS = 0.5   # How often sold units are written to inventory
+STOCK_RESERVATION_LEASE_SECONDS = 30    # Reservations not renewed for this long are reclaimed by reconcile
+STOCK_RESERVATION_IDLE_SECONDS = 60     # Unused budgets are given back after this long
+STOCK_RESERVATION_WAIT_SECONDS = 5      # How long a sale waits for a refill before failing
+
+# Orders older than this many days are moved to the archive tables by
+# `python manage.py archive_orders` (--days overrides it). List endpoints only
+# read archived orders when their ?start= filter reaches back to the newest
+# archived order.
+ORDER_ARCHIVE_DAYS = 365
+
+# Rate limiting (myapp.middleware.RateLimitMiddleware)
+RATE_LIMIT_ENABLED = True
+RATE_LIMITS = {          # endpoint class -> (requests per second, burst) per client
+    'read': (20, 40),
+    'heavy': (2, 10),    # Full-table list endpoints
+    'write': (10, 20),
+}
+RATE_LIMIT_ENDPOINT_CLASSES = {}  # URL name -> 'read' / 'heavy' / 'write' / 'exempt' overrides
+HEAVY_REQUEST_CONCURRENCY = 4     # Heavy requests running at once before returning 503
+RATE_LIMIT_TRUST_FORWARDED_FOR = False  # Set True behind a trusted reverse proxy
+
+# `python manage.py test myapp` runs against throwaway SQLite databases whose
+# tables are created from the models (see myapp/test_runner.py): 'default' plus
+# two inventory shards that the sharding tests switch on with override_settings
+TEST_RUNNER = 'myapp.test_runner.UnmanagedModelTestRunner'
+if 'test' in sys.argv[1:2]:
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test.sqlite3'},
+        'inventory_shard_0': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test_shard_0.sqlite3'},
+        'inventory_shard_1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test_shard_1.sqlite3'},
+    }
+    MIGRATION_MODULES = {'myapp': None}  # 0001_initial predates the SQL-managed schema
+    RATE_LIMIT_ENABLED = False
@@ -0,0 +1,145 @@
+"""
+Multi-warehouse stock allocation for order items.
+
+allocate_stock() splits a requested quantity across the product's inventory
+rows according to a policy, decrements every chosen row with a conditional
+F() update and returns the plan, all inside the caller's transaction. The
+rows are locked in inventory_id order first, so concurrent allocations for
+the same product queue up instead of deadlocking. With warehouse shards the
+rows are locked shard by shard in alias order.
+
+Policies:
+- 'largest': take from the warehouses with the most stock first
+- 'fewest_splits': one warehouse if any can cover the whole quantity
+  (the smallest such row, keeping big piles intact), otherwise largest first
+- 'preferred': the requested warehouse first, then largest first
+
+Units reserved by hot-SKU workers (reservations.py) are still counted in
+inventory.quantity but are not available here: with reservations enabled
+every row's free quantity is its quantity minus its held units.
+"""
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .events import publish_inventory_change
+from .models import Inventory, StockReservation
+from .response_cache import bump_versions
+from .sharding import atomic_shards, shard_aliases
+
+POLICIES = ('largest', 'fewest_splits', 'preferred')
+
+
+class InsufficientStockError(Exception):
+    """Raised inside a transaction when stock cannot cover a decrement"""
+
+
+def default_policy():
+    return getattr(settings, 'ALLOCATION_POLICY', 'largest')
+
+
+def reservations_enabled():
+    return bool(getattr(settings, 'STOCK_RESERVATION_PRODUCTS', None))
+
+
+def held_quantities(rows):
+    """{inventory_id: units reserved by hot-SKU workers} for locked inventory rows.
+
+    Expired holds still count: part of them may be sold in journalled uses that
+    are not applied yet. reconcile(), run by every worker once per lease,
+    applies those and deletes the holds.
+    """
+    if not reservations_enabled() or not rows:
+        return {}
+    held = {}
+    # Locking read: the holds cannot change until this transaction ends
+    for inventory_id, reserved in (StockReservation.objects.select_for_update()
+                                   .filter(inventory_id__in=[row.inventory_id for row in rows])
+                                   .values_list('inventory_id', 'reserved')):
+        held[inventory_id] = held.get(inventory_id, 0) + reserved
+    return held
+
+
+def ensure_holds_covered(inventory, quantity=None, warehouse_id=None):
+    """Refuse a manual edit of a locked row that would leave its hot-SKU holds uncovered.
+
+    A worker keeps selling the units it holds, so the row's quantity may not
+    drop below them, and a row with holds may not move to another warehouse.
+    """
+    held = held_quantities([inventory]).get(inventory.inventory_id, 0)
+    if not held:
+        return
+    if warehouse_id is not None and warehouse_id != inventory.warehouse_id:
+        raise InsufficientStockError(
+            f"Inventory {inventory.inventory_id} has {held} units reserved for hot-SKU sales and cannot change warehouse")
+    if quantity is not None and quantity < held:
+        raise InsufficientStockError(
+            f"Inventory {inventory.inventory_id} has {held} units reserved for hot-SKU sales; "
+            f"its quantity cannot be set below that (requested {quantity})")
+
+
+def plan_allocation(rows, quantity, policy, preferred_warehouse_id=None, held=None):
+    """Pick (inventory, take) pairs covering quantity; rows are locked Inventory objects"""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown allocation policy '{policy}'. Use one of: {', '.join(POLICIES)}")
+    held = held or {}
+    free = {row.inventory_id: row.quantity - held.get(row.inventory_id, 0) for row in rows}
+    candidates = [row for row in rows if free[row.inventory_id] > 0]
+    largest_first = sorted(candidates, key=lambda row: (-free[row.inventory_id], row.inventory_id))
+
+    if policy == 'fewest_splits':
+        covering = [row for row in candidates if free[row.inventory_id] >= quantity]
+        if covering:
+            best = min(covering, key=lambda row: (free[row.inventory_id], row.inventory_id))
+            return [(best, quantity)]
+        ordered = largest_first
+    elif policy == 'preferred' and preferred_warehouse_id is not None:
+        preferred = [row for row in largest_first if row.warehouse_id == preferred_warehouse_id]
+        ordered = preferred + [row for row in largest_first if row.warehouse_id != preferred_warehouse_id]
+    else:
+        ordered = largest_first
+
+    plan = []
+    remaining = quantity
+    for row in ordered:
+        if remaining <= 0:
+            break
+        take = min(free[row.inventory_id], remaining)
+        plan.append((row, take))
+        remaining -= take
+    if remaining > 0:
+        available = sum(free[row.inventory_id] for row in candidates)
+        raise InsufficientStockError(f"Insufficient inventory. Available: {available}, Requested: {quantity}")
+    return plan
+
+
+def allocate_stock(product_id, quantity, policy=None, preferred_warehouse_id=None):
+    """Decrement stock for product_id across warehouses; returns [(inventory, taken)]"""
+    if quantity <= 0:
+        raise ValueError("Quantity must be greater than zero")
+    aliases = sorted(shard_aliases())
+    # The reservation holds live on 'default'; lock them in a transaction there too
+    with atomic_shards([*aliases, 'default'] if reservations_enabled() else aliases):
+        rows = []
+        # The product may be stocked on several warehouse shards; lock shard by shard
+        for alias in aliases:
+            # Stock changes through update(), which sends no signals; only this product's stock moves
+            bump_versions('inventory', using=alias, keys=[product_id])
+            rows.extend(Inventory.objects.using(alias).select_for_update()
+                        .filter(product_id=product_id)
+                        .order_by('inventory_id'))
+        if not rows:
+            raise InsufficientStockError(f"No inventory record found for product ID {product_id}")
+        held = held_quantities(rows)
+        plan = plan_allocation(rows, quantity, policy or default_policy(), preferred_warehouse_id, held)
+        for inventory, take in plan:
+            updated = Inventory.objects.using(inventory._state.db).filter(
+                pk=inventory.inventory_id, quantity__gte=take + held.get(inventory.inventory_id, 0)
+            ).update(quantity=F('quantity') - take, version=F('version') + 1,
+                     last_updated=timezone.now())  # update() skips auto_now; delta sync reads it
+            if not updated:
+                raise InsufficientStockError(f"Inventory {inventory.inventory_id} changed during allocation")
+            inventory.quantity -= take
+            publish_inventory_change(inventory)
+    return plan
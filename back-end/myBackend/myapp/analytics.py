@@ -0,0 +1,147 @@
+"""
+Inventory valuation and ABC classification.
+
+Stock value (quantity * cost_price) is summed per warehouse and per category
+by the database. The ABC split ranks products by revenue from the
+daily_product_sales rollup and classifies them on their cumulative share of
+revenue with NumPy: A up to 80%, B up to 95%, C for the rest.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # Only the ABC classification needs NumPy
+    np = None
+
+from .models import Category, DailyProductSales, Inventory, Product, Warehouse
+from .sharding import fan_out, sharding_enabled
+
+MONEY = DecimalField(max_digits=16, decimal_places=2)
+ABC_THRESHOLDS = (0.80, 0.95)  # Cumulative revenue share upper bounds for A and B
+
+
+def _sharded_valuation_rows():
+    """{(warehouse_id, category_id): (units, value)} when inventory lives on shard databases.
+
+    Products cannot be joined across databases, so each shard sums quantity per
+    (warehouse, product) and the cost and category are applied here.
+    """
+    costs = {p: (c or Decimal('0'), cat) for p, c, cat in Product.objects.values_list('product_id', 'cost_price', 'category_id')}
+    groups = {}
+    for warehouse_id, product_id, units in fan_out(
+            lambda qs: qs.values('warehouse_id', 'product_id').annotate(units=Sum('quantity'))
+            .values_list('warehouse_id', 'product_id', 'units')):
+        cost, category_id = costs.get(product_id, (Decimal('0'), None))
+        key = (warehouse_id, category_id)
+        old_units, old_value = groups.get(key, (0, Decimal('0')))
+        groups[key] = (old_units + (units or 0), old_value + (units or 0) * cost)
+    return groups
+
+
+def _grouped(groups, position):
+    totals = {}
+    for key, (units, value) in groups.items():
+        old_units, old_value = totals.get(key[position], (0, Decimal('0')))
+        totals[key[position]] = (old_units + units, old_value + value)
+    return [{'key': key, 'units': units, 'value': value}
+            for key, (units, value) in sorted(totals.items(), key=lambda item: -item[1][1])]
+
+
+def inventory_valuation():
+    """Units and stock value per warehouse and per category, aggregated in SQL"""
+    warehouse_names = dict(Warehouse.objects.values_list('warehouse_id', 'warehouse_name'))
+    category_names = dict(Category.objects.values_list('category_id', 'category_name'))
+
+    if sharding_enabled():
+        groups = _sharded_valuation_rows()
+        warehouse_rows = [{'warehouse_id': row['key'], 'units': row['units'], 'value': row['value']} for row in _grouped(groups, 0)]
+        category_rows = [{'category_id': row['key'], 'units': row['units'], 'value': row['value']} for row in _grouped(groups, 1)]
+    else:
+        warehouse_rows, category_rows = _valuation_rows()
+    return _valuation_document(warehouse_rows, category_rows, warehouse_names, category_names)
+
+
+def _valuation_rows():
+    product = Product.objects.filter(product_id=OuterRef('product_id'))
+    valued = Inventory.objects.annotate(
+        unit_cost=Coalesce(Subquery(product.values('cost_price')[:1], output_field=MONEY), Decimal('0'), output_field=MONEY),
+        category_id=Subquery(product.values('category_id')[:1], output_field=IntegerField()),
+    ).annotate(
+        stock_value=ExpressionWrapper(F('quantity') * F('unit_cost'), output_field=MONEY),
+    )
+
+    return (
+        valued.values('warehouse_id').annotate(units=Sum('quantity'), value=Sum('stock_value')).order_by('-value'),
+        valued.values('category_id').annotate(units=Sum('quantity'), value=Sum('stock_value')).order_by('-value'),
+    )
+
+
+def _valuation_document(warehouse_rows, category_rows, warehouse_names, category_names):
+    by_warehouse = [{
+        "warehouseId": row['warehouse_id'],
+        "warehouseName": warehouse_names.get(row['warehouse_id'], 'N/A'),
+        "units": row['units'] or 0,
+        "value": float(row['value'] or 0),
+    } for row in warehouse_rows]
+
+    by_category = [{
+        "categoryId": row['category_id'],
+        "categoryName": category_names.get(row['category_id'], 'N/A'),
+        "units": row['units'] or 0,
+        "value": float(row['value'] or 0),
+    } for row in category_rows]
+
+    return {
+        "totalValue": round(sum(row['value'] for row in by_warehouse), 2),
+        "totalUnits": sum(row['units'] for row in by_warehouse),
+        "byWarehouse": by_warehouse,
+        "byCategory": by_category,
+    }
+
+
+def abc_classification(days=365):
+    """Rank products by revenue over the last `days` days and assign A/B/C classes"""
+    if np is None:
+        raise RuntimeError("NumPy is required for ABC classification (pip install numpy)")
+    start = timezone.localdate() - timedelta(days=days - 1)
+    rows = list(DailyProductSales.objects.filter(sales_date__gte=start)
+                .values('product_id').annotate(total=Sum('revenue'))
+                .values_list('product_id', 'total'))
+    product_ids = np.fromiter((p for p, _ in rows), dtype=np.int64, count=len(rows))
+    revenue = np.fromiter((float(t or 0) for _, t in rows), dtype=np.float64, count=len(rows))
+
+    order = np.argsort(-revenue, kind='stable')
+    product_ids, revenue = product_ids[order], revenue[order]
+    total = revenue.sum()
+    share = revenue / total if total > 0 else np.zeros_like(revenue)
+    cumulative = np.cumsum(share)
+    # A product belongs to the class its cumulative share starts in, so the
+    # product that crosses a threshold stays in the higher class
+    starts = cumulative - share
+    classes = np.where(starts < ABC_THRESHOLDS[0], 'A', np.where(starts < ABC_THRESHOLDS[1], 'B', 'C'))
+
+    names = dict(Product.objects.filter(product_id__in=product_ids.tolist()).values_list('product_id', 'product_name'))
+    products = [{
+        "productId": int(pid),
+        "productName": names.get(int(pid), ""),
+        "revenue": round(float(rev), 2),
+        "share": round(float(sh), 4),
+        "cumulativeShare": round(float(cum), 4),
+        "class": str(cls),
+    } for pid, rev, sh, cum, cls in zip(product_ids, revenue, share, cumulative, classes)]
+
+    summary = {}
+    for cls in ('A', 'B', 'C'):
+        mask = classes == cls
+        summary[cls] = {
+            "products": int(mask.sum()),
+            "revenue": round(float(revenue[mask].sum()), 2),
+            "revenueShare": round(float(share[mask].sum()), 4),
+        }
+    return {"days": days, "totalRevenue": round(float(total), 2), "summary": summary, "products": products}
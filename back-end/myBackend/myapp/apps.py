@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401  Registers the cache-version signal handlers
+        from . import slow_queries
+        slow_queries.enable()  # Time every statement and keep the slow ones with their EXPLAIN plan
@@ -0,0 +1,165 @@
+"""
+Hot/cold archival of historical orders.
+
+Orders older than settings.ORDER_ARCHIVE_DAYS are moved, together with their
+items and warehouse allocations, from the hot tables (orders, order_items,
+order_item_allocations) into *_archive tables with the same columns and IDs.
+archive_orders() moves them in batches, one transaction per batch, and is run
+by the `archive_orders` management command.
+
+List endpoints read only the hot tables unless a date filter reaches back
+to the archive horizon, the newest order_date in the archive; then
+orders_between() and items_between() add the archived rows. The horizon is
+read from the archive itself, so it stays right whatever --days the command
+ran with and if ORDER_ARCHIVE_DAYS changes later. Delta sync (`since`) filters on updated_at, so changed orders
+and items added to older orders are returned too. Sales rollups are rebuilt from both (see rollups.py), so
+reports are unaffected by archiving. Order detail lookups by ID (find_order())
+fall back to the archive, so old orders stay reachable.
+"""
+
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (ArchivedOrder, ArchivedOrderItem, ArchivedOrderItemAllocation,
+                     Order, OrderItem, OrderItemAllocation)
+
+# (hot model, archive model) pairs, parents first
+ARCHIVED_MODELS = (
+    (Order, ArchivedOrder),
+    (OrderItem, ArchivedOrderItem),
+    (OrderItemAllocation, ArchivedOrderItemAllocation),
+)
+ITEM_MODELS = {Order: OrderItem, ArchivedOrder: ArchivedOrderItem}  # Order model -> its item model
+
+
+def archive_horizon():
+    """The newest order_date in the archive tables (None while they are empty); one index lookup"""
+    return ArchivedOrder.objects.aggregate(newest=Max('order_date'))['newest']
+
+
+def reaches_archive(start):
+    """Whether a list filtered from `start` (a date, datetime or None) needs the archive"""
+    if start is None:
+        return False
+    if not isinstance(start, datetime):
+        start = timezone.make_aware(datetime.combine(start, time.min))
+    horizon = archive_horizon()
+    return horizon is not None and start <= horizon
+
+
+def _copy(instance, model):
+    return model(**{field.attname: getattr(instance, field.attname) for field in model._meta.concrete_fields})
+
+
+def archive_orders(days=None, batch_size=500, stdout=None):
+    """Move orders older than `days` days (default ORDER_ARCHIVE_DAYS) to the archive; return how many"""
+    if days is None:
+        days = getattr(settings, 'ORDER_ARCHIVE_DAYS', 365)
+    cutoff = timezone.now() - timedelta(days=days)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            order_ids = list(Order.objects.select_for_update().filter(order_date__lt=cutoff)
+                             .order_by('order_id').values_list('order_id', flat=True)[:batch_size])
+            if not order_ids:
+                return moved
+            for hot_model, archive_model in ARCHIVED_MODELS:
+                rows = hot_model.objects.filter(order_id__in=order_ids)
+                archive_model.objects.bulk_create([_copy(row, archive_model) for row in rows])
+            # Children first, so a failure never leaves items without their order
+            for hot_model, _ in reversed(ARCHIVED_MODELS):
+                hot_model.objects.filter(order_id__in=order_ids).delete()
+        moved += len(order_ids)
+        if stdout:
+            stdout.write(f"Archived {moved} orders")
+
+
+def _order_querysets(start, end, since=None):
+    """Filtered order querysets, oldest source first: the archive (if start reaches it), then hot orders"""
+    querysets = [Order.objects.all()]
+    if reaches_archive(start):
+        querysets.insert(0, ArchivedOrder.objects.all())  # Archived orders are the older ones
+    results = []
+    for queryset in querysets:
+        if start is not None:
+            queryset = queryset.filter(order_date__gte=start)
+        if end is not None:
+            queryset = queryset.filter(order_date__lte=end)
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+        results.append(queryset)
+    return results
+
+
+def orders_between(start=None, end=None, since=None):
+    """Orders placed in [start, end] and changed since `since`, archive included when start reaches back that far"""
+    return chain(*(queryset.order_by('order_id') for queryset in _order_querysets(start, end, since)))
+
+
+def order_page(start=None, end=None, page=1, page_size=50, since=None):
+    """One page of orders in [start, end], newest first, archive included as for orders_between().
+
+    Returns (orders, total). Costs one COUNT per table plus one query per
+    table the page touches, however deep the page is.
+    """
+    querysets = [queryset.order_by('-order_id') for queryset in reversed(_order_querysets(start, end, since))]
+    counts = [queryset.count() for queryset in querysets]
+    offset = (page - 1) * page_size
+    orders = []
+    for queryset, count in zip(querysets, counts):
+        if offset >= count:
+            offset -= count  # The page starts in an older table
+            continue
+        orders.extend(queryset[offset:offset + page_size - len(orders)])
+        offset = 0
+        if len(orders) >= page_size:
+            break
+    return orders, sum(counts)
+
+
+def find_order(order_id):
+    """An order by ID from the hot table, or from the archive once it has been moved there"""
+    order = Order.objects.filter(order_id=order_id).first()
+    if order is None:
+        order = ArchivedOrder.objects.filter(order_id=order_id).first()
+    if order is None:
+        raise Order.DoesNotExist(f"Order {order_id} not found")
+    return order
+
+
+def items_for_orders(orders):
+    """{order_id: [items]} for hot or archived orders, with one query per item table involved"""
+    order_ids = {}
+    for order in orders:
+        order_ids.setdefault(ITEM_MODELS[type(order)], []).append(order.order_id)
+    items = {}
+    for item_model, ids in order_ids.items():
+        for item in item_model.objects.filter(order_id__in=ids).order_by('order_item_id'):
+            items.setdefault(item.order_id, []).append(item)
+    return items
+
+
+def items_between(start=None, end=None, since=None):
+    """Order items whose order was placed in [start, end] and that changed since `since`, archive as for orders_between()"""
+    sources = [(Order, OrderItem)]
+    if reaches_archive(start):
+        sources.insert(0, (ArchivedOrder, ArchivedOrderItem))
+    results = []
+    for order_model, item_model in sources:
+        items = item_model.objects.all()
+        if start is not None or end is not None:
+            orders = order_model.objects.all()
+            if start is not None:
+                orders = orders.filter(order_date__gte=start)
+            if end is not None:
+                orders = orders.filter(order_date__lte=end)
+            items = items.filter(order_id__in=orders.values('order_id'))
+        if since is not None:
+            items = items.filter(updated_at__gte=since)
+        results.append(items.order_by('order_item_id'))
+    return chain(*results)
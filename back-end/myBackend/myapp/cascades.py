@@ -0,0 +1,151 @@
+"""
+Set-based cascading deletes.
+
+Tables reference each other through plain integer columns rather than foreign
+keys, so the database does not cascade anything. The functions here delete a
+batch of products, warehouses or orders together with their dependent rows,
+one DELETE ... WHERE ... IN (...) per table, inside one transaction (one per
+shard for inventory). Every removed row gets a delta-sync tombstone.
+
+Products, warehouses and inventory have post_delete receivers (signals.py),
+which would make QuerySet.delete() load every row and send a signal and a
+cache-version bump per row; _fast_delete() issues the DELETE through a cursor
+instead and the functions bump each table's version once.
+
+Dependents removed:
+
+- products:   inventory rows and their hot-SKU reservations
+- warehouses: inventory rows and their hot-SKU reservations
+- orders:     order items and their warehouse allocations, hot or archived
+
+Order items are sales history and are kept when a product or warehouse is
+deleted. delete_orphans() removes rows whose parent is already gone (the
+`cleanup_orphans` management command).
+"""
+
+from django.db import connections
+
+from .events import publish_each_on_commit
+from .models import DeletedRecord, Inventory, Order, OrderItem, OrderItemAllocation, Product, Warehouse
+from .reservations import drop_reservations
+from .response_cache import bump_versions
+from .rollups import SALES_SOURCES, subtract_orders
+from .sharding import atomic_shards, shard_aliases
+
+
+def record_deletion(table_name, record_ids):
+    if isinstance(record_ids, int):
+        record_ids = [record_ids]
+    DeletedRecord.objects.bulk_create(
+        [DeletedRecord(table_name=table_name, record_id=record_id) for record_id in record_ids]
+    )
+
+
+DELETE_BATCH_SIZE = 500  # IDs per DELETE statement, under every backend's parameter limit
+
+
+def _fast_delete(model, ids, using='default'):
+    """DELETE ... WHERE pk IN (...) with no rows loaded and no delete signals sent; returns the row count"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            batch = ids[start:start + DELETE_BATCH_SIZE]
+            cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(batch))})", batch)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def _delete_inventory(**filters):
+    """Delete matching inventory rows on every shard and return their IDs"""
+    deleted = []
+    for alias in shard_aliases():
+        ids = list(Inventory.objects.using(alias).filter(**filters).values_list('inventory_id', flat=True))
+        if not ids:
+            continue
+        _fast_delete(Inventory, ids, using=alias)
+        bump_versions('inventory', using=alias)
+        publish_each_on_commit('inventory.deleted', [{'inventory_id': inventory_id} for inventory_id in ids], using=alias)
+        deleted.extend(ids)
+    drop_reservations(deleted)
+    return deleted
+
+
+def delete_products(product_ids):
+    """Delete products and their inventory rows; return {table: deleted IDs}"""
+    with atomic_shards(['default', *shard_aliases()]):
+        found = list(Product.objects.filter(product_id__in=set(product_ids)).values_list('product_id', flat=True))
+        inventory_ids = _delete_inventory(product_id__in=found) if found else []
+        _fast_delete(Product, found)
+        bump_versions('products')
+        record_deletion('products', found)
+        record_deletion('inventory', inventory_ids)
+    return {'products': found, 'inventory': inventory_ids}
+
+
+def delete_warehouses(warehouse_ids):
+    """Delete warehouses and their inventory rows; return {table: deleted IDs}"""
+    with atomic_shards(['default', *shard_aliases()]):
+        found = list(Warehouse.objects.filter(warehouse_id__in=set(warehouse_ids)).values_list('warehouse_id', flat=True))
+        inventory_ids = _delete_inventory(warehouse_id__in=found) if found else []
+        _fast_delete(Warehouse, found)
+        bump_versions('warehouses')
+        record_deletion('warehouses', found)
+        record_deletion('inventory', inventory_ids)
+    return {'warehouses': found, 'inventory': inventory_ids}
+
+
+def delete_orders(order_ids):
+    """Delete orders with their items and allocations, from the hot or archive tables; return {table: deleted IDs}"""
+    found, item_ids = [], []
+    with atomic_shards(['default']):
+        for archived, (order_model, item_model, allocation_model) in enumerate(SALES_SOURCES):
+            orders = list(order_model.objects.filter(order_id__in=set(order_ids)).values_list('order_id', flat=True))
+            items = list(item_model.objects.filter(order_id__in=orders).values_list('order_item_id', flat=True))
+            if items:
+                # The deleted items leave the daily rollups of the days they were booked on
+                subtract_orders(orders, archived=bool(archived))
+            allocation_model.objects.filter(order_id__in=orders).delete()
+            item_model.objects.filter(order_id__in=orders).delete()
+            order_model.objects.filter(order_id__in=orders).delete()
+            found.extend(orders)
+            item_ids.extend(items)
+        record_deletion('orders', found)
+        record_deletion('order_items', item_ids)
+    return {'orders': found, 'order_items': item_ids}
+
+
+def delete_orphans(dry_run=False):
+    """Remove rows whose parent no longer exists; return {table: row count}"""
+    product_ids = Product.objects.values('product_id')
+    warehouse_ids = Warehouse.objects.values('warehouse_id')
+    counts = {'inventory': 0}
+    with atomic_shards(['default', *shard_aliases()]):
+        for alias in shard_aliases():
+            if alias != 'default':
+                # Subqueries cannot reach 'default' from a shard, so pass the ID lists
+                product_ids = list(Product.objects.values_list('product_id', flat=True))
+                warehouse_ids = list(Warehouse.objects.values_list('warehouse_id', flat=True))
+            orphans = (Inventory.objects.using(alias).exclude(product_id__in=product_ids)
+                       | Inventory.objects.using(alias).exclude(warehouse_id__in=warehouse_ids))
+            ids = list(orphans.values_list('inventory_id', flat=True))
+            if ids and not dry_run:
+                _fast_delete(Inventory, ids, using=alias)
+                bump_versions('inventory', using=alias)
+                drop_reservations(ids)
+                record_deletion('inventory', ids)
+            counts['inventory'] += len(ids)
+
+        item_ids = list(OrderItem.objects.exclude(order_id__in=Order.objects.values('order_id'))
+                        .values_list('order_item_id', flat=True))
+        allocations = OrderItemAllocation.objects.exclude(
+            order_item_id__in=OrderItem.objects.exclude(order_item_id__in=item_ids).values('order_item_id'))
+        counts['order_item_allocations'] = allocations.count()
+        counts['order_items'] = len(item_ids)
+        if not dry_run:
+            allocations.delete()
+            OrderItem.objects.filter(order_item_id__in=item_ids).delete()
+            record_deletion('order_items', item_ids)
+    return counts
@@ -0,0 +1,70 @@
+"""
+Optimistic concurrency control for products and inventory rows.
+
+Both tables carry a `version` column that every write increments. An update
+sends the version it last read, in an If-Match header (the ETag returned by
+the endpoints, e.g. "7") or as "version" in the JSON body. save_changes()
+writes only the fields whose value changed, with a conditional
+
+    UPDATE ... SET ..., version = version + 1 WHERE pk = %s AND version = %s
+
+and raises VersionConflict when the row has moved on, which the views turn
+into 409 Conflict. Without a client version the version read at the start of
+the request is used, so a concurrent write still cannot be overwritten
+between the read and the UPDATE.
+"""
+
+from django.db.models import F
+from django.utils import timezone
+
+from .response_cache import bump_versions
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version):
+        super().__init__("The record was changed by someone else; reload it and try again")
+        self.current_version = current_version
+
+
+def etag(instance):
+    return f'"{instance.version}"'
+
+
+def expected_version(request, data=None):
+    """Version the client based its edit on: If-Match header first, then "version" in the body"""
+    header = request.headers.get('If-Match', '').strip()
+    if header and header != '*':
+        return int(header.removeprefix('W/').strip('"'))
+    if data and data.get('version') is not None:
+        return int(data['version'])
+    return None
+
+
+def save_changes(instance, changes, expected=None):
+    """Conditionally write the fields in `changes` that differ from the instance; return their names"""
+    model = type(instance)
+    using = instance._state.db
+    if expected is None:
+        expected = instance.version
+    if expected != instance.version:
+        raise VersionConflict(instance.version)
+    changed = {name: value for name, value in changes.items() if getattr(instance, name) != value}
+    if not changed:
+        return []
+
+    now = timezone.now()
+    values = dict(changed)
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False):
+            values[field.attname] = now  # update() skips auto_now, so set it explicitly
+    updated = (model._default_manager.using(using)
+               .filter(pk=instance.pk, version=expected)
+               .update(version=F('version') + 1, **values))
+    if not updated:
+        current = model._default_manager.using(using).filter(pk=instance.pk).values_list('version', flat=True).first()
+        raise VersionConflict(current)
+    for name, value in values.items():
+        setattr(instance, name, value)
+    instance.version = expected + 1
+    bump_versions(model._meta.db_table, using=using)  # update() sends no signals
+    return list(changed)
@@ -0,0 +1,183 @@
+"""
+Change events for inventory and orders, delivered to every process.
+
+Writers call publish_on_commit(): once their transaction commits the event is
+inserted into the change_events outbox table, so events from any web worker,
+`run_jobs` or a management command reach every client. In each process that
+serves Server-Sent Events streams (see views.event_stream) one poller thread
+reads rows newer than the last one it delivered every EVENT_POLL_SECONDS and
+fans them out to that process's subscribers. Event IDs are the outbox primary
+keys, so a client reconnecting with Last-Event-ID to any worker is replayed
+what it missed.
+
+Under ASGI the subscribers are asyncio queues owned by the event loop, so
+messages are handed over with call_soon_threadsafe; under WSGI each stream's
+worker thread blocks on a thread-safe queue.Queue of its own.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from queue import Empty, Queue
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+
+def poll_seconds():
+    return getattr(settings, 'EVENT_POLL_SECONDS', 0.5)
+
+
+def retention_seconds():
+    return getattr(settings, 'EVENT_RETENTION_SECONDS', 60 * 60)
+
+
+def _format(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class Broadcaster:
+    """Fan out outbox events to all subscribers of this process"""
+
+    def __init__(self, queue_size=256, history_size=500):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._queue_size = queue_size
+        self._history_size = history_size  # Most events replayed to a reconnecting client
+        self._last_id = None                # Newest outbox row delivered; None while nobody listens
+        self._pid = None
+
+    def _start(self):
+        # Workers fork from a preloaded master: each process needs its own thread
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='change-events', daemon=True).start()
+
+    def subscribe(self, last_event_id=None, loop=None):
+        """Register a subscriber and return its (loop, queue) handle; no loop means a WSGI thread.
+
+        Does database work: ASGI callers run it through sync_to_async and pass their event loop.
+        """
+        if loop is None:
+            queue = Queue(maxsize=self._queue_size)
+        else:
+            queue = asyncio.Queue(maxsize=self._queue_size)
+        subscriber = (loop, queue)
+        with self._lock:
+            if self._last_id is None:
+                self._last_id = ChangeEvent.objects.aggregate(last=Max('event_id'))['last'] or 0
+            if last_event_id is not None:
+                # Newer rows are left to the poller, which delivers them to every subscriber
+                missed = (ChangeEvent.objects.filter(event_id__gt=last_event_id, event_id__lte=self._last_id)
+                          .order_by('-event_id').values_list('event_id', 'event', 'data')[:self._history_size])
+                for row in reversed(missed):
+                    self._send(subscriber, _format(*row))
+            self._subscribers.add(subscriber)
+            self._start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def poll(self):
+        """Deliver outbox rows newer than the last delivered one; returns how many"""
+        with self._lock:
+            if not self._subscribers:
+                self._last_id = None  # Start from the newest row when someone subscribes again
+                return 0
+            rows = list(ChangeEvent.objects.filter(event_id__gt=self._last_id).order_by('event_id')
+                        .values_list('event_id', 'event', 'data')[:1000])
+            if rows:
+                self._last_id = rows[-1][0]
+            subscribers = list(self._subscribers)
+        for row in rows:
+            message = _format(*row)
+            for subscriber in subscribers:
+                self._send(subscriber, message)
+        return len(rows)
+
+    def _send(self, subscriber, message):
+        loop, queue = subscriber
+        if loop is None:
+            self._put(queue, message)
+            return
+        try:
+            loop.call_soon_threadsafe(self._put, queue, message)
+        except RuntimeError:
+            # The subscriber's event loop has shut down
+            self.unsubscribe(subscriber)
+
+    @staticmethod
+    def _put(queue, message):
+        # A slow client loses its oldest events rather than blocking the poller
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except (asyncio.QueueEmpty, Empty):
+                pass  # A threaded client took one meanwhile
+        queue.put_nowait(message)
+
+    def _run(self):
+        next_cleanup = 0.0
+        while True:
+            time.sleep(poll_seconds())
+            close_old_connections()  # Long-running thread: drop dead MySQL connections
+            try:
+                self.poll()
+                if time.monotonic() >= next_cleanup:
+                    next_cleanup = time.monotonic() + 60
+                    delete_old_events()
+            except Exception:
+                logger.exception("Polling change events failed")
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+broadcaster = Broadcaster()
+
+
+def publish(event, data):
+    """Write one event to the outbox; call after the change has committed"""
+    ChangeEvent.objects.using('default').create(event=event, data=json.dumps(data, default=str))
+
+
+def publish_on_commit(event, data, using=None):
+    """Publish once the surrounding transaction commits (immediately in autocommit)"""
+    transaction.on_commit(lambda: publish(event, data), using=using)
+
+
+def publish_each_on_commit(event, items, using=None):
+    """Publish one event per data dict once the transaction commits, with a single INSERT"""
+    transaction.on_commit(lambda: ChangeEvent.objects.using('default').bulk_create([
+        ChangeEvent(event=event, data=json.dumps(data, default=str)) for data in items
+    ]), using=using)
+
+
+def publish_inventory_change(inventory):
+    publish_on_commit('inventory.changed', {
+        'inventory_id': inventory.inventory_id,
+        'product_id': inventory.product_id,
+        'warehouse_id': inventory.warehouse_id,
+        'quantity': inventory.quantity,
+    }, using=inventory._state.db)  # Inventory rows may live on a shard database
+
+
+def delete_old_events():
+    """Delete outbox rows older than EVENT_RETENTION_SECONDS; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=retention_seconds())
+    deleted, _ = ChangeEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
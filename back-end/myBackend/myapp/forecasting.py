@@ -0,0 +1,142 @@
+"""
+Demand forecasting and reorder suggestions.
+
+Daily unit sales for every product are read from the daily_product_sales
+rollup in one query and packed into a products x days NumPy matrix. Forecasts
+are then computed for all products at once with matrix operations:
+
+- 'sma': simple moving average over the last `window` days
+- 'ses': simple exponential smoothing, written as one weighted sum per row
+
+The reorder suggestion covers forecast demand over the lead time plus the
+review period, plus safety stock, minus the stock on hand across warehouses.
+"""
+
+import math
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # Only the forecasting endpoint and command need NumPy
+    np = None
+
+from .models import DailyProductSales, Product
+from .sharding import fan_out
+
+DEFAULTS = {
+    'method': 'ses',
+    'alpha': 0.3,          # Smoothing factor for 'ses'
+    'window': 28,          # Days averaged by 'sma'
+    'history_days': 180,   # Days of sales history loaded
+    'lead_time_days': 7,   # Days between placing and receiving a reorder
+    'review_days': 14,     # Days of demand each reorder should cover
+    'service_z': 1.65,     # Safety stock z-score (1.65 ~ 95% service level)
+}
+
+
+def load_daily_sales(history_days, today=None):
+    """Return (product_ids, matrix) with one row per product and one column per day"""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=history_days - 1)
+    rows = DailyProductSales.objects.filter(sales_date__gte=start, sales_date__lte=today).values_list(
+        'product_id', 'sales_date', 'units')
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, history_days))
+    product_col, date_col, units_col = zip(*rows)
+    product_ids, product_index = np.unique(np.fromiter(product_col, dtype=np.int64), return_inverse=True)
+    day_index = np.fromiter(((d - start).days for d in date_col), dtype=np.int64, count=len(date_col))
+    matrix = np.zeros((len(product_ids), history_days))
+    np.add.at(matrix, (product_index, day_index), np.fromiter(units_col, dtype=np.float64, count=len(units_col)))
+    return product_ids, matrix
+
+
+def forecast_daily_demand(matrix, method, alpha, window):
+    """Forecast next-day demand for every row of the sales matrix"""
+    days = matrix.shape[1]
+    if days == 0:
+        return np.zeros(matrix.shape[0])
+    if method == 'sma':
+        return matrix[:, -min(window, days):].mean(axis=1)
+    if method == 'ses':
+        # level_T = sum_t alpha * (1 - alpha)^(T-1-t) * x_t, with the first day as the starting level
+        weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+        weights[0] = (1 - alpha) ** (days - 1)
+        return matrix @ weights
+    raise ValueError("method must be 'sma' or 'ses'")
+
+
+def reorder_suggestions(method=None, alpha=None, window=None, history_days=None,
+                        lead_time_days=None, review_days=None, service_z=None, product_ids=None):
+    """Compute forecasts and suggested reorder quantities for all products"""
+    if np is None:
+        raise RuntimeError("NumPy is required for demand forecasting (pip install numpy)")
+    params = {**DEFAULTS, **{k: v for k, v in {
+        'method': method, 'alpha': alpha, 'window': window, 'history_days': history_days,
+        'lead_time_days': lead_time_days, 'review_days': review_days, 'service_z': service_z,
+    }.items() if v is not None}}
+    if not 0 < params['alpha'] <= 1:
+        raise ValueError("alpha must be between 0 and 1")
+    if params['history_days'] < 1 or params['window'] < 1:
+        raise ValueError("history_days and window must be positive")
+
+    sales_ids, matrix = load_daily_sales(params['history_days'])
+    forecast = forecast_daily_demand(matrix, params['method'], params['alpha'], params['window'])
+    volatility = matrix.std(axis=1) if matrix.size else np.zeros(0)
+
+    # Stock per product, summed on each warehouse shard and merged here
+    stock_totals = {}
+    for product_id, total in fan_out(lambda qs: qs.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')):
+        stock_totals[product_id] = stock_totals.get(product_id, 0) + (total or 0)
+    stock_rows = sorted(stock_totals.items())
+    stock_ids = np.fromiter((p for p, _ in stock_rows), dtype=np.int64)
+    stock_qty = np.fromiter((q or 0 for _, q in stock_rows), dtype=np.float64)
+    # Every product with sales or stock gets a row, in product_id order
+    all_ids = np.union1d(sales_ids, stock_ids)
+    if product_ids is not None:
+        all_ids = np.intersect1d(all_ids, np.asarray(list(product_ids), dtype=np.int64))
+
+    daily = np.zeros(len(all_ids))
+    sigma = np.zeros(len(all_ids))
+    stock = np.zeros(len(all_ids))
+    in_sales = np.isin(sales_ids, all_ids)
+    sales_pos = np.searchsorted(all_ids, sales_ids[in_sales])
+    daily[sales_pos] = forecast[in_sales]
+    sigma[sales_pos] = volatility[in_sales]
+    in_stock = np.isin(stock_ids, all_ids)
+    stock[np.searchsorted(all_ids, stock_ids[in_stock])] = stock_qty[in_stock]
+
+    horizon = params['lead_time_days'] + params['review_days']
+    safety = params['service_z'] * sigma * math.sqrt(params['lead_time_days'])
+    reorder = np.ceil(np.clip(daily * horizon + safety - stock, 0, None)).astype(np.int64)
+    with np.errstate(divide='ignore'):
+        cover = np.where(daily > 0, stock / np.where(daily > 0, daily, 1), np.inf)
+
+    return params, all_ids, daily, stock, cover, reorder
+
+
+def suggestion_rows(all_ids, daily, stock, cover, reorder, only_reorder=False, limit=None):
+    """Turn the forecast arrays into JSON-ready rows, largest reorders first"""
+    order = np.argsort(-reorder, kind='stable')
+    if only_reorder:
+        order = order[reorder[order] > 0]
+    if limit:
+        order = order[:limit]
+    selected = all_ids[order].tolist()
+    products = {p.product_id: p for p in Product.objects.filter(product_id__in=selected).only('product_id', 'product_name', 'sku')}
+    rows = []
+    for i in order.tolist():
+        product_id = int(all_ids[i])
+        product = products.get(product_id)
+        rows.append({
+            "productId": product_id,
+            "productName": product.product_name if product else "",
+            "sku": product.sku if product else "",
+            "dailyForecast": round(float(daily[i]), 3),
+            "stock": int(stock[i]),
+            "daysOfCover": None if math.isinf(cover[i]) else round(float(cover[i]), 1),
+            "suggestedReorder": int(reorder[i]),
+        })
+    return rows
@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for mutating endpoints.
+
+A client that retries a POST/PUT with the same Idempotency-Key header gets the
+stored first response back instead of running the view again. Responses live
+in a bounded in-process LRU and in the idempotency_keys table, which is also
+used to claim a key before the view runs: a concurrent duplicate (in this
+process or another worker) waits for the first request to finish and then
+replays its response instead of executing twice. A claim still unfinished
+after IDEMPOTENCY_CLAIM_TIMEOUT seconds belonged to a worker that died, so the
+next request with the key takes it over rather than waiting for the TTL.
+"""
+
+import functools
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+class ResponseCache:
+    """Thread-safe LRU of recently stored responses"""
+
+    def __init__(self, max_entries):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = ResponseCache(getattr(settings, 'IDEMPOTENCY_CACHE_SIZE', 1000))
+_inflight_lock = threading.Lock()
+_inflight = {}  # key -> threading.Event set when the first request finishes
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def _claim_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_TIMEOUT', 120))
+
+
+def _replay(entry, fingerprint):
+    stored_fingerprint, status, content_type, body = entry
+    if stored_fingerprint != fingerprint:
+        return JsonResponse({"error": f"{HEADER} was already used with a different request"}, status=422)
+    response = HttpResponse(body, status=status, content_type=content_type)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _load(key):
+    row = IdempotencyKey.objects.filter(key=key, status_code__isnull=False).first()
+    if row is None or row.created_at < timezone.now() - _ttl():
+        return None
+    entry = (row.fingerprint, row.status_code, row.content_type, bytes(row.response_body))
+    _cache.set(key, entry)
+    return entry
+
+
+def _claim(key, fingerprint):
+    """Insert the in-progress row and return its claimed_at; None if another request holds the key"""
+    now = timezone.now()
+    IdempotencyKey.objects.filter(key=key, created_at__lt=now - _ttl()).delete()
+    try:
+        # Savepoint so a lost insert race leaves the connection usable for the takeover below
+        with transaction.atomic():
+            IdempotencyKey.objects.create(key=key, fingerprint=fingerprint, claimed_at=now)
+        return now
+    except IntegrityError:
+        pass
+    # The conditional UPDATE lets exactly one request take over a dead worker's claim
+    taken = IdempotencyKey.objects.filter(
+        key=key, status_code__isnull=True, claimed_at__lt=now - _claim_timeout(),
+    ).update(fingerprint=fingerprint, claimed_at=now, created_at=now)
+    return now if taken else None
+
+
+def _wait_for_other_worker(key):
+    """Poll the table until the request holding the key stores its response"""
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 30)
+    while time.monotonic() < deadline:
+        entry = _load(key)
+        if entry is not None:
+            return entry
+        if not IdempotencyKey.objects.filter(key=key).exists():
+            return None  # The first request failed and released the key
+        time.sleep(0.1)
+    return None
+
+
+def idempotent(view):
+    """Replay the first response for requests carrying a repeated Idempotency-Key"""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        client_key = request.headers.get(HEADER)
+        if not client_key:
+            return view(request, *args, **kwargs)
+
+        key = hashlib.sha256(f"{request.method} {request.path} {client_key}".encode()).hexdigest()
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        entry = _cache.get(key)
+        if entry is not None:
+            return _replay(entry, fingerprint)
+
+        # Only one request per key runs in this process; the rest wait for it
+        with _inflight_lock:
+            event = _inflight.get(key)
+            owner = event is None
+            if owner:
+                event = _inflight[key] = threading.Event()
+        if not owner:
+            event.wait(getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 30))
+            entry = _cache.get(key) or _load(key)
+            if entry is not None:
+                return _replay(entry, fingerprint)
+            return JsonResponse({"error": "A request with this Idempotency-Key is still in progress"}, status=409)
+
+        claimed_at = None
+        try:
+            entry = _load(key)
+            if entry is not None:
+                return _replay(entry, fingerprint)
+            claimed_at = _claim(key, fingerprint)
+            if claimed_at is None:
+                # Another worker process owns the key
+                entry = _wait_for_other_worker(key)
+                if entry is not None:
+                    return _replay(entry, fingerprint)
+                return JsonResponse({"error": "A request with this Idempotency-Key is still in progress"}, status=409)
+
+            # Only this request's claim: a takeover after a stall gives the row a new claimed_at
+            claim = IdempotencyKey.objects.filter(key=key, claimed_at=claimed_at)
+            response = view(request, *args, **kwargs)
+            if response.status_code >= 500 or response.streaming:
+                # Let the client retry server errors for real
+                claim.delete()
+                return response
+            entry = (fingerprint, response.status_code, response.get('Content-Type', 'application/json'), response.content)
+            claim.update(
+                status_code=entry[1], content_type=entry[2], response_body=entry[3],
+            )
+            _cache.set(key, entry)
+            if random.random() < 0.01:
+                # Occasionally prune expired keys so the table stays bounded
+                IdempotencyKey.objects.filter(created_at__lt=timezone.now() - _ttl()).delete()
+            return response
+        except Exception:
+            if claimed_at is not None:
+                IdempotencyKey.objects.filter(key=key, claimed_at=claimed_at, status_code__isnull=True).delete()
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            event.set()
+
+    return wrapper
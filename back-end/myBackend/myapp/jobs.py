@@ -0,0 +1,336 @@
+"""
+Background jobs for work that is too slow for a request.
+
+Jobs are rows in the background_jobs table. Views queue them with submit(),
+and the `run_jobs` management command claims queued rows one at a time and
+runs the matching handler from JOB_HANDLERS. Handlers report progress through
+the JobContext they receive, which also raises JobCancelled once a cancel has
+been requested through the API, so long handlers call progress() between
+units of work. submit() accepts only the parameters a handler registered and
+casts them, so a bad request fails with ValueError instead of a failed job. Files produced by a job are written to JOB_RESULTS_DIR and
+served by the job result endpoint; uploads for import jobs are staged there
+too. run_jobs periodically fails jobs whose worker died and deletes files
+older than JOB_RESULTS_MAX_AGE_DAYS.
+"""
+
+import csv
+import json
+import time
+import traceback
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+JOB_HANDLERS = {}
+JOB_PARAMS = {}  # Job type -> {parameter name: cast}; casts raise ValueError or TypeError on bad values
+ROLLUP_WINDOW_DAYS = 31  # Days of sales rebuild_sales_rollups recomputes between cancellation checks
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when the job has been cancelled"""
+
+
+def register(job_type, params=None):
+    def decorator(handler):
+        JOB_HANDLERS[job_type] = handler
+        JOB_PARAMS[job_type] = params or {}
+        return handler
+    return decorator
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise ValueError("must be positive")
+    return number
+
+
+def _non_negative_int(value):
+    number = int(value)
+    if number < 0:
+        raise ValueError("cannot be negative")
+    return number
+
+
+def _fraction(value):
+    number = float(value)
+    if not 0 < number <= 1:
+        raise ValueError("must be between 0 and 1")
+    return number
+
+
+def _iso_date(value):
+    return date.fromisoformat(value).isoformat()
+
+
+def _flag(value):
+    if not isinstance(value, bool):
+        raise ValueError("must be true or false")
+    return value
+
+
+def _choice(*options):
+    def cast(value):
+        if value not in options:
+            raise ValueError(f"must be one of {', '.join(options)}")
+        return value
+    return cast
+
+
+def _id_list(value):
+    if not isinstance(value, list):
+        raise ValueError("must be a list of IDs")
+    return [_positive_int(v) for v in value]
+
+
+def clean_params(job_type, params):
+    """Return params cast for job_type; unknown names and bad values raise ValueError"""
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    allowed = JOB_PARAMS.get(job_type, {})
+    unknown = sorted(set(params) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown parameter(s) for {job_type}: {', '.join(unknown)}")
+    cleaned = {}
+    for name, value in params.items():
+        if value is None:
+            continue
+        try:
+            cleaned[name] = allowed[name](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid {name}: {e}")
+    return cleaned
+
+
+def results_dir():
+    path = Path(getattr(settings, 'JOB_RESULTS_DIR', settings.BASE_DIR / 'job_results'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save_upload(chunks, suffix):
+    """Write an uploaded body to JOB_RESULTS_DIR for an import job; return the file name"""
+    path = results_dir() / f"upload_{uuid.uuid4().hex}{suffix}"
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return path.name
+
+
+def clean_results(max_age_seconds):
+    """Delete result and upload files older than max_age_seconds; return how many were removed"""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in results_dir().iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:  # Another worker's sweep got there first
+            pass
+    return removed
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting and cancellation checks"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, percent=None, message=None):
+        fields = {'heartbeat_at': timezone.now()}
+        if percent is not None:
+            fields['progress'] = max(0, min(100, int(percent)))
+        if message is not None:
+            fields['message'] = str(message)[:255]
+        BackgroundJob.objects.filter(job_id=self.job.job_id).update(**fields)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if BackgroundJob.objects.filter(job_id=self.job.job_id, cancel_requested=True).exists():
+            raise JobCancelled()
+
+    def write(self, text):
+        # Lets handlers that log to a stdout-like object report progress messages
+        text = text.strip()
+        if text:
+            self.progress(message=text)
+
+    def result_path(self, suffix):
+        return results_dir() / f"job_{self.job.job_id}{suffix}"
+
+
+def submit(job_type, params=None):
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type '{job_type}'")
+    params = clean_params(job_type, params or {})
+    return BackgroundJob.objects.create(job_type=job_type, params=json.dumps(params), status='queued')
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running; None if the queue is empty"""
+    for job_id in BackgroundJob.objects.filter(status='queued').order_by('job_id').values_list('job_id', flat=True)[:10]:
+        now = timezone.now()
+        # Conditional update: only one worker can win the queued -> running transition
+        if BackgroundJob.objects.filter(job_id=job_id, status='queued').update(status='running', started_at=now, heartbeat_at=now):
+            return BackgroundJob.objects.get(job_id=job_id)
+    return None
+
+
+def run_job(job):
+    context = JobContext(job)
+    fields = {}
+    try:
+        handler = JOB_HANDLERS[job.job_type]
+        result = handler(context, json.loads(job.params or '{}')) or {}
+        fields.update(status='succeeded', progress=100, message=result.get('message', 'Done')[:255],
+                      result_file=result.get('result_file'))
+    except JobCancelled:
+        fields.update(status='cancelled', message='Cancelled')
+    except Exception as e:
+        fields.update(status='failed', message=str(e)[:255])
+        traceback.print_exc()
+    fields['finished_at'] = timezone.now()
+    BackgroundJob.objects.filter(job_id=job.job_id).update(**fields)
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return job
+
+
+def fail_stale_jobs(max_silence_seconds):
+    """Mark running jobs whose worker stopped sending heartbeats as failed"""
+    cutoff = timezone.now() - timedelta(seconds=max_silence_seconds)
+    return BackgroundJob.objects.filter(status='running', heartbeat_at__lt=cutoff).update(
+        status='failed', message='Worker stopped before the job finished', finished_at=timezone.now(),
+    )
+
+
+# ==================== JOB HANDLERS ====================
+
+@register('rebuild_sales_rollups', params={'start': _iso_date, 'end': _iso_date, 'window_days': _positive_int})
+def rebuild_sales_rollups_job(context, params):
+    """Rebuild rollups a window of days at a time, checking for cancellation between windows"""
+    from .rollups import main_warehouses, rebuild_rollups, sales_date_bounds
+    start = date.fromisoformat(params['start']) if params.get('start') else None
+    end = date.fromisoformat(params['end']) if params.get('end') else None
+    window_days = int(params.get('window_days', ROLLUP_WINDOW_DAYS))
+    context.progress(0, 'Rebuilding sales rollups')
+    first, last = sales_date_bounds()
+    low, high = start or first, end or last
+    windows = []
+    if low is not None and high is not None and window_days > 0:
+        day = low
+        while day <= high:
+            windows.append([day, min(day + timedelta(days=window_days - 1), high)])
+            day += timedelta(days=window_days)
+    if windows:
+        # Open ends still clear rollup rows outside the sales date range, as one full rebuild would
+        windows[0][0], windows[-1][1] = start, end
+    else:
+        windows = [[start, end]]
+    warehouse_by_product = main_warehouses()
+    product_rows = warehouse_rows = 0
+    for n, (window_start, window_end) in enumerate(windows):
+        # Each window is its own transaction, so a cancelled rebuild leaves finished windows correct
+        context.progress(n * 100 // len(windows),
+                         f"Rebuilding sales rollups {window_start or 'start'} to {window_end or 'end'}")
+        products, warehouses = rebuild_rollups(window_start, window_end, warehouse_by_product=warehouse_by_product)
+        product_rows += products
+        warehouse_rows += warehouses
+    return {'message': f"Rebuilt {product_rows} product and {warehouse_rows} warehouse rollup rows"}
+
+
+@register('backfill_order_totals', params={'batch_size': _positive_int})
+def backfill_order_totals_job(context, params):
+    from .totals import backfill_order_totals
+    items, orders = backfill_order_totals(int(params.get('batch_size', 1000)), stdout=context)
+    return {'message': f"Updated {items} order items and {orders} orders"}
+
+
+@register('export_inventory')
+def export_inventory_job(context, params):
+    """Write every inventory row with product and warehouse names to a CSV file"""
+    from .models import Inventory, Product, Warehouse
+    from .sharding import shard_aliases
+    products = {p['product_id']: p for p in Product.objects.values('product_id', 'product_name', 'sku', 'unit_price', 'cost_price')}
+    warehouses = dict(Warehouse.objects.values_list('warehouse_id', 'warehouse_name'))
+    total = sum(Inventory.objects.using(alias).count() for alias in shard_aliases()) or 1
+    path = context.result_path('.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['inventory_id', 'product_id', 'sku', 'product_name', 'warehouse_id', 'warehouse_name', 'quantity', 'unit_price', 'cost_price'])
+        rows = (row for alias in shard_aliases()
+                for row in Inventory.objects.using(alias).order_by('inventory_id')
+                .values_list('inventory_id', 'product_id', 'warehouse_id', 'quantity').iterator(chunk_size=2000))
+        for n, inv in enumerate(rows, 1):
+            inventory_id, product_id, warehouse_id, quantity = inv
+            product = products.get(product_id, {})
+            writer.writerow([inventory_id, product_id, product.get('sku', ''), product.get('product_name', ''),
+                             warehouse_id, warehouses.get(warehouse_id, ''), quantity,
+                             product.get('unit_price', ''), product.get('cost_price', '')])
+            if n % 5000 == 0:
+                context.progress(n * 100 // total, f"Exported {n} of {total} rows")
+    return {'message': f"Exported {total} inventory rows", 'result_file': path.name}
+
+
+@register('import_inventory', params={'file': str, 'apply': _flag, 'note': str})
+def import_inventory_job(context, params):
+    """Set inventory quantities from an uploaded warehouse_id,sku,counted CSV.
+
+    The file is booked as a stocktake, so variances are added to current stock
+    (sales made during the import are kept) and hot-SKU holds are respected.
+    With "apply": false the stocktake is left open for review instead.
+    """
+    from .stocktake import apply_stocktake, create_stocktake, read_count_csv
+    path = results_dir() / Path(params['file']).name
+    try:
+        context.progress(0, 'Reading uploaded file')
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            warehouse_ids, skus, counted = read_count_csv(f)
+        if not skus:
+            raise ValueError("Uploaded file has no lines")
+        if any(quantity < 0 for quantity in counted):
+            raise ValueError("Quantities cannot be negative")
+        context.progress(10, f"Reconciling {len(skus)} lines")
+        stocktake, summary, unknown = create_stocktake(warehouse_ids, skus, counted,
+                                                       note=params.get('note') or f"Import job {context.job.job_id}")
+        message = f"Stocktake {stocktake.stocktake_id}: {summary['varianceLines']} of {summary['lines']} lines changed"
+        if unknown:
+            message += f", {len(unknown)} unknown SKUs skipped"
+        if params.get('apply', True):
+            # Last point a cancel takes effect; the open stocktake can still be approved later
+            context.progress(60, 'Applying stock changes')
+            apply_stocktake(stocktake.stocktake_id)
+            message += ", applied"
+        return {'message': message}
+    finally:
+        path.unlink(missing_ok=True)
+
+
+@register('forecast_demand', params={
+    'method': _choice('ses', 'sma'),
+    'alpha': _fraction,
+    'window': _positive_int,
+    'history_days': _positive_int,
+    'lead_time_days': _non_negative_int,
+    'review_days': _non_negative_int,
+    'service_z': float,
+    'product_ids': _id_list,
+})
+def forecast_demand_job(context, params):
+    """Write reorder suggestions for every product to a CSV file"""
+    from .forecasting import reorder_suggestions, suggestion_rows
+    context.progress(0, 'Forecasting demand')
+    _, all_ids, daily, stock, cover, reorder = reorder_suggestions(**params)
+    rows = suggestion_rows(all_ids, daily, stock, cover, reorder)
+    path = context.result_path('.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['productId', 'productName', 'sku', 'dailyForecast', 'stock', 'daysOfCover', 'suggestedReorder'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return {'message': f"Forecast {len(rows)} products", 'result_file': path.name}
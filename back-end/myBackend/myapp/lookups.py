@@ -0,0 +1,55 @@
+"""
+Lookup maps shared by the list builders in views.py.
+
+List responses turn category, supplier, product and warehouse IDs into names.
+A Lookups object reads each of those tables at most once and keeps it as a
+{primary key: row} map, so /api/batch/ can build several lists in one request
+from the same maps instead of every list querying the tables again. The maps
+hold whole tables, in primary key order, and double as the row source of the
+products, categories, suppliers and warehouses lists.
+
+Delta syncs (?since=) touch a few rows, so they use rows_by_id() instead: one
+primary key IN (...) query for the IDs the delta references, or the whole
+map when another list of the same batch has already loaded it.
+"""
+
+from .models import Category, Product, Supplier, Warehouse
+
+
+class Lookups:
+    def __init__(self):
+        self._maps = {}
+        self._partial = {}  # Rows fetched by ID for deltas, per table
+
+    def _map(self, model):
+        table = model._meta.db_table
+        if table not in self._maps:
+            self._maps[table] = {row.pk: row for row in model.objects.order_by('pk')}
+        return self._maps[table]
+
+    def rows_by_id(self, model, ids):
+        """{primary key: row} for the given IDs, without loading the whole table"""
+        table = model._meta.db_table
+        rows = self._maps.get(table)
+        if rows is None:
+            rows = self._partial.setdefault(table, {})
+            missing = set(ids) - rows.keys()
+            if missing:
+                rows.update(model.objects.in_bulk(missing))
+        return {pk: rows[pk] for pk in ids if pk in rows}
+
+    @property
+    def categories(self):
+        return self._map(Category)
+
+    @property
+    def suppliers(self):
+        return self._map(Supplier)
+
+    @property
+    def products(self):
+        return self._map(Product)
+
+    @property
+    def warehouses(self):
+        return self._map(Warehouse)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move orders older than the archive horizon, with their items and allocations, into the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ORDER_ARCHIVE_DAYS', 365),
+                            help='Archive orders placed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders moved per transaction')
+
+    def handle(self, *args, **options):
+        moved = archive_orders(options['days'], options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} orders"))
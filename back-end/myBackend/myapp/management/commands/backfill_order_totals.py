@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp.totals import backfill_order_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute order_items.subtotal and orders.total_amount for existing rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Order IDs per transaction')
+
+    def handle(self, *args, **options):
+        items, orders = backfill_order_totals(options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Updated {items} order items and {orders} orders"))
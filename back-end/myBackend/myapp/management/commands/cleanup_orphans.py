@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from myapp.cascades import delete_orphans
+
+
+class Command(BaseCommand):
+    help = "Delete inventory rows, order items and allocations whose product, warehouse or order no longer exists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orphaned rows')
+
+    def handle(self, *args, **options):
+        counts = delete_orphans(dry_run=options['dry_run'])
+        verb = "Found" if options['dry_run'] else "Deleted"
+        summary = ", ".join(f"{count} {table}" for table, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"{verb} orphaned rows: {summary}"))
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from myapp.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily product and warehouse sales rollup tables from order_items"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        product_rows, warehouse_rows = rebuild_rollups(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {product_rows} product rollup rows and {warehouse_rows} warehouse rollup rows"
+        ))
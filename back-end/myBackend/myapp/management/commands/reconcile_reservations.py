@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from myapp.reservations import reconcile
+
+
+class Command(BaseCommand):
+    help = "Apply the sales journalled against expired hot-SKU reservations and release their unsold units"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running, reconciling every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()  # Long-running process: drop dead MySQL connections
+            reservations, units = reconcile()
+            if reservations or units or options['interval'] is None:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Released {reservations} expired reservations and applied {units} sold units"
+                ))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from myapp.replicas import replica_aliases, replica_lag, replicated_primaries, write_heartbeat
+
+
+class Command(BaseCommand):
+    help = "Write the replication heartbeat on 'default' and each replicated shard so replicas can be checked for lag"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between heartbeats')
+        parser.add_argument('--once', action='store_true', help='Write one heartbeat, report replica lag and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()  # Long-running process: drop dead MySQL connections
+            for primary in replicated_primaries():
+                write_heartbeat(using=primary)
+            if options['once']:
+                for primary in replicated_primaries():
+                    for alias in replica_aliases(primary):
+                        lag = replica_lag(alias)
+                        self.stdout.write(f"{alias}: " + ("no heartbeat yet" if lag is None else f"{lag:.1f}s behind"))
+                self.stdout.write(self.style.SUCCESS("Heartbeat written"))
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from myapp.events import delete_old_events
+from myapp.jobs import claim_next_job, clean_results, fail_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (exports, imports, rollup rebuilds, backfills)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait between queue checks')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Fail running jobs with no heartbeat for this many seconds')
+        parser.add_argument('--sweep-every', type=float, default=60.0,
+                            help='Seconds between checks for stale jobs and old result files')
+
+    def sweep(self, options):
+        # Another worker may have died mid-job since the last sweep, not only before this one started
+        failed = fail_stale_jobs(options['stale_after'])
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Marked {failed} stale running jobs as failed"))
+        removed = clean_results(getattr(settings, 'JOB_RESULTS_MAX_AGE_DAYS', 7) * 24 * 60 * 60)
+        if removed:
+            self.stdout.write(f"Deleted {removed} old job files")
+        delete_old_events()  # Streams only poll while someone is connected; keep the outbox short anyway
+
+    def handle(self, *args, **options):
+        self.sweep(options)
+        next_sweep = time.monotonic() + options['sweep_every']
+        self.stdout.write("Waiting for jobs...")
+        while True:
+            close_old_connections()  # Long-running process: drop dead MySQL connections
+            if time.monotonic() >= next_sweep:
+                self.sweep(options)
+                next_sweep = time.monotonic() + options['sweep_every']
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll'])
+                continue
+            self.stdout.write(f"Running job {job.job_id} ({job.job_type})")
+            job = run_job(job)
+            self.stdout.write(f"Job {job.job_id} {job.status}: {job.message}")
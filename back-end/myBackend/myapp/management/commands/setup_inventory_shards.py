@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+
+from myapp.models import IdSequence, Inventory, ReplicaHeartbeat
+from myapp.replicas import replica_aliases
+from myapp.sharding import atomic_shards, shard_aliases, shard_for_warehouse, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = "Create the inventory table on every shard in settings.INVENTORY_SHARDS and optionally move rows into it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--move-from-default', action='store_true',
+                            help="Move inventory rows from the 'default' database to their warehouse's shard")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError("settings.INVENTORY_SHARDS is empty; nothing to set up")
+
+        table = Inventory._meta.db_table
+        for alias in shard_aliases():
+            connection = connections[alias]
+            if table in connection.introspection.table_names():
+                self.stdout.write(f"{alias}: {table} already exists")
+                continue
+            with connection.schema_editor() as editor:
+                editor.create_model(Inventory)
+                # Same key as database/add_inventory_unique_product_warehouse.sql
+                editor.execute(
+                    f"CREATE UNIQUE INDEX uq_inventory_product_warehouse ON {table} (product_id, warehouse_id)"
+                )
+            self.stdout.write(self.style.SUCCESS(f"{alias}: created {table}"))
+
+        for alias in shard_aliases():
+            connection = connections[alias]
+            heartbeat_table = ReplicaHeartbeat._meta.db_table
+            # Shard replicas are checked for lag against this shard's own heartbeat row
+            if alias != 'default' and replica_aliases(alias) and heartbeat_table not in connection.introspection.table_names():
+                with connection.schema_editor() as editor:
+                    editor.create_model(ReplicaHeartbeat)
+                self.stdout.write(self.style.SUCCESS(f"{alias}: created {heartbeat_table}"))
+
+        if options['move_from_default']:
+            moved = self.move_from_default(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Moved {moved} inventory rows to their shards"))
+
+        duplicates = self.duplicate_ids()
+        if duplicates:
+            self.stdout.write(self.style.ERROR(
+                f"{len(duplicates)} inventory IDs exist on more than one shard (e.g. {duplicates[:10]}); "
+                "give those rows new IDs before serving traffic"
+            ))
+        next_value = self.seed_sequence()
+        self.stdout.write(self.style.SUCCESS(f"New inventory rows get IDs from {next_value}"))
+
+    def databases_with_inventory(self):
+        table = Inventory._meta.db_table
+        aliases = sorted({'default', *shard_aliases()})
+        return [alias for alias in aliases if table in connections[alias].introspection.table_names()]
+
+    def duplicate_ids(self):
+        seen, duplicates = set(), []
+        for alias in shard_aliases():
+            for inventory_id in Inventory.objects.using(alias).values_list('inventory_id', flat=True).iterator():
+                if inventory_id in seen:
+                    duplicates.append(inventory_id)
+                seen.add(inventory_id)
+        return sorted(duplicates)
+
+    def seed_sequence(self):
+        """Move the shared inventory ID sequence past every ID in use on any database"""
+        highest = max((Inventory.objects.using(alias).aggregate(highest=Max('inventory_id'))['highest'] or 0)
+                      for alias in self.databases_with_inventory())
+        sequence, _ = IdSequence.objects.get_or_create(name='inventory', defaults={'next_value': highest + 1})
+        if sequence.next_value <= highest:
+            IdSequence.objects.filter(name='inventory', next_value__lte=highest).update(next_value=highest + 1)
+            sequence.refresh_from_db()
+        return sequence.next_value
+
+    def move_from_default(self, batch_size):
+        if 'default' in shard_aliases():
+            raise CommandError("'default' is itself a shard; move rows by hand")
+        moved = 0
+        while True:
+            batch = list(Inventory.objects.using('default').order_by('inventory_id')[:batch_size])
+            if not batch:
+                return moved
+            by_shard = {}
+            for row in batch:
+                by_shard.setdefault(shard_for_warehouse(row.warehouse_id), []).append(row)
+            # Keep inventory_id so IDs stay unique across shards
+            with atomic_shards(['default', *by_shard]):
+                for alias, rows in by_shard.items():
+                    Inventory.objects.using(alias).bulk_create(rows)
+                Inventory.objects.using('default').filter(pk__in=[row.pk for row in batch]).delete()
+            moved += len(batch)
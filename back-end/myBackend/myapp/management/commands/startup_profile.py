@@ -0,0 +1,82 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so import and connection costs are measured cold
+PROFILE_SCRIPT = """
+import json, os, time
+timings = {}
+started = time.perf_counter()
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myBackend.settings')
+django.setup()
+timings['django_setup'] = time.perf_counter() - started
+
+from myapp import warmup
+for name, phase in [('import', warmup.import_modules), ('connect', warmup.connect_databases)]:
+    started = time.perf_counter()
+    phase()
+    timings[name] = time.perf_counter() - started
+
+requests = []
+for path in warmup.warmup_paths():
+    row = {'path': path}
+    for attempt in ('first', 'second'):
+        started = time.perf_counter()
+        row[attempt + '_status'] = warmup.request_path(path)
+        row[attempt] = time.perf_counter() - started
+    requests.append(row)
+print(json.dumps({'phases': timings, 'requests': requests}))
+"""
+
+
+def slowest_imports(importtime_log, limit):
+    """Top-level packages by cumulative import time, from `python -X importtime` output"""
+    totals = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue  # Nested import, already counted in its parent's cumulative time
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(cumulative)
+    return sorted(totals.items(), key=lambda item: -item[1])[:limit]
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start cost: Django setup, imports, DB connect and first vs. second request latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imports', type=int, default=15, help='Slowest top-level imports to list')
+        parser.add_argument('--json', action='store_true', help='Print the raw measurements as JSON')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'myBackend.settings')}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT],
+                                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"Profiling process failed:\n{result.stderr[-2000:]}")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        report['imports'] = slowest_imports(result.stderr, options['imports'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write("Startup phases:")
+        for name, seconds in report['phases'].items():
+            self.stdout.write(f"  {name:<14}{seconds * 1000:9.1f} ms")
+        self.stdout.write("Requests (first = cold caches, second = warm):")
+        for row in report['requests']:
+            self.stdout.write(f"  {row['path']:<24} first {row['first'] * 1000:8.1f} ms  "
+                              f"second {row['second'] * 1000:8.1f} ms  (HTTP {row['first_status']})")
+        self.stdout.write("Slowest imports (cumulative):")
+        for package, microseconds in report['imports']:
+            self.stdout.write(f"  {package:<24}{microseconds / 1000:9.1f} ms")
+        total = sum(report['phases'].values()) + sum(row['first'] for row in report['requests'])
+        self.stdout.write(self.style.SUCCESS(f"Cold start to last first response: {total * 1000:.1f} ms"))
@@ -0,0 +1,224 @@
+"""
+Request middleware for the API.
+
+RateLimitMiddleware applies a token bucket per client and endpoint class, and
+caps how many heavy list requests may run at once, so one script polling in a
+loop cannot starve MySQL for everybody else.
+
+ReadReplicaMiddleware lets `get_*` endpoints read from a replica (see
+replicas.py) and pins a client to the primary for a few seconds after it
+writes, so it always reads its own changes.
+
+ProfilingMiddleware profiles opted-in or sampled requests (see profiling.py),
+and SlowQueryMiddleware tags slow queries with the view that ran them.
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from .profiling import profile_request, should_profile
+from .replicas import replica_reads
+from .slow_queries import current_view
+
+# Endpoint class used for views not listed in RATE_LIMIT_ENDPOINT_CLASSES
+DEFAULT_ENDPOINT_CLASSES = {
+    'get_inventory': 'heavy',
+    'get_products': 'heavy',
+    'get_orders': 'heavy',
+    'get_order_items': 'heavy',
+    'get_batch': 'heavy',
+    'get_sales_report': 'heavy',
+    'get_reorder_suggestions': 'heavy',
+    'get_inventory_analytics': 'heavy',
+    'upload_stocktake': 'heavy',
+    'lookup_skus': 'read',  # Scanner batch lookups are POSTs but only read the SKU index
+    'event_stream': 'exempt',
+    'health_check': 'exempt',
+}
+
+# (requests per second, burst) for each endpoint class
+DEFAULT_RATE_LIMITS = {
+    'read': (20, 40),
+    'heavy': (2, 10),
+    'write': (10, 20),
+}
+
+
+def client_address(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR') if getattr(settings, 'RATE_LIMIT_TRUST_FORWARDED_FOR', False) else None
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', 'unknown')
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, rate, capacity, now):
+        """Consume one token; return 0 on success or seconds until one is available"""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / rate
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'RATE_LIMIT_ENABLED', True)
+        self.limits = {**DEFAULT_RATE_LIMITS, **getattr(settings, 'RATE_LIMITS', {})}
+        self.endpoint_classes = {**DEFAULT_ENDPOINT_CLASSES, **getattr(settings, 'RATE_LIMIT_ENDPOINT_CLASSES', {})}
+        self.max_buckets = getattr(settings, 'RATE_LIMIT_MAX_CLIENTS', 10000)
+        self.heavy_slots = threading.BoundedSemaphore(getattr(settings, 'HEAVY_REQUEST_CONCURRENCY', 4))
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def __call__(self, request):
+        if not self.enabled or request.method == 'OPTIONS':
+            return self.get_response(request)
+
+        endpoint_class = self.endpoint_class(request)
+        if endpoint_class == 'exempt':
+            return self.get_response(request)
+
+        wait = self.take_token(self.client_id(request), endpoint_class)
+        if wait:
+            return self.reject(429, "Too many requests, slow down", wait)
+
+        if endpoint_class != 'heavy':
+            return self.get_response(request)
+
+        # Admission control: refuse instead of queueing behind slow list queries
+        if not self.heavy_slots.acquire(blocking=False):
+            return self.reject(503, "Server busy, try again shortly", 1)
+        try:
+            return self.get_response(request)
+        finally:
+            self.heavy_slots.release()
+
+    def endpoint_class(self, request):
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return 'exempt'
+        if url_name in self.endpoint_classes:
+            return self.endpoint_classes[url_name]
+        return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+    def client_id(self, request):
+        return client_address(request)
+
+    def take_token(self, client, endpoint_class):
+        rate, capacity = self.limits[endpoint_class]
+        now = time.monotonic()
+        key = (client, endpoint_class)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_buckets:
+                    self.evict_idle(now)
+                bucket = self.buckets[key] = TokenBucket(capacity, now)
+            return bucket.take(rate, capacity, now)
+
+    def evict_idle(self, now):
+        # Drop buckets that have been idle long enough to be full again
+        idle = [key for key, bucket in self.buckets.items()
+                if now - bucket.updated > self.limits[key[1]][1] / self.limits[key[1]][0]]
+        for key in idle:
+            del self.buckets[key]
+        if len(self.buckets) >= self.max_buckets:
+            self.buckets.clear()
+
+    @staticmethod
+    def reject(status, message, retry_after):
+        response = JsonResponse({"error": message}, status=status)
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+
+class ReadReplicaMiddleware:
+    PIN_COOKIE = 'read_primary'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.window = getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5)
+        self.max_pins = getattr(settings, 'RATE_LIMIT_MAX_CLIENTS', 10000)
+        self.lock = threading.Lock()
+        self.pinned = {}  # client -> monotonic time the primary pin ends
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD'):
+            if self.replica_safe(request) and not self.is_pinned(request):
+                with replica_reads():
+                    return self.get_response(request)
+            return self.get_response(request)
+
+        response = self.get_response(request)
+        if request.method != 'OPTIONS' and response.status_code < 400:
+            self.pin(request, response)
+        return response
+
+    @staticmethod
+    def replica_safe(request):
+        # Delta syncs stay on the primary so the syncToken never runs ahead of the data returned
+        if 'since' in request.GET:
+            return False
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return False
+        return bool(url_name) and url_name.startswith('get_')
+
+    def is_pinned(self, request):
+        # The cookie covers browsers talking to any worker; the map covers clients without cookies
+        if request.COOKIES.get(self.PIN_COOKIE):
+            return True
+        with self.lock:
+            until = self.pinned.get(client_address(request))
+        return until is not None and until > time.monotonic()
+
+    def pin(self, request, response):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.pinned) >= self.max_pins:
+                self.pinned = {client: until for client, until in self.pinned.items() if until > now}
+                if len(self.pinned) >= self.max_pins:
+                    self.pinned.clear()
+            self.pinned[client_address(request)] = now + self.window
+        response.set_cookie(self.PIN_COOKIE, '1', max_age=self.window, samesite='Lax')
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if should_profile(request):
+            return profile_request(request, self.get_response)
+        return self.get_response(request)
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = current_view.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_view.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_view.set(getattr(view_func, '__name__', None))
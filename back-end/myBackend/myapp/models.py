@@ -53,6 +53,7 @@ class Product(models.Model):
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.IntegerField(default=1)  # Incremented by every write; checked against If-Match
 
     class Meta:
         db_table = 'products'
@@ -67,11 +68,23 @@ class Inventory(models.Model):
     warehouse_id = models.IntegerField()
     quantity = models.IntegerField()
     last_updated = models.DateTimeField(auto_now=True)
+    version = models.IntegerField(default=1)  # Incremented by every write; checked against If-Match
 
     class Meta:
         db_table = 'inventory'
         managed = False
 
+class IdSequence(models.Model):
+    # Next free ID of a table whose rows are spread over several databases, so
+    # that no database's own auto_increment can hand out an ID another one used.
+    # Inventory rows on warehouse shards take their IDs from the 'inventory' row.
+    name = models.CharField(max_length=64, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'id_sequences'
+        managed = False
+
 class Order(models.Model):
     order_id = models.AutoField(primary_key=True)
     order_date = models.DateTimeField(auto_now_add=True)
@@ -79,6 +92,7 @@ class Order(models.Model):
     customer_name = models.CharField(max_length=255, blank=True, null=True)
     status = models.CharField(max_length=50, blank=True, null=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Delta sync reads changes by this, not order_date
 
     class Meta:
         db_table = 'orders'
@@ -91,11 +105,227 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'order_items'
         managed = False
 
+class OrderItemAllocation(models.Model):
+    # How much of an order item's quantity was taken from each inventory row
+    allocation_id = models.AutoField(primary_key=True)
+    order_item_id = models.IntegerField()
+    order_id = models.IntegerField()
+    product_id = models.IntegerField()
+    inventory_id = models.IntegerField()
+    warehouse_id = models.IntegerField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        db_table = 'order_item_allocations'
+        managed = False
+
+class DailyProductSales(models.Model):
+    # Pre-aggregated units and revenue per product per day, kept in step with
+    # order_items writes by rollups.py and rebuilt by `rebuild_sales_rollups`.
+    rollup_id = models.AutoField(primary_key=True)
+    sales_date = models.DateField()
+    product_id = models.IntegerField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_product_sales'
+        managed = False
+        unique_together = (('sales_date', 'product_id'),)
+
+class DailyWarehouseSales(models.Model):
+    # Same rollup as DailyProductSales, keyed by the warehouse that shipped the stock
+    rollup_id = models.AutoField(primary_key=True)
+    sales_date = models.DateField()
+    warehouse_id = models.IntegerField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'daily_warehouse_sales'
+        managed = False
+        unique_together = (('sales_date', 'warehouse_id'),)
+
+class IdempotencyKey(models.Model):
+    # Stored first response for a request sent with an Idempotency-Key header.
+    # A row with no status_code is a claim held by a request still running.
+    # claimed_at tells a running request's claim from one left by a dead worker.
+    key = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.IntegerField(blank=True, null=True)
+    content_type = models.CharField(max_length=100, blank=True, null=True)
+    response_body = models.BinaryField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        managed = False
+
+class BackgroundJob(models.Model):
+    # Queued heavy operation, run outside the request by `manage.py run_jobs`
+    job_id = models.AutoField(primary_key=True)
+    job_type = models.CharField(max_length=64)
+    params = models.TextField(blank=True, null=True)  # JSON-encoded handler parameters
+    status = models.CharField(max_length=20, default='queued')  # queued, running, succeeded, failed, cancelled
+    progress = models.IntegerField(default=0)  # Percent complete
+    message = models.CharField(max_length=255, blank=True, null=True)
+    result_file = models.CharField(max_length=255, blank=True, null=True)  # File name inside JOB_RESULTS_DIR
+    cancel_requested = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'background_jobs'
+        managed = False
+
+class DeletedRecord(models.Model):
+    # Tombstone written whenever a row is deleted so delta-sync clients
+    # (list endpoints called with ?since=) can drop it from their local copy.
+    deleted_record_id = models.AutoField(primary_key=True)
+    table_name = models.CharField(max_length=64)
+    record_id = models.IntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'deleted_records'
+        managed = False
+
+class ChangeEvent(models.Model):
+    # Outbox of change events for the /api/events/ stream. Any process (web
+    # worker, run_jobs, management command) inserts here after its write
+    # commits; every process with open streams polls for new rows.
+    event_id = models.AutoField(primary_key=True)  # Also the SSE id clients resume from
+    event = models.CharField(max_length=64)
+    data = models.TextField()  # JSON-encoded payload
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'change_events'
+        managed = False
+
+class ReplicaHeartbeat(models.Model):
+    # Single row the primary rewrites every few seconds (`manage.py replica_heartbeat`).
+    # A replica's copy of beat_at shows how far behind the primary it is.
+    heartbeat_id = models.IntegerField(primary_key=True)
+    beat_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'replica_heartbeat'
+        managed = False
+
+class ArchivedOrder(models.Model):
+    # Orders older than ORDER_ARCHIVE_DAYS, moved out of `orders` by `manage.py archive_orders`
+    order_id = models.IntegerField(primary_key=True)
+    order_date = models.DateTimeField()
+    supplier_id = models.IntegerField(blank=True, null=True)
+    customer_name = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=50, blank=True, null=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    updated_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'orders_archive'
+        managed = False
+
+class ArchivedOrderItem(models.Model):
+    order_item_id = models.IntegerField(primary_key=True)
+    order_id = models.IntegerField()
+    product_id = models.IntegerField()
+    quantity = models.IntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    updated_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'order_items_archive'
+        managed = False
+
+class ArchivedOrderItemAllocation(models.Model):
+    allocation_id = models.IntegerField(primary_key=True)
+    order_item_id = models.IntegerField()
+    order_id = models.IntegerField()
+    product_id = models.IntegerField()
+    inventory_id = models.IntegerField()
+    warehouse_id = models.IntegerField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        db_table = 'order_item_allocations_archive'
+        managed = False
+
+class Stocktake(models.Model):
+    # One uploaded physical count; lines hold the counted and system quantities
+    stocktake_id = models.AutoField(primary_key=True)
+    status = models.CharField(max_length=20, default='open')  # open, applied
+    full_count = models.BooleanField(default=False)  # Uncounted stock in the counted warehouses counts as zero
+    note = models.CharField(max_length=255, blank=True, null=True)
+    line_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'stocktakes'
+        managed = False
+
+class StocktakeLine(models.Model):
+    stocktake_line_id = models.AutoField(primary_key=True)
+    stocktake_id = models.IntegerField()
+    warehouse_id = models.IntegerField()
+    product_id = models.IntegerField()
+    counted_quantity = models.IntegerField()
+    system_quantity = models.IntegerField()  # Stock on record when the count was uploaded
+    variance = models.IntegerField()  # counted_quantity - system_quantity
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    applied = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'stocktake_lines'
+        managed = False
+
+class StockReservation(models.Model):
+    # Units of one inventory row held for one worker's hot-SKU sales (reservations.py).
+    # They stay in inventory.quantity until the worker flushes the sales made from them.
+    reservation_id = models.AutoField(primary_key=True)
+    owner = models.CharField(max_length=100)  # host:pid:token of the worker holding the units
+    inventory_id = models.IntegerField()
+    product_id = models.IntegerField()
+    warehouse_id = models.IntegerField()
+    reserved = models.IntegerField()
+    expires_at = models.DateTimeField()  # Renewed on every flush; reclaimed by reconcile once past
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_reservations'
+        managed = False
+
+class StockReservationUse(models.Model):
+    # A sale taken from a reservation, written in the order item's transaction
+    # and deleted once its quantity has been flushed to the inventory row
+    use_id = models.AutoField(primary_key=True)
+    reservation_id = models.IntegerField()
+    inventory_id = models.IntegerField()
+    quantity = models.IntegerField()
+    # The sale's rollup contribution, booked by the flush instead of the sale's transaction;
+    # null on rows whose sale already updated the rollups itself
+    product_id = models.IntegerField(blank=True, null=True)
+    warehouse_id = models.IntegerField(blank=True, null=True)
+    sales_date = models.DateField(blank=True, null=True)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_reservation_uses'
+        managed = False
+
 class User(models.Model):
     user_id = models.AutoField(primary_key=True)
     username = models.CharField(max_length=255, unique=True)
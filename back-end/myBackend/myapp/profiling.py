@@ -0,0 +1,157 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware runs a request under cProfile when it carries an
+`X-Profile` header matching settings.PROFILING_TOKEN, or when it is picked by
+settings.PROFILING_SAMPLE_RATE. Every SQL statement the request runs is
+recorded with its duration. Each profile is saved to PROFILES_DIR as a
+`.prof` file (load it with pstats or snakeviz) plus a `.json` summary with the
+slowest functions and the SQL log. Only the newest PROFILES_MAX_FILES profiles
+are kept.
+
+The /api/profiles/ endpoints list and download them and require the same
+token, since the SQL log shows query parameters.
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import pstats
+import random
+import secrets
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+PROFILE_HEADER = 'X-Profile'
+TOP_FUNCTIONS = 40  # Rows of the cumulative-time table kept in the summary
+
+# cProfile can only be active once per process, so concurrent requests are not profiled
+_profiler_lock = threading.Lock()
+
+
+def profiles_dir():
+    path = Path(getattr(settings, 'PROFILES_DIR', settings.BASE_DIR / 'profiles'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def is_authorized(request):
+    token = getattr(settings, 'PROFILING_TOKEN', '')
+    supplied = request.headers.get(PROFILE_HEADER, '')
+    return bool(token) and hmac.compare_digest(supplied, token)
+
+
+def should_profile(request):
+    if is_authorized(request):
+        return True
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+class QueryLog:
+    """execute_wrapper that records every statement with its duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def wrapper_for(self, alias):
+        def wrapper(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append({
+                    'database': alias,
+                    'sql': sql,
+                    'params': [str(p) for p in params] if params and not many else None,
+                    'many': many,
+                    'ms': round((time.perf_counter() - started) * 1000, 3),
+                })
+        return wrapper
+
+
+def profile_request(request, get_response):
+    """Run get_response under cProfile and the query log, then save the profile"""
+    if not _profiler_lock.acquire(blocking=False):
+        return get_response(request)
+    try:
+        return _profile(request, get_response)
+    finally:
+        _profiler_lock.release()
+
+
+def _profile(request, get_response):
+    profiler = cProfile.Profile()
+    query_log = QueryLog()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(query_log.wrapper_for(alias)))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    elapsed = time.perf_counter() - started
+    profile_id = save_profile(request, response, profiler, query_log.queries, elapsed)
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def save_profile(request, response, profiler, queries, elapsed):
+    directory = profiles_dir()
+    profile_id = f"{timezone.now():%Y%m%d-%H%M%S}-{secrets.token_hex(4)}"
+    profiler.dump_stats(directory / f"{profile_id}.prof")
+
+    stats_text = io.StringIO()
+    pstats.Stats(profiler, stream=stats_text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    summary = {
+        'id': profile_id,
+        'createdAt': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'ms': round(elapsed * 1000, 3),
+        'sqlCount': len(queries),
+        'sqlMs': round(sum(q['ms'] for q in queries), 3),
+        'sql': queries,
+        'topFunctions': stats_text.getvalue(),
+    }
+    (directory / f"{profile_id}.json").write_text(json.dumps(summary, indent=1), encoding='utf-8')
+    prune(directory)
+    return profile_id
+
+
+def prune(directory):
+    """Delete the oldest profiles beyond PROFILES_MAX_FILES"""
+    keep = getattr(settings, 'PROFILES_MAX_FILES', 50)
+    summaries = sorted(directory.glob('*.json'), reverse=True)  # IDs start with the timestamp
+    for summary in summaries[keep:]:
+        summary.unlink(missing_ok=True)
+        summary.with_suffix('.prof').unlink(missing_ok=True)
+
+
+def list_profiles():
+    rows = []
+    for path in sorted(profiles_dir().glob('*.json'), reverse=True):
+        try:
+            summary = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue  # Pruned or half-written by another worker
+        rows.append({key: summary.get(key) for key in ('id', 'createdAt', 'method', 'path', 'status', 'ms', 'sqlCount', 'sqlMs')})
+    return rows
+
+
+def profile_path(profile_id, suffix):
+    """Path of a stored profile file, or None for unknown or malformed IDs"""
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    path = profiles_dir() / f"{profile_id}{suffix}"
+    return path if path.is_file() else None
@@ -0,0 +1,146 @@
+"""
+Read replica routing.
+
+ReadReplicaMiddleware marks GET requests to `get_*` endpoints as replica-safe,
+and while that mark is set ReadReplicaRouter sends reads to one of
+settings.READ_REPLICAS. Everything else (writes, reads inside a transaction,
+reads for any other request) stays on the primary, 'default'. Inventory
+shards are replicated separately: sharding.read_alias() asks the router with
+a `shard` hint and gets one of that shard's SHARD_READ_REPLICAS.
+
+Replica lag is measured with a heartbeat: `manage.py replica_heartbeat`
+rewrites a timestamp on each replicated primary, and the copy of that row on a replica
+shows how far behind it is. Replicas more than REPLICA_MAX_LAG_SECONDS behind,
+or that cannot be queried, are skipped until the next check.
+
+After a successful write a client is pinned to the primary for
+READ_YOUR_WRITES_SECONDS, so it always sees its own change even when the
+replicas have not caught up yet.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import ReplicaHeartbeat
+from .sharding import SHARDED_MODELS, sharding_enabled
+
+HEARTBEAT_ID = 1
+
+_replica_reads = ContextVar('replica_reads', default=False)
+_lag_lock = threading.Lock()
+_lag_checks = {}  # alias -> (monotonic time of the check, healthy)
+_round_robin = itertools.count()
+
+
+def replica_aliases(primary='default'):
+    """Aliases replicating `primary`: READ_REPLICAS for 'default', SHARD_READ_REPLICAS for a shard"""
+    if primary == 'default':
+        return list(getattr(settings, 'READ_REPLICAS', None) or [])
+    return list(getattr(settings, 'SHARD_READ_REPLICAS', {}).get(primary) or [])
+
+
+def replicated_primaries():
+    """'default' and every shard that has replicas configured"""
+    return ['default', *(alias for alias, replicas in getattr(settings, 'SHARD_READ_REPLICAS', {}).items() if replicas)]
+
+
+def all_replica_aliases():
+    return {replica for primary in replicated_primaries() for replica in replica_aliases(primary)}
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Allow (or, with enabled=False, forbid) replica reads inside the block"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def write_heartbeat(using='default'):
+    ReplicaHeartbeat.objects.using(using).update_or_create(
+        heartbeat_id=HEARTBEAT_ID, defaults={'beat_at': timezone.now()})
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary, or None if it cannot tell"""
+    beat_at = (ReplicaHeartbeat.objects.using(alias).filter(heartbeat_id=HEARTBEAT_ID)
+               .values_list('beat_at', flat=True).first())
+    if beat_at is None:
+        return None
+    return max(0.0, (timezone.now() - beat_at).total_seconds())
+
+
+def _is_healthy(alias):
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError:
+        return False
+    return lag is not None and lag <= max_lag
+
+
+def healthy_replicas(primary='default'):
+    """Replicas of `primary` within the lag limit, re-checked every REPLICA_LAG_CHECK_INTERVAL seconds"""
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 2)
+    now = time.monotonic()
+    healthy = []
+    for alias in replica_aliases(primary):
+        with _lag_lock:
+            checked = _lag_checks.get(alias)
+        if checked is None or now - checked[0] > interval:
+            # Record the check first so concurrent requests do not all probe the replica
+            with _lag_lock:
+                _lag_checks[alias] = (now, checked[1] if checked else False)
+            checked = (now, _is_healthy(alias))
+            with _lag_lock:
+                _lag_checks[alias] = checked
+        if checked[1]:
+            healthy.append(alias)
+    return healthy
+
+
+class ReadReplicaRouter:
+    """Send replica-safe reads to a healthy replica and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or model is ReplicaHeartbeat:
+            return None
+        if model._meta.app_label == 'django_cache':
+            return None  # DatabaseCache: a lagging copy of the version counters would serve stale bodies
+        shard = hints.get('shard')  # Set by sharding.read_alias()
+        if model in SHARDED_MODELS and sharding_enabled() and shard is None:
+            return None  # WarehouseShardRouter picks the shard of a single row
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return None
+        primary = shard or 'default'
+        if connections[primary].in_atomic_block:
+            return None  # A transaction must read what it is about to write
+        replicas = healthy_replicas(primary)
+        if not replicas:
+            return None
+        return replicas[next(_round_robin) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {'default', *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in all_replica_aliases():
+            return False
+        return None
@@ -0,0 +1,478 @@
+"""
+Reserved stock budgets for hot SKUs.
+
+During a promotion a few products sell hundreds of times a second, and
+allocate_stock() makes every one of those sales wait for the same inventory
+row lock. Products listed in settings.STOCK_RESERVATION_PRODUCTS are sold
+from per-worker budgets instead:
+
+- reserve: the worker's background thread takes a block of
+  STOCK_RESERVATION_BLOCK units of an inventory row into a stock_reservations
+  row it owns. That is one short row lock per block, not per sale. Held units
+  stay in inventory.quantity but allocate_stock() and stock transfers can no
+  longer take them, and manual edits and stocktakes cannot set the quantity
+  below them. Deleting an inventory row deletes its reservations.
+- admit:   a sale is checked against the worker's in-memory budget under a
+  process lock and journalled as a stock_reservation_uses row in the order
+  item's own transaction, together with its sales-rollup contribution. The
+  insert waits on no shared row lock: neither the inventory row nor the day's
+  daily_product_sales / daily_warehouse_sales rows are touched.
+- flush:   every STOCK_RESERVATION_FLUSH_SECONDS the journalled sales are
+  applied in one transaction: the journal rows are locked, one UPDATE per
+  inventory row subtracts what the locked rows sold from it, the reservation
+  shrinks by the same amount, one upsert per rollup row books their sales
+  (rollups.apply_sales) and exactly those journal rows are deleted.
+
+Stock is never sold twice: under the inventory row lock quantity minus the
+held units never goes below zero, and a worker admits at most the units it
+holds. The in-memory count of admitted units is rebuilt from the journal:
+each sale remembers the journal rows it wrote, flush forgets the ones it
+applied, and rows still missing from the journal a lease after they were
+written belong to transactions that rolled back (or failed to commit), so
+their units return to the budget. Sold units are subtracted without clamping, so if that ever fails the
+row goes negative and the oversell is logged instead of disappearing.
+
+Nothing committed lives only in memory: the journal row commits with the
+sale. Each flush renews the lease (expires_at) on the worker's reservations,
+and the worker stops admitting once half a lease has passed without a
+renewal. reconcile() applies the journal of expired reservations, which
+belonged to workers that died, and deletes them, releasing the unsold units.
+Every worker's background thread runs it when the worker boots and then once
+per lease, so a crashed worker's holds are recovered within about two leases
+of the crash even when its replacement booted before they expired; `manage.py
+reconcile_reservations` does the same from outside the web workers.
+"""
+
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .allocation import (InsufficientStockError, allocate_stock, default_policy, held_quantities, plan_allocation,
+                         reservations_enabled)
+from .events import publish_inventory_change
+from .models import Inventory, StockReservation, StockReservationUse
+from .response_cache import bump_versions
+from .rollups import apply_sales, sales_date_for_order
+from .sharding import atomic_shards, shard_aliases, shard_for_warehouse
+
+logger = logging.getLogger(__name__)
+
+# Journal columns carrying a sale's rollup contribution, read after use_id, reservation/inventory id and quantity
+ROLLUP_FIELDS = ('product_id', 'warehouse_id', 'sales_date', 'unit_price')
+
+
+def hot_products():
+    return set(getattr(settings, 'STOCK_RESERVATION_PRODUCTS', None) or ())
+
+
+def block_size():
+    return getattr(settings, 'STOCK_RESERVATION_BLOCK', 50)
+
+
+def flush_seconds():
+    return getattr(settings, 'STOCK_RESERVATION_FLUSH_SECONDS', 0.5)
+
+
+def lease_seconds():
+    return getattr(settings, 'STOCK_RESERVATION_LEASE_SECONDS', 30)
+
+
+class Slot:
+    """This worker's reservation on one inventory row"""
+
+    def __init__(self, reservation):
+        self.reservation_id = reservation.reservation_id
+        self.inventory_id = reservation.inventory_id
+        self.product_id = reservation.product_id
+        self.warehouse_id = reservation.warehouse_id
+        self.alias = shard_for_warehouse(reservation.warehouse_id)
+        self.reserved = reservation.reserved  # Units held in the database
+        self.pending = 0                      # Units admitted whose journal row is not written yet
+        self.uses = {}                        # use_id -> (units, monotonic time written), not flushed yet
+        self.last_used = time.monotonic()
+
+    @property
+    def admitted(self):
+        """Units sold, or being sold, and not flushed yet"""
+        return self.pending + sum(units for units, _ in self.uses.values())
+
+    @property
+    def budget(self):
+        return self.reserved - self.admitted
+
+    def as_inventory(self):
+        """The slot as an Inventory row whose quantity is the unsold budget, for plan_allocation()"""
+        inventory = Inventory(inventory_id=self.inventory_id, product_id=self.product_id,
+                              warehouse_id=self.warehouse_id, quantity=self.budget)
+        inventory._state.db = self.alias
+        return inventory
+
+
+class ReservationPool:
+    """Per-process budgets, refilled and flushed by one background thread"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def start(self):
+        """Start this process's background thread; gunicorn.conf.py calls it when a worker boots"""
+        # Workers fork from a preloaded master: each process needs its own owner and thread
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[:100]
+            self._slots = {}          # product_id -> {inventory_id: Slot}
+            self._wanted = {}         # product_id -> units a waiting sale needs
+            self._refills = {}        # product_id -> refill rounds completed
+            self._lease_deadline = 0.0
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='stock-reservations', daemon=True).start()
+            atexit.register(self.release_all)
+
+    def _leased(self):
+        return time.monotonic() < self._lease_deadline
+
+    def admit(self, product_id, quantity, policy=None, preferred_warehouse_id=None):
+        """Take quantity out of this worker's budget for product_id; returns [(slot, take)]"""
+        self.start()
+        deadline = time.monotonic() + getattr(settings, 'STOCK_RESERVATION_WAIT_SECONDS', 5)
+        first_round = None
+        with self._cond:
+            while True:
+                slots = {slot.inventory_id: slot for slot in self._slots.get(product_id, {}).values()}
+                rows = [slot.as_inventory() for slot in slots.values()] if self._leased() else []
+                try:
+                    plan = plan_allocation(rows, quantity, policy or default_policy(), preferred_warehouse_id)
+                    break
+                except InsufficientStockError:
+                    refills = self._refills.get(product_id, 0)
+                    if first_round is None:
+                        first_round = refills
+                    elif refills >= first_round + 2 and self._leased():
+                        # A full refill round has run since this sale asked (the one already
+                        # running when it asked may not have seen it): the stock is not there
+                        raise
+                    if time.monotonic() >= deadline:
+                        raise
+                    self._wanted[product_id] = max(self._wanted.get(product_id, 0), quantity)
+                    self._wake.set()
+                    self._cond.wait(deadline - time.monotonic())
+            now = time.monotonic()
+            entries = []
+            for row, take in plan:
+                slot = slots[row.inventory_id]
+                slot.pending += take
+                slot.last_used = now
+                entries.append((slot, take))
+            return entries
+
+    def refund(self, entries):
+        """Give back the units of a sale whose journal rows could not be written"""
+        with self._cond:
+            for slot, take in entries:
+                slot.pending -= take
+            self._cond.notify_all()
+
+    def record(self, entries, uses):
+        """Move a sale's units from pending to the journal rows that now carry them"""
+        now = time.monotonic()
+        with self._cond:
+            for (slot, take), use in zip(entries, uses):
+                slot.pending -= take
+                slot.uses[use.use_id] = (take, now)
+
+    def _run(self):
+        next_reconcile = 0.0
+        while True:
+            if time.monotonic() >= next_reconcile:
+                # Reclaim the holds of workers that died, including ones whose lease was
+                # still running when this worker booted
+                next_reconcile = time.monotonic() + lease_seconds()
+                try:
+                    reconcile()
+                except Exception:
+                    logger.exception("Reconciling expired stock reservations failed")
+            self._wake.wait(flush_seconds())
+            self._wake.clear()
+            close_old_connections()  # Long-running thread: drop dead MySQL connections
+            try:
+                self.refill()
+                self.flush()  # Also renews the lease that lets fresh budgets be sold from
+                self.release_idle()
+            except Exception:
+                logger.exception("Stock reservation round failed")
+
+    def _all_slots(self):
+        with self._cond:
+            return {slot.reservation_id: slot for slots in self._slots.values() for slot in slots.values()}
+
+    def flush(self):
+        """Apply journalled sales with one UPDATE per inventory row and renew this worker's lease"""
+        started = time.monotonic()
+        slots = self._all_slots()
+        if not slots:
+            return
+        candidates = set(StockReservationUse.objects.filter(reservation_id__in=list(slots))
+                         .values_list('use_id', flat=True))
+
+        with transaction.atomic():
+            # Lock the journal rows and apply only those: a row reconcile() or a
+            # rolled-back sale removed since the read above is not counted
+            uses = list(StockReservationUse.objects.select_for_update()
+                        .filter(pk__in=candidates)
+                        .values_list('use_id', 'reservation_id', 'quantity', *ROLLUP_FIELDS))
+            sold = {}
+            for _, reservation_id, quantity, *_ in uses:
+                sold[reservation_id] = sold.get(reservation_id, 0) + quantity
+            flushed = sorted((slots[reservation_id] for reservation_id in sold),
+                             key=lambda s: (s.alias, s.inventory_id))
+            aliases = {slot.alias for slot in flushed}
+            with atomic_shards(aliases):
+                now = timezone.now()
+                # Inventory rows first, then reservations: the lock order allocate_stock() uses
+                for slot in flushed:
+                    Inventory.objects.using(slot.alias).filter(pk=slot.inventory_id).update(
+                        quantity=F('quantity') - sold[slot.reservation_id],
+                        version=F('version') + 1,
+                        last_updated=now,
+                    )
+                    StockReservation.objects.filter(pk=slot.reservation_id).update(
+                        reserved=F('reserved') - sold[slot.reservation_id])
+                book_rollups(use[2:] for use in uses)
+                StockReservationUse.objects.filter(pk__in=[use[0] for use in uses]).delete()
+                StockReservation.objects.filter(owner=self.owner).update(
+                    expires_at=now + timedelta(seconds=lease_seconds()))
+                live = set(StockReservation.objects.filter(owner=self.owner).values_list('reservation_id', flat=True))
+                for alias in aliases:
+                    # QuerySet.update() sends no signals
+                    bump_versions('inventory', using=alias,
+                                  keys=[slot.product_id for slot in flushed if slot.alias == alias])
+                    for inventory in Inventory.objects.using(alias).filter(
+                            pk__in=[slot.inventory_id for slot in flushed if slot.alias == alias]):
+                        publish_inventory_change(inventory)  # One event per row per flush, not per sale
+                        log_oversold(inventory)
+
+        applied = {use[0] for use in uses}
+        written_before = started - lease_seconds()
+        with self._cond:
+            for slot in flushed:
+                slot.reserved -= sold[slot.reservation_id]
+            for reservation_id, slot in slots.items():
+                for use_id, (_, written_at) in list(slot.uses.items()):
+                    # Applied now, or still not in the journal a lease after it was written:
+                    # the sale's transaction rolled back and its units are free again
+                    if use_id in applied or (use_id not in candidates and written_at < written_before):
+                        del slot.uses[use_id]
+                if reservation_id not in live:
+                    # Reclaimed by reconcile() after a stalled lease: its units are no longer held
+                    self._slots.get(slot.product_id, {}).pop(slot.inventory_id, None)
+            self._lease_deadline = started + lease_seconds() / 2
+            self._cond.notify_all()
+
+    def refill(self):
+        """Reserve stock for products a sale is waiting on or whose budget is below half a block"""
+        block = block_size()
+        with self._cond:
+            needs = {product_id: max(block, wanted) for product_id, wanted in self._wanted.items()}
+            self._wanted.clear()
+            for product_id, slots in self._slots.items():
+                if product_id in hot_products() and sum(slot.budget for slot in slots.values()) < block / 2:
+                    needs.setdefault(product_id, block)
+        for product_id, need in needs.items():
+            try:
+                self.reserve(product_id, need)
+            finally:
+                with self._cond:
+                    self._refills[product_id] = self._refills.get(product_id, 0) + 1
+                    self._cond.notify_all()
+
+    def reserve(self, product_id, need):
+        """Hold up to `need` more units of product_id, taking from the rows with the most free stock first"""
+        with self._cond:
+            slots = dict(self._slots.get(product_id, {}))
+        aliases = sorted(shard_aliases())
+        granted = []
+        with atomic_shards([*aliases, 'default']):
+            rows = []
+            for alias in aliases:
+                rows.extend(Inventory.objects.using(alias).select_for_update()
+                            .filter(product_id=product_id)
+                            .order_by('inventory_id'))
+            held = held_quantities(rows)
+            free = sorted(((row.quantity - held.get(row.inventory_id, 0), row) for row in rows),
+                          key=lambda pair: (-pair[0], pair[1].inventory_id))
+            expires_at = timezone.now() + timedelta(seconds=lease_seconds())
+            remaining = need
+            for units, row in free:
+                if remaining <= 0 or units <= 0:
+                    break
+                take = min(units, remaining)
+                remaining -= take
+                slot = slots.get(row.inventory_id)
+                if slot is not None:
+                    StockReservation.objects.filter(pk=slot.reservation_id).update(
+                        reserved=F('reserved') + take, expires_at=expires_at)
+                    granted.append((slot, take))
+                else:
+                    reservation = StockReservation.objects.create(
+                        owner=self.owner, inventory_id=row.inventory_id, product_id=product_id,
+                        warehouse_id=row.warehouse_id, reserved=take, expires_at=expires_at)
+                    granted.append((Slot(reservation), 0))
+
+        with self._cond:
+            product_slots = self._slots.setdefault(product_id, {})
+            for slot, take in granted:
+                slot.reserved += take  # New slots already hold what they were created with
+                product_slots[slot.inventory_id] = slot
+
+    def release_idle(self):
+        """Give back budgets nobody has sold from for STOCK_RESERVATION_IDLE_SECONDS"""
+        idle_after = getattr(settings, 'STOCK_RESERVATION_IDLE_SECONDS', 60)
+        now = time.monotonic()
+        with self._cond:
+            idle = [slot for slot in self._all_slots().values()
+                    if slot.admitted == 0 and (now - slot.last_used > idle_after or slot.product_id not in hot_products())]
+            for slot in idle:
+                self._slots[slot.product_id].pop(slot.inventory_id, None)
+        if idle:
+            StockReservation.objects.filter(pk__in=[slot.reservation_id for slot in idle]).delete()
+
+    def release_all(self):
+        """Flush and give back every budget; run when the worker exits"""
+        if self._pid != os.getpid():
+            return
+        try:
+            with self._cond:
+                self._lease_deadline = 0.0  # Admit nothing more
+            self.flush()
+            StockReservation.objects.filter(owner=self.owner).delete()
+        except Exception:
+            logger.exception("Releasing stock reservations failed; reconcile will reclaim them")
+
+
+def log_oversold(inventory):
+    # Holds are meant to keep quantity >= units sold from them; a negative row is
+    # left visible rather than clamped to zero so the oversell can be found
+    if inventory.quantity < 0:
+        logger.error("Inventory %s is oversold by %s units after applying reserved hot-SKU sales",
+                     inventory.inventory_id, -inventory.quantity)
+
+
+def book_rollups(uses):
+    """Book the rollup contribution of journal rows given as (quantity, *ROLLUP_FIELDS) tuples"""
+    apply_sales((sales_date, product_id, warehouse_id, quantity, unit_price)
+                for quantity, product_id, warehouse_id, sales_date, unit_price in uses
+                if sales_date is not None)  # Rows from before the rollup columns were booked by their sale
+
+
+def drop_reservations(inventory_ids):
+    """Delete the holds and unapplied sales of deleted inventory rows; call inside the delete's transaction"""
+    if not reservations_enabled() or not inventory_ids:
+        return
+    dropped = StockReservationUse.objects.filter(inventory_id__in=inventory_ids)
+    book_rollups(dropped.values_list('quantity', *ROLLUP_FIELDS))  # The sales happened even though the row is gone
+    dropped.delete()
+    StockReservation.objects.filter(inventory_id__in=inventory_ids).delete()
+
+
+pool = ReservationPool()
+
+
+def rollups_deferred(product_id):
+    """True when allocated_stock() journals this product's sales and flush() books their rollups"""
+    return product_id in hot_products()
+
+
+@contextmanager
+def allocated_stock(product_id, quantity, policy=None, preferred_warehouse_id=None, sale=None):
+    """Yield a plan of (inventory, taken) like allocate_stock(); use inside the order item's transaction.
+
+    Hot products are sold from this worker's reserved budget: the sale is
+    journalled in the caller's transaction. Its units go back to the budget at
+    once if the journal rows cannot be written, and otherwise when flush()
+    finds the rows never committed. sale is the order item's (order_id,
+    unit_price): for hot products its rollup delta is journalled too and
+    booked by flush(), so the caller must only book rollups itself when
+    rollups_deferred() is False.
+    """
+    if not rollups_deferred(product_id):
+        yield allocate_stock(product_id, quantity, policy, preferred_warehouse_id)
+        return
+    if quantity <= 0:
+        raise ValueError("Quantity must be greater than zero")
+    rollup = {}
+    if sale is not None:
+        order_id, unit_price = sale
+        rollup = {'sales_date': sales_date_for_order(order_id), 'unit_price': Decimal(str(unit_price))}
+    entries = pool.admit(product_id, quantity, policy, preferred_warehouse_id)
+    try:
+        # One create() per row, not bulk_create(): MySQL does not return the new IDs
+        uses = [StockReservationUse.objects.create(reservation_id=slot.reservation_id, inventory_id=slot.inventory_id,
+                                                   quantity=take, product_id=product_id,
+                                                   warehouse_id=slot.warehouse_id, **rollup)
+                for slot, take in entries]
+    except BaseException:
+        pool.refund(entries)
+        raise
+    pool.record(entries, uses)
+    yield [(slot.as_inventory(), take) for slot, take in entries]
+
+
+def reconcile():
+    """Apply the journal of expired reservations and delete them; returns (reservations, units)"""
+    cutoff = timezone.now()
+    expired = list(StockReservation.objects.filter(expires_at__lt=cutoff).values_list('reservation_id', flat=True))
+    live = list(StockReservation.objects.filter(expires_at__gte=cutoff).values_list('reservation_id', flat=True))
+    # Uses whose reservation is already gone (a sale that committed after its
+    # reservation was reclaimed) are applied once they are older than a lease
+    candidates = list(StockReservationUse.objects.filter(reservation_id__in=expired).values_list('use_id', flat=True))
+    candidates += list(StockReservationUse.objects
+                       .filter(created_at__lt=cutoff - timedelta(seconds=lease_seconds()))
+                       .exclude(reservation_id__in=live + expired)
+                       .values_list('use_id', flat=True))
+    if not expired and not candidates:
+        return 0, 0
+
+    with transaction.atomic():
+        # Lock by primary key so two reconcilers never apply the same sale twice
+        uses = list(StockReservationUse.objects.select_for_update()
+                    .filter(pk__in=candidates)
+                    .values_list('use_id', 'inventory_id', 'quantity', *ROLLUP_FIELDS))
+        sold = {}
+        for _, inventory_id, quantity, *_ in uses:
+            sold[inventory_id] = sold.get(inventory_id, 0) + quantity
+
+        aliases = sorted(shard_aliases())
+        with atomic_shards(aliases):
+            now = timezone.now()
+            for alias in aliases:
+                rows = Inventory.objects.using(alias).filter(pk__in=list(sold)).order_by('inventory_id')
+                for inventory_id in rows.values_list('inventory_id', flat=True):
+                    Inventory.objects.using(alias).filter(pk=inventory_id).update(
+                        quantity=F('quantity') - sold[inventory_id],
+                        version=F('version') + 1,
+                        last_updated=now,
+                    )
+                for inventory in rows:
+                    log_oversold(inventory)
+                bump_versions('inventory', using=alias)
+            book_rollups(use[2:] for use in uses)
+            StockReservationUse.objects.filter(pk__in=[use[0] for use in uses]).delete()
+            StockReservation.objects.filter(pk__in=expired, expires_at__lt=cutoff).delete()
+    return len(expired), sum(sold.values())
@@ -0,0 +1,179 @@
+"""
+Pre-serialized, pre-compressed response cache for hot read endpoints.
+
+Each table has a data version counter in the Django cache. It is bumped after
+any write to the table commits: save()/delete() through the signal handlers
+in signals.py, and bulk .update() paths by calling bump_versions() directly.
+A cached view stores its encoded JSON body, plus gzip and brotli variants,
+under a key built from the versions of the tables it reads. Repeat requests
+are then a single cache lookup, with no ORM, formatting or compression work.
+
+Writes that know which rows they changed pass keys= (for inventory, the
+product IDs): each key gets a counter of its own, which in-memory indexes
+such as sku_index.py read to refresh just those rows. A write without keys
+may have changed any row, so it also bumps the table's '<table>:*' counter
+and those indexes rebuild everything.
+
+The counters and bodies must be visible to every process that writes or
+serves data: web workers, `run_jobs`, `archive_orders`, `reconcile_reservations`
+and the other management commands. A bump made in a process-local cache never
+reaches the others, which then serve stale bodies until BODY_TIMEOUT. The
+default CACHES backend is therefore the database cache table; Redis or
+Memcached work too, and check_shared_cache() warns when the backend is
+process-local.
+"""
+
+import functools
+import gzip
+import time
+import zlib
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from .replicas import replica_reads
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+VERSION_PREFIX = 'data-version:'
+BODY_PREFIX = 'response:'
+BODY_TIMEOUT = 60 * 60  # Unused bodies expire; a version bump makes them unreachable anyway
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when cache versions would only be bumped in the process that made the write"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend in PROCESS_LOCAL_BACKENDS:
+        return [checks.Warning(
+            f"CACHES['default'] uses {backend.rsplit('.', 1)[-1]}, which is private to each process",
+            hint="Writes made by other workers, run_jobs or management commands will not invalidate cached "
+                 "responses or SKU indexes. Use the database cache (createcachetable), Redis or Memcached.",
+            id='myapp.W001',
+        )]
+    return []
+
+
+def get_versions(tables):
+    keys = [VERSION_PREFIX + table for table in tables]
+    versions = cache.get_many(keys)
+    return [versions.get(key) or _init_version(key) for key in keys]
+
+
+def _fresh_version():
+    # Start counters from the clock so a counter that was evicted and recreated
+    # can never collide with a version an old cached body was stored under
+    return int(time.time() * 1000)
+
+
+def _init_version(key):
+    version = _fresh_version()
+    cache.add(key, version, timeout=None)  # add() keeps a counter another worker created first
+    return cache.get(key, version)
+
+
+def any_row(table):
+    """Name of the counter bumped by writes to table that did not say which rows they changed"""
+    return f"{table}:*"
+
+
+def get_row_versions(table, keys):
+    """{key: version} of per-row counters; None where no keyed write has set one yet"""
+    names = {key: f"{VERSION_PREFIX}{table}:{key}" for key in keys}
+    versions = cache.get_many(list(names.values()))
+    return {key: versions.get(name) for key, name in names.items()}
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), timeout=None)
+
+
+def _bump_now(tables, keys=None):
+    for table in tables:
+        _incr(VERSION_PREFIX + table)
+        if keys is None:
+            _incr(VERSION_PREFIX + any_row(table))
+        else:
+            for key in keys:
+                _incr(f"{VERSION_PREFIX}{table}:{key}")
+
+
+def bump_versions(*tables, using=None, keys=None):
+    """Invalidate cached responses that read these tables once the write commits.
+
+    keys lists the rows the write changed, by the key the table's indexes use
+    (product_id for inventory); leave it out when any row may have changed.
+    """
+    keys = None if keys is None else sorted(set(keys))
+    transaction.on_commit(lambda: _bump_now(tables, keys), using=using)
+
+
+def _accepted_encoding(request, entry):
+    accept = request.headers.get('Accept-Encoding', '')
+    if 'br' in accept and entry.get('br') is not None:
+        return 'br'
+    if 'gzip' in accept:
+        return 'gzip'
+    return None
+
+
+def cached_response(*tables, vary_on_query=False):
+    """Cache a GET view's 200 response per data version of the tables it reads.
+
+    Requests with a query string (filters, ?since=) skip the cache unless
+    vary_on_query is set, in which case the query string becomes part of the key.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or (request.GET and not vary_on_query):
+                return view(request, *args, **kwargs)
+
+            versions = get_versions(tables)
+            query = request.GET.urlencode() if vary_on_query else ''
+            etag = '"' + '-'.join(str(v) for v in versions) + (f"-{zlib.crc32(query.encode()):08x}" if query else '') + '"'
+            key = f"{BODY_PREFIX}{request.path}?{query}:{etag}"
+            if request.headers.get('If-None-Match') == etag:
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            entry = cache.get(key)
+            if entry is None:
+                # A lagging replica could store stale rows under the new version key
+                with replica_reads(False):
+                    response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                body = response.content
+                entry = {
+                    'content_type': response['Content-Type'],
+                    'identity': body,
+                    'gzip': gzip.compress(body, compresslevel=6),
+                    'br': brotli.compress(body) if brotli is not None else None,
+                }
+                cache.set(key, entry, BODY_TIMEOUT)
+
+            encoding = _accepted_encoding(request, entry)
+            response = HttpResponse(entry[encoding or 'identity'], content_type=entry['content_type'])
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['ETag'] = etag
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,271 @@
+"""
+Daily sales rollups.
+
+daily_product_sales and daily_warehouse_sales hold units and revenue per day,
+so reports read a few hundred rollup rows instead of walking every order and
+order item. Order item views call apply_order_item_delta() inside their
+transaction, except for hot-SKU sales, whose deltas are journalled with the
+reservation use and booked in bulk by apply_sales() when the reservation pool
+flushes. subtract_orders() takes a batch of deleted orders out with one
+negative delta per rollup row, and rebuild_rollups() recomputes everything
+from order_items and the order archive tables (used by the
+`rebuild_sales_rollups` management command).
+"""
+
+from decimal import Decimal
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, Max, Min, Sum, OuterRef, Subquery, DateTimeField, DecimalField, ExpressionWrapper
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .response_cache import bump_versions
+from .models import (ArchivedOrder, ArchivedOrderItem, ArchivedOrderItemAllocation,
+                     DailyProductSales, DailyWarehouseSales, Order, OrderItem, OrderItemAllocation)
+from .sharding import fan_out
+
+# (orders, order items, allocations) tables sales are rebuilt from: hot, then archived
+SALES_SOURCES = (
+    (Order, OrderItem, OrderItemAllocation),
+    (ArchivedOrder, ArchivedOrderItem, ArchivedOrderItemAllocation),
+)
+
+
+def _upsert(model, key, units, revenue):
+    """Add units/revenue to the rollup row for key, creating it if needed"""
+    if not units and not revenue:
+        return
+    updated = model.objects.filter(**key).update(
+        units=F('units') + units,
+        revenue=F('revenue') + revenue,
+    )
+    if updated:
+        return
+    try:
+        # Savepoint so losing an insert race does not abort the caller's transaction
+        with transaction.atomic():
+            model.objects.create(units=units, revenue=revenue, **key)
+    except IntegrityError:
+        model.objects.filter(**key).update(
+            units=F('units') + units,
+            revenue=F('revenue') + revenue,
+        )
+
+
+def sales_date_for_order(order_id):
+    """Local calendar date an order's sales are booked under"""
+    order_date = Order.objects.filter(order_id=order_id).values_list('order_date', flat=True).first()
+    return timezone.localdate(order_date) if order_date else timezone.localdate()
+
+
+def default_warehouse_for_product(product_id):
+    """Warehouse whose stock create_order_item decrements for this product"""
+    rows = fan_out(lambda qs: qs.filter(product_id=product_id).order_by('inventory_id')
+                   .values_list('inventory_id', 'warehouse_id')[:1])
+    return min(rows)[1] if rows else None
+
+
+def default_warehouses_for_products(product_ids):
+    """{product_id: main warehouse} for several products at once, as default_warehouse_for_product()"""
+    if not product_ids:
+        return {}
+    rows = fan_out(lambda qs: qs.filter(product_id__in=list(product_ids))
+                   .values_list('inventory_id', 'product_id', 'warehouse_id'))
+    warehouses = {}
+    for _, product_id, warehouse_id in sorted(rows, reverse=True):
+        warehouses[product_id] = warehouse_id  # The lowest inventory_id is written last and wins
+    return warehouses
+
+
+def warehouse_split_for_item(order_item_id, product_id, quantity):
+    """{warehouse_id: units} an order item shipped from, as recorded by its allocations"""
+    split = {}
+    for warehouse_id, units in OrderItemAllocation.objects.filter(order_item_id=order_item_id).values_list('warehouse_id', 'quantity'):
+        split[warehouse_id] = split.get(warehouse_id, 0) + units
+    if split and sum(split.values()) == quantity:
+        return split
+    # No allocations (older items) or the quantity was edited afterwards:
+    # book everything under the main warehouse
+    warehouse_id = next(iter(split), None) or default_warehouse_for_product(product_id)
+    return {warehouse_id: quantity} if warehouse_id is not None else {}
+
+
+def apply_order_item_delta(order_id, product_id, quantity, unit_price, warehouse_quantities=None, sign=1):
+    """Add (sign=1) or remove (sign=-1) one order item's contribution.
+
+    warehouse_quantities maps warehouse_id -> units shipped from it; by default
+    the whole quantity is booked under the product's main warehouse.
+    """
+    bump_versions('daily_product_sales', 'daily_warehouse_sales')  # Rollups change through update(), not save()
+    price = Decimal(str(unit_price))
+    sales_date = sales_date_for_order(order_id)
+    _upsert(DailyProductSales, {'sales_date': sales_date, 'product_id': product_id},
+            sign * int(quantity), sign * price * int(quantity))
+    if warehouse_quantities is None:
+        warehouse_id = default_warehouse_for_product(product_id)
+        warehouse_quantities = {warehouse_id: quantity} if warehouse_id is not None else {}
+    for warehouse_id, units in warehouse_quantities.items():
+        _upsert(DailyWarehouseSales, {'sales_date': sales_date, 'warehouse_id': warehouse_id},
+                sign * int(units), sign * price * int(units))
+
+
+def subtract_orders(order_ids, archived=False):
+    """Remove orders' items from the rollups; call before the items and allocations are deleted.
+
+    Each item is booked the way apply_order_item_delta() added it (date of its
+    order, warehouses from warehouse_split_for_item()), but the items are read
+    with one query per table and summed per rollup row, so a bulk delete costs
+    one UPDATE per (day, product) and (day, warehouse) touched, not per item.
+    With archived=True the orders are read from the archive tables.
+    """
+    order_model, item_model, allocation_model = SALES_SOURCES[1 if archived else 0]
+    order_dates = dict(order_model.objects.filter(order_id__in=order_ids).values_list('order_id', 'order_date'))
+    items = list(item_model.objects.filter(order_id__in=order_ids)
+                 .values_list('order_item_id', 'order_id', 'product_id', 'quantity', 'unit_price'))
+    if not items:
+        return
+    splits = {}
+    for order_item_id, warehouse_id, units in (allocation_model.objects.filter(order_id__in=order_ids)
+                                               .values_list('order_item_id', 'warehouse_id', 'quantity')):
+        split = splits.setdefault(order_item_id, {})
+        split[warehouse_id] = split.get(warehouse_id, 0) + units
+    default_warehouses = default_warehouses_for_products(
+        {product_id for order_item_id, _, product_id, quantity, _ in items
+         if sum(splits.get(order_item_id, {}).values()) != quantity})
+
+    by_product = {}
+    by_warehouse = {}
+    for order_item_id, order_id, product_id, quantity, unit_price in items:
+        order_date = order_dates.get(order_id)
+        sales_date = timezone.localdate(order_date) if order_date else timezone.localdate()
+        _add(by_product, (sales_date, product_id), -quantity, -unit_price * quantity)
+        split = splits.get(order_item_id, {})
+        if sum(split.values()) != quantity:
+            warehouse_id = next(iter(split), None) or default_warehouses.get(product_id)
+            split = {warehouse_id: quantity} if warehouse_id is not None else {}
+        for warehouse_id, units in split.items():
+            _add(by_warehouse, (sales_date, warehouse_id), -units, -unit_price * units)
+    _book(by_product, by_warehouse)
+
+
+def apply_sales(lines):
+    """Book (sales_date, product_id, warehouse_id, units, unit_price) lines with one upsert per rollup row.
+
+    Used by the reservation flush, which books many hot-SKU sales at once
+    instead of each sale updating the same day's rows in its own transaction.
+    """
+    by_product = {}
+    by_warehouse = {}
+    for sales_date, product_id, warehouse_id, units, unit_price in lines:
+        _add(by_product, (sales_date, product_id), units, unit_price * units)
+        _add(by_warehouse, (sales_date, warehouse_id), units, unit_price * units)
+    _book(by_product, by_warehouse)
+
+
+def _add(totals, key, units, revenue):
+    old_units, old_revenue = totals.get(key, (0, Decimal('0')))
+    totals[key] = (old_units + units, old_revenue + revenue)
+
+
+def _book(by_product, by_warehouse):
+    """Upsert summed {(date, id): (units, revenue)} deltas, in key order so concurrent callers lock alike"""
+    if not by_product and not by_warehouse:
+        return
+    bump_versions('daily_product_sales', 'daily_warehouse_sales')  # Rollups change through update(), not save()
+    for (sales_date, product_id), (units, revenue) in sorted(by_product.items()):
+        _upsert(DailyProductSales, {'sales_date': sales_date, 'product_id': product_id}, units, revenue)
+    for (sales_date, warehouse_id), (units, revenue) in sorted(by_warehouse.items()):
+        _upsert(DailyWarehouseSales, {'sales_date': sales_date, 'warehouse_id': warehouse_id}, units, revenue)
+
+
+def sales_date_bounds():
+    """(first, last) local sales dates across hot and archived orders; (None, None) with no orders"""
+    dates = []
+    for order_model, _, _ in SALES_SOURCES:
+        bounds = order_model.objects.aggregate(first=Min('order_date'), last=Max('order_date'))
+        dates.extend(timezone.localdate(d) for d in bounds.values() if d)
+    return (min(dates), max(dates)) if dates else (None, None)
+
+
+def main_warehouses():
+    """{product_id: warehouse_id} of the first inventory row of each product"""
+    warehouse_by_product = {}
+    inventory_rows = fan_out(lambda qs: qs.values_list('inventory_id', 'product_id', 'warehouse_id'))
+    for _, product_id, warehouse_id in sorted(inventory_rows, reverse=True):
+        warehouse_by_product[product_id] = warehouse_id
+    return warehouse_by_product
+
+
+def rebuild_rollups(start=None, end=None, batch_size=1000, warehouse_by_product=None):
+    """Recompute rollups from order_items and the order archive, optionally limited to [start, end] dates"""
+    by_product = {}
+    by_warehouse = {}
+
+    def add(totals, key, units, revenue):
+        old_units, old_revenue = totals.get(key, (0, Decimal('0')))
+        totals[key] = (old_units + units, old_revenue + revenue)
+
+    # Older items without allocations go to the product's main warehouse; callers
+    # rebuilding several date ranges pass the map in so it is read only once
+    if warehouse_by_product is None:
+        warehouse_by_product = main_warehouses()
+
+    for order_model, item_model, allocation_model in SALES_SOURCES:
+        order_dates = order_model.objects.filter(order_id=OuterRef('order_id')).values('order_date')[:1]
+        items = item_model.objects.annotate(
+            order_date=Subquery(order_dates, output_field=DateTimeField()),
+        ).annotate(
+            sales_date=TruncDate('order_date', tzinfo=timezone.get_current_timezone()),
+            line_revenue=ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        ).filter(order_date__isnull=False)
+        if start:
+            items = items.filter(sales_date__gte=start)
+        if end:
+            items = items.filter(sales_date__lte=end)
+
+        for row in items.values('sales_date', 'product_id').annotate(
+                total_units=Sum('quantity'), total_revenue=Sum('line_revenue')).order_by():
+            add(by_product, (row['sales_date'], row['product_id']), row['total_units'], row['total_revenue'])
+
+        # Items with recorded allocations are booked under the warehouses they shipped from
+        item_prices = item_model.objects.filter(order_item_id=OuterRef('order_item_id')).values('unit_price')[:1]
+        allocations = allocation_model.objects.annotate(
+            order_date=Subquery(order_dates, output_field=DateTimeField()),
+            unit_price=Subquery(item_prices, output_field=DecimalField(max_digits=10, decimal_places=2)),
+        ).annotate(
+            sales_date=TruncDate('order_date', tzinfo=timezone.get_current_timezone()),
+            line_revenue=ExpressionWrapper(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        ).filter(order_date__isnull=False, unit_price__isnull=False)
+        if start:
+            allocations = allocations.filter(sales_date__gte=start)
+        if end:
+            allocations = allocations.filter(sales_date__lte=end)
+        for row in allocations.values('sales_date', 'warehouse_id').annotate(
+                total_units=Sum('quantity'), total_revenue=Sum('line_revenue')).order_by():
+            add(by_warehouse, (row['sales_date'], row['warehouse_id']), row['total_units'], row['total_revenue'])
+
+        unallocated = items.exclude(order_item_id__in=allocation_model.objects.values('order_item_id'))
+        for row in unallocated.values('sales_date', 'product_id').annotate(
+                total_units=Sum('quantity'), total_revenue=Sum('line_revenue')).order_by():
+            warehouse_id = warehouse_by_product.get(row['product_id'])
+            if warehouse_id is not None:
+                add(by_warehouse, (row['sales_date'], warehouse_id), row['total_units'], row['total_revenue'])
+
+    with transaction.atomic():
+        bump_versions('daily_product_sales', 'daily_warehouse_sales')
+        for model in (DailyProductSales, DailyWarehouseSales):
+            existing = model.objects.all()
+            if start:
+                existing = existing.filter(sales_date__gte=start)
+            if end:
+                existing = existing.filter(sales_date__lte=end)
+            existing.delete()
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(sales_date=sales_date, product_id=product_id, units=units, revenue=revenue)
+            for (sales_date, product_id), (units, revenue) in by_product.items()
+        ], batch_size=batch_size)
+        DailyWarehouseSales.objects.bulk_create([
+            DailyWarehouseSales(sales_date=sales_date, warehouse_id=warehouse_id, units=units, revenue=revenue)
+            for (sales_date, warehouse_id), (units, revenue) in by_warehouse.items()
+        ], batch_size=batch_size)
+    return len(by_product), len(by_warehouse)
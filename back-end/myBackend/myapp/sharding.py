@@ -0,0 +1,148 @@
+"""
+Warehouse sharding for the inventory table.
+
+When settings.INVENTORY_SHARDS lists database aliases, every inventory row
+lives in the shard its warehouse maps to (INVENTORY_SHARD_MAP, or
+warehouse_id modulo the number of shards). WarehouseShardRouter sends
+save()/delete() of a row to that shard. Code that reads inventory without a
+single warehouse in mind uses fan_out() to query every shard and merge the
+results. With no shards configured everything stays on 'default'. During
+replica-safe reads (see replicas.py) fan_out() and find_inventory() read each
+shard from one of its replicas, as ReadReplicaRouter picks through
+read_alias().
+
+Products, warehouses, orders, order items and allocations stay on 'default':
+they are joined with each other by the order and rollup code, and a join
+cannot cross databases.
+
+inventory_id must be unique across shards: rows are found by ID alone, and
+allocations and hot-SKU reservations refer to them by ID. Each shard's own
+auto_increment would start from 1, so while sharding is enabled new rows take
+their IDs from the 'inventory' row of the id_sequences table on 'default'
+(assign_inventory_ids(), called for save() by the pre_save handler in
+signals.py and directly before bulk_create()).
+"""
+
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F
+
+from .models import IdSequence, Inventory
+
+SHARDED_MODELS = (Inventory,)
+
+
+def shard_aliases():
+    return list(getattr(settings, 'INVENTORY_SHARDS', None) or ['default'])
+
+
+def sharding_enabled():
+    return shard_aliases() != ['default']
+
+
+def shard_for_warehouse(warehouse_id):
+    shard_map = getattr(settings, 'INVENTORY_SHARD_MAP', {})
+    if warehouse_id in shard_map:
+        return shard_map[warehouse_id]
+    aliases = shard_aliases()
+    return aliases[int(warehouse_id) % len(aliases)]
+
+
+def inventory_for_warehouse(warehouse_id):
+    """Inventory manager bound to the shard holding this warehouse"""
+    return Inventory.objects.using(shard_for_warehouse(warehouse_id))
+
+
+def read_alias(alias):
+    """Database to read a shard's inventory from: a replica of it if the routers allow one"""
+    routed = router.db_for_read(Inventory, shard=alias)
+    # No router picked a replica: Django falls back to 'default', which is not this shard
+    return alias if routed == DEFAULT_DB_ALIAS else routed
+
+
+def fan_out(build_queryset):
+    """Run build_queryset(Inventory.objects.using(shard)) on every shard and merge the rows"""
+    rows = []
+    for alias in shard_aliases():
+        rows.extend(build_queryset(Inventory.objects.using(read_alias(alias))))
+    return rows
+
+
+def allocate_ids(name, count):
+    """Reserve `count` consecutive IDs from the named sequence on 'default'; returns a range"""
+    with transaction.atomic(using='default'):
+        # The UPDATE locks the counter row, so concurrent callers get disjoint ranges
+        if not IdSequence.objects.using('default').filter(name=name).update(next_value=F('next_value') + count):
+            raise RuntimeError(f"No '{name}' row in id_sequences; run database/create_id_sequences_table.sql "
+                               "and `python manage.py setup_inventory_shards`")
+        next_value = IdSequence.objects.using('default').filter(name=name).values_list('next_value', flat=True).get()
+    return range(next_value - count, next_value)
+
+
+def assign_inventory_ids(rows):
+    """Give new inventory rows IDs from the shared sequence; with a single database auto_increment is left to do it"""
+    new_rows = [row for row in rows if row.inventory_id is None]
+    if new_rows and sharding_enabled():
+        for row, inventory_id in zip(new_rows, allocate_ids('inventory', len(new_rows))):
+            row.inventory_id = inventory_id
+    return rows
+
+
+def find_inventory(inventory_id, for_update=False):
+    """Look an inventory row up by ID in whichever shard holds it"""
+    for alias in shard_aliases():
+        if for_update:
+            queryset = Inventory.objects.using(alias).select_for_update()
+        else:
+            queryset = Inventory.objects.using(read_alias(alias))
+        inventory = queryset.filter(pk=inventory_id).first()
+        if inventory is not None:
+            return inventory
+    raise Inventory.DoesNotExist(f"Inventory {inventory_id} not found")
+
+
+@contextmanager
+def atomic_shards(aliases):
+    """Open a transaction on each shard, always in the same order.
+
+    The shard transactions commit one after another, not as one distributed
+    transaction: a crash between two commits can leave a cross-shard change
+    half applied.
+    """
+    with ExitStack() as stack:
+        for alias in sorted(set(aliases)):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+class WarehouseShardRouter:
+    """Route inventory rows to their warehouse's shard"""
+
+    def _db_for_instance(self, model, hints):
+        if model not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db:
+            return instance._state.db
+        if getattr(instance, 'warehouse_id', None) is not None:
+            return shard_for_warehouse(instance.warehouse_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_instance(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_instance(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards only hold inventory; the table is created by `setup_inventory_shards`
+        if db != 'default' and db in shard_aliases():
+            return False
+        return None
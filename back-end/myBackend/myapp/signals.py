@@ -0,0 +1,35 @@
+"""
+Model signal handlers.
+
+Bumps the response-cache data version of a table after any save() or delete()
+on its model. Writes made with QuerySet.update() do not send signals, so
+those code paths call response_cache.bump_versions() themselves.
+
+New inventory rows saved while sharding is enabled get their ID from the
+shared sequence before the INSERT (sharding.assign_inventory_ids()).
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import Category, Inventory, Product, Supplier, Warehouse
+from .response_cache import bump_versions
+from .sharding import assign_inventory_ids
+
+VERSIONED_MODELS = (Category, Inventory, Product, Supplier, Warehouse)
+
+
+def bump_table_version(sender, using=None, **kwargs):
+    bump_versions(sender._meta.db_table, using=using)
+
+
+def assign_inventory_id(sender, instance, raw=False, **kwargs):
+    if not raw:
+        assign_inventory_ids([instance])
+
+
+# Connected per model rather than for every sender: a model with no delete
+# receivers lets QuerySet.delete() run as one DELETE without loading the rows
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_table_version, sender=model)
+    post_delete.connect(bump_table_version, sender=model)
+pre_save.connect(assign_inventory_id, sender=Inventory)
@@ -0,0 +1,137 @@
+"""
+In-process SKU index for barcode scanner lookups.
+
+Resolving a scanned SKU should not touch the database. Each worker keeps two
+maps in memory:
+
+- products: SKU -> product details, rebuilt when the products or warehouses
+  data version changes
+- stock:    product_id -> [(warehouse_id, quantity)]
+
+The data versions are the response-cache counters (response_cache.py). Sales
+and transfers bump the inventory counter of each product they touched, so a
+lookup reloads the stock rows of just the products it returns whose counter
+moved: a sale costs the next scan of that SKU one small query, not a rescan
+of all inventory. Writes that do not say which products they changed (bulk
+updates, stocktakes, deletes, single-row saves) bump inventory:* and the
+stock map is rebuilt. A lookup otherwise costs two cache reads plus
+dictionary access.
+
+The counters must live in the shared CACHES backend (the database cache by
+default) so writes made by other workers, `run_jobs` and management commands
+reach every process's index.
+"""
+
+import threading
+
+from .models import Product, Warehouse
+from .replicas import replica_reads
+from .response_cache import any_row, get_row_versions, get_versions
+from .sharding import fan_out
+
+PRODUCT_TABLES = ('products', 'warehouses')
+STOCK_TABLE = 'inventory'
+
+
+def _load_stock(product_ids=None):
+    """{product_id: sorted [(warehouse_id, quantity)]} for the given products, or for all of them"""
+    stock = {}
+    for product_id, warehouse_id, quantity in fan_out(
+            lambda qs: (qs if product_ids is None else qs.filter(product_id__in=product_ids))
+            .values_list('product_id', 'warehouse_id', 'quantity')):
+        stock.setdefault(product_id, []).append((warehouse_id, quantity))
+    for rows in stock.values():
+        rows.sort()
+    return stock
+
+
+class SkuIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._product_version = None
+        self._stock_version = None
+        self._products = {}
+        self._warehouse_names = {}
+        self._stock = {}
+        self._row_versions = {}  # product_id -> its inventory counter when its stock rows were read
+
+    def refresh(self):
+        """Rebuild whichever map is behind the current data versions"""
+        *product_version, stock_version = get_versions((*PRODUCT_TABLES, any_row(STOCK_TABLE)))
+        product_version = tuple(product_version)
+        if product_version == self._product_version and stock_version == self._stock_version:
+            return
+        with self._lock:
+            # Built from the primary: a lagging replica would pin stale data to the new version
+            with replica_reads(False):
+                if product_version != self._product_version:
+                    self._warehouse_names = dict(Warehouse.objects.values_list('warehouse_id', 'warehouse_name'))
+                    self._products = {
+                        sku: (product_id, name, price)
+                        for product_id, sku, name, price in
+                        Product.objects.values_list('product_id', 'sku', 'product_name', 'unit_price')
+                    }
+                    self._product_version = product_version
+                if stock_version != self._stock_version:
+                    # Counters are read before the rows, so a sale committed during the scan is reloaded later
+                    row_versions = get_row_versions(STOCK_TABLE, [p for p, _, _ in self._products.values()])
+                    self._stock = _load_stock()
+                    self._row_versions = row_versions
+                    self._stock_version = stock_version
+
+    def refresh_products(self, product_ids):
+        """Reload the stock rows of products whose inventory counter moved since they were read"""
+        versions = get_row_versions(STOCK_TABLE, product_ids)
+        stale = [product_id for product_id, version in versions.items()
+                 if product_id not in self._row_versions or version != self._row_versions[product_id]]
+        if not stale:
+            return
+        with self._lock, replica_reads(False):
+            stock = _load_stock(stale)
+            for product_id in stale:
+                self._stock[product_id] = stock.get(product_id, [])
+                self._row_versions[product_id] = versions[product_id]
+
+    def _product_ids(self, skus):
+        return [product[0] for product in (self._products.get(str(sku).strip()) for sku in skus) if product]
+
+    def _entry(self, sku):
+        product = self._products.get(sku)
+        if product is None:
+            return None
+        product_id, name, price = product
+        rows = self._stock.get(product_id, ())
+        return {
+            "sku": sku,
+            "id": f"P{str(product_id).zfill(3)}",  # Custom product ID with leading zeros
+            "product_id": product_id,
+            "productName": name,
+            "unitPrice": f"₱{float(price):,.2f}",
+            "totalStock": sum(quantity for _, quantity in rows),
+            "stock": [{
+                "warehouseId": warehouse_id,
+                "warehouseName": self._warehouse_names.get(warehouse_id, "N/A"),
+                "quantity": quantity,
+            } for warehouse_id, quantity in rows],
+        }
+
+    def lookup(self, sku):
+        self.refresh()
+        self.refresh_products(self._product_ids([sku]))
+        return self._entry(sku.strip())
+
+    def lookup_many(self, skus):
+        """Return (found entries, SKUs with no product), in request order"""
+        self.refresh()
+        self.refresh_products(self._product_ids(skus))
+        found, missing = [], []
+        for sku in skus:
+            entry = self._entry(str(sku).strip())
+            if entry is None:
+                missing.append(sku)
+            else:
+                found.append(entry)
+        return found, missing
+
+
+sku_index = SkuIndex()
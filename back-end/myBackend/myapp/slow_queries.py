@@ -0,0 +1,121 @@
+"""
+Slow-query log with EXPLAIN capture.
+
+Every database connection gets an execute wrapper (installed when the
+connection is opened) that times each statement. Statements slower than
+settings.SLOW_QUERY_THRESHOLD_MS are explained on the same connection and
+kept, with the view that ran them, the calling line in myapp, parameters and
+duration, in a per-process ring buffer of SLOW_QUERY_LOG_SIZE entries. The
+buffer is read through /api/admin/slow-queries/.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+EXPLAIN_PREFIXES = {
+    'mysql': 'EXPLAIN ',
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+current_view = ContextVar('current_view', default=None)  # Set by SlowQueryMiddleware
+_explaining = ContextVar('explaining', default=False)
+_lock = threading.Lock()
+_entries = deque(maxlen=getattr(settings, 'SLOW_QUERY_LOG_SIZE', 200))
+
+
+def threshold_ms():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200)
+
+
+def _caller():
+    """First frame inside myapp that is not this module, as 'file.py:line function'"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename.replace('\\', '/')
+        if '/myapp/' in filename and not filename.endswith('/slow_queries.py'):
+            return f"{filename.rsplit('/myapp/', 1)[1]}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _explain(connection, sql, params):
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith(EXPLAINABLE) or connection.needs_rollback:
+        return None
+    token = _explaining.set(True)  # The EXPLAIN itself must not be logged or explained
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            columns = [column[0] for column in cursor.description or ()]
+            return [dict(zip(columns, [str(value) for value in row])) for row in cursor.fetchall()]
+    except Exception as e:
+        return [{'error': str(e)}]
+    finally:
+        _explaining.reset(token)
+
+
+def record(connection, sql, params, many, ms):
+    entry = {
+        'at': timezone.now().isoformat(),
+        'database': connection.alias,
+        'view': current_view.get(),
+        'source': _caller(),
+        'ms': round(ms, 3),
+        'sql': sql,
+        'params': [str(p) for p in params] if params and not many else None,
+        'plan': None if many else _explain(connection, sql, params),
+    }
+    with _lock:
+        _entries.append(entry)
+
+
+def entries(view=None):
+    """Logged slow queries, newest first"""
+    with _lock:
+        rows = list(_entries)
+    rows.reverse()
+    if view:
+        rows = [row for row in rows if row['view'] == view]
+    return rows
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def make_wrapper(connection):
+    def slow_query_wrapper(execute, sql, params, many, context):
+        if _explaining.get():
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if ms >= threshold_ms():
+                record(connection, sql, params, many, ms)
+    slow_query_wrapper.slow_query_log = True
+    return slow_query_wrapper
+
+
+def install_wrapper(sender, connection, **kwargs):
+    # connection_created fires again after a reconnect; add the wrapper only once.
+    # It goes first in the list because connection.execute_wrapper() blocks
+    # (e.g. the profiler's) pop the last entry when they exit.
+    if not any(getattr(w, 'slow_query_log', False) for w in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, make_wrapper(connection))
+
+
+def enable():
+    if getattr(settings, 'SLOW_QUERY_LOG_ENABLED', True):
+        connection_created.connect(install_wrapper, dispatch_uid='slow_query_log')
@@ -0,0 +1,189 @@
+"""
+Stocktake (cycle count) reconciliation.
+
+An uploaded count is a list of (warehouse_id, sku, counted quantity) lines.
+create_stocktake() resolves SKUs with one product query, reads system stock
+for the counted warehouses with one inventory query per shard, and computes
+variances for every (warehouse, product) pair at once with NumPy: pairs are
+packed into int64 keys, duplicate lines are summed with bincount and system
+quantities are matched with searchsorted. Variance value uses cost_price.
+
+apply_stocktake() books approved variances in one transaction: each variance
+is added to the current quantity, so sales made after the count was
+uploaded are kept, and the inventory rows are written with bulk_update. A
+line that would leave a row below its hot-SKU holds rejects the whole apply.
+"""
+
+import csv
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # Only stocktake reconciliation needs NumPy here
+    np = None
+
+from .allocation import InsufficientStockError, held_quantities
+from .models import Inventory, Product, Stocktake, StocktakeLine
+from .response_cache import bump_versions
+from .sharding import assign_inventory_ids, atomic_shards, fan_out, shard_for_warehouse
+
+KEY_SHIFT = 32  # key = warehouse_id << 32 | product_id
+LINE_BATCH_SIZE = 5000
+
+
+def _split_keys(keys):
+    return keys >> KEY_SHIFT, keys & ((1 << KEY_SHIFT) - 1)
+
+
+def reconcile(warehouse_ids, skus, counted, full_count=False):
+    """Return (keys, counted, system, costs, unknown SKUs) as arrays sorted by key"""
+    if np is None:
+        raise RuntimeError("NumPy is required for stocktake reconciliation (pip install numpy)")
+    product_by_sku = {sku: (product_id, cost or Decimal('0'))
+                      for product_id, sku, cost in Product.objects.values_list('product_id', 'sku', 'cost_price')}
+    product_ids = np.fromiter((product_by_sku.get(sku, (-1,))[0] for sku in skus), dtype=np.int64, count=len(skus))
+    known = product_ids >= 0
+    unknown = sorted({sku for sku, ok in zip(skus, known.tolist()) if not ok})
+
+    warehouses = np.asarray(warehouse_ids, dtype=np.int64)
+    line_keys = (warehouses[known] << KEY_SHIFT) | product_ids[known]
+    keys, inverse = np.unique(line_keys, return_inverse=True)
+    # Duplicate lines for the same pair (e.g. two shelves) are added together
+    counted_qty = np.bincount(inverse, weights=np.asarray(counted, dtype=np.float64)[known],
+                              minlength=len(keys)).astype(np.int64)
+
+    counted_warehouses = np.unique(warehouses).tolist()
+    stock_rows = fan_out(lambda qs: qs.filter(warehouse_id__in=counted_warehouses)
+                         .values_list('warehouse_id', 'product_id', 'quantity'))
+    stock_keys = np.fromiter(((w << KEY_SHIFT) | p for w, p, _ in stock_rows), dtype=np.int64, count=len(stock_rows))
+    stock_qty = np.fromiter((q for _, _, q in stock_rows), dtype=np.int64, count=len(stock_rows))
+    order = np.argsort(stock_keys, kind='stable')
+    stock_keys, stock_qty = stock_keys[order], stock_qty[order]
+
+    if full_count:
+        # Stock on record that nobody counted was not found on the shelf
+        missing = np.setdiff1d(stock_keys, keys, assume_unique=True)
+        keys = np.concatenate([keys, missing])
+        counted_qty = np.concatenate([counted_qty, np.zeros(len(missing), dtype=np.int64)])
+        order = np.argsort(keys, kind='stable')
+        keys, counted_qty = keys[order], counted_qty[order]
+
+    system_qty = np.zeros(len(keys), dtype=np.int64)
+    if len(stock_keys):
+        pos = np.minimum(np.searchsorted(stock_keys, keys), len(stock_keys) - 1)
+        matched = stock_keys[pos] == keys
+        system_qty[matched] = stock_qty[pos[matched]]
+
+    _, key_products = _split_keys(keys)
+    cost_by_product = {product_id: float(cost) for product_id, cost in product_by_sku.values()}
+    costs = np.fromiter((cost_by_product.get(p, 0.0) for p in key_products.tolist()), dtype=np.float64, count=len(keys))
+    return keys, counted_qty, system_qty, costs, unknown
+
+
+def summarize(variance, costs):
+    value = variance * costs
+    return {
+        "lines": int(len(variance)),
+        "varianceLines": int(np.count_nonzero(variance)),
+        "unitsOver": int(variance[variance > 0].sum()),
+        "unitsShort": int(-variance[variance < 0].sum()),
+        "valueOver": round(float(value[value > 0].sum()), 2),
+        "valueShort": round(float(-value[value < 0].sum()), 2),
+        "netValue": round(float(value.sum()), 2),
+    }
+
+
+def read_count_csv(lines):
+    """Parse warehouse_id,sku,counted CSV lines into (warehouse_ids, skus, counted) lists.
+
+    An inventory export's quantity column is accepted in place of counted, so an
+    edited export can be imported as-is. Warehouse IDs may carry their W prefix.
+    """
+    warehouse_ids, skus, counted = [], [], []
+    reader = csv.DictReader(lines)
+    column = 'counted' if 'counted' in (reader.fieldnames or ()) else 'quantity'
+    for row in reader:
+        warehouse_ids.append(int(row['warehouse_id'].strip().upper().removeprefix('W')))
+        skus.append(row['sku'].strip())
+        counted.append(int(row[column]))
+    return warehouse_ids, skus, counted
+
+
+def create_stocktake(warehouse_ids, skus, counted, full_count=False, note=None):
+    """Reconcile an uploaded count, store its lines and return (stocktake, summary, unknown SKUs)"""
+    keys, counted_qty, system_qty, costs, unknown = reconcile(warehouse_ids, skus, counted, full_count)
+    variance = counted_qty - system_qty
+    key_warehouses, key_products = _split_keys(keys)
+    with transaction.atomic():
+        stocktake = Stocktake.objects.create(full_count=full_count, note=note, line_count=len(keys))
+        StocktakeLine.objects.bulk_create([
+            StocktakeLine(stocktake_id=stocktake.stocktake_id, warehouse_id=w, product_id=p,
+                          counted_quantity=c, system_quantity=s, variance=v, unit_cost=round(cost, 2))
+            for w, p, c, s, v, cost in zip(key_warehouses.tolist(), key_products.tolist(), counted_qty.tolist(),
+                                           system_qty.tolist(), variance.tolist(), costs.tolist())
+        ], batch_size=LINE_BATCH_SIZE)
+    return stocktake, summarize(variance, costs), unknown
+
+
+def stocktake_summary(stocktake_id):
+    if np is None:
+        raise RuntimeError("NumPy is required for stocktake reconciliation (pip install numpy)")
+    lines = StocktakeLine.objects.filter(stocktake_id=stocktake_id).values_list('variance', 'unit_cost')
+    variance = np.fromiter((v for v, _ in lines), dtype=np.int64)
+    costs = np.fromiter((float(c) for _, c in lines), dtype=np.float64)
+    return summarize(variance, costs)
+
+
+def apply_stocktake(stocktake_id, line_ids=None):
+    """Add approved variances to inventory in one transaction; return the number of lines applied"""
+    with transaction.atomic():
+        stocktake = Stocktake.objects.select_for_update().get(stocktake_id=stocktake_id)
+        if stocktake.status != 'open':
+            raise ValueError(f"Stocktake is already {stocktake.status}")
+        lines = StocktakeLine.objects.filter(stocktake_id=stocktake_id, applied=False).exclude(variance=0)
+        if line_ids is not None:
+            lines = lines.filter(stocktake_line_id__in=line_ids)
+        lines = list(lines.values_list('stocktake_line_id', 'warehouse_id', 'product_id', 'variance', 'counted_quantity'))
+
+        by_shard = {}
+        for line in lines:
+            by_shard.setdefault(shard_for_warehouse(line[1]), []).append(line)
+        now = timezone.now()
+        with atomic_shards(by_shard):
+            for alias, shard_lines in by_shard.items():
+                pairs = {(w, p): (v, c) for _, w, p, v, c in shard_lines}
+                # Lock the counted warehouses' rows; filtering by product too would send a huge IN list
+                rows = list(Inventory.objects.using(alias).select_for_update()
+                            .filter(warehouse_id__in={w for w, _ in pairs}))
+                held = held_quantities(rows)
+                changed = []
+                for inventory in rows:
+                    change = pairs.pop((inventory.warehouse_id, inventory.product_id), None)
+                    if change is not None:
+                        inventory.quantity = max(0, inventory.quantity + change[0])
+                        if inventory.quantity < held.get(inventory.inventory_id, 0):
+                            # Units reserved for hot-SKU sales are still being sold; booking a
+                            # shortfall under them would let those sales oversell the row
+                            raise InsufficientStockError(
+                                f"Inventory {inventory.inventory_id} has {held[inventory.inventory_id]} units "
+                                f"reserved for hot-SKU sales; its counted quantity {inventory.quantity} "
+                                f"cannot be applied until they are sold or released")
+                        inventory.last_updated = now
+                        inventory.version += 1
+                        changed.append(inventory)
+                Inventory.objects.using(alias).bulk_update(changed, ['quantity', 'last_updated', 'version'], batch_size=1000)
+                # Counted stock with no inventory row yet; bulk_create() sends no pre_save, so assign IDs here
+                Inventory.objects.using(alias).bulk_create(assign_inventory_ids([
+                    Inventory(warehouse_id=w, product_id=p, quantity=c) for (w, p), (_, c) in pairs.items()
+                ]), batch_size=1000)
+                bump_versions('inventory', using=alias)  # bulk_update() sends no signals
+
+        StocktakeLine.objects.filter(stocktake_line_id__in=[line[0] for line in lines]).update(applied=True)
+        if line_ids is None:
+            stocktake.status = 'applied'
+            stocktake.applied_at = now
+            stocktake.save(update_fields=['status', 'applied_at'])
+    return len(lines)
@@ -0,0 +1,23 @@
+"""
+Test runner for the unmanaged models.
+
+The schema is created by the SQL scripts in database/, so every model is
+managed = False and Django would leave the test databases empty. The runner
+marks the models managed while the test databases are created, so each table
+is built from its model, then restores the flag.
+"""
+
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+
+
+class UnmanagedModelTestRunner(DiscoverRunner):
+    def setup_databases(self, **kwargs):
+        unmanaged = [model for model in apps.get_app_config('myapp').get_models() if not model._meta.managed]
+        for model in unmanaged:
+            model._meta.managed = True
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            for model in unmanaged:
+                model._meta.managed = False
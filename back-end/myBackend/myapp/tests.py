@@ -0,0 +1,966 @@
+import hashlib
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import events, idempotency, jobs, replicas, reservations, response_cache, rollups, sku_index, slow_queries, views, warmup
+from .allocation import InsufficientStockError, allocate_stock, plan_allocation
+from .archive import archive_orders
+from .cascades import delete_orders, delete_products
+from .concurrency import VersionConflict, save_changes
+from .events import broadcaster
+from .lookups import Lookups
+from .middleware import RateLimitMiddleware
+from .models import (ArchivedOrder, ArchivedOrderItem, ArchivedOrderItemAllocation, BackgroundJob, Category,
+                     DailyProductSales, DailyWarehouseSales, DeletedRecord, IdempotencyKey, IdSequence, Inventory, Order,
+                     OrderItem, OrderItemAllocation, Product, StockReservation, StockReservationUse, Stocktake,
+                     StocktakeLine, Warehouse)
+from .reservations import ReservationPool, allocated_stock, reconcile
+from .rollups import apply_order_item_delta
+from .sharding import fan_out, find_inventory
+from .stocktake import apply_stocktake, create_stocktake
+from .totals import backfill_order_totals
+from .views import inventory_rows, product_rows
+
+SHARDS = ['inventory_shard_0', 'inventory_shard_1']
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+
+    def test_bump_from_another_process_invalidates_cached_body(self):
+        self.assertIn(b'Widget', self.client.get('/api/products/').content)
+        Product.objects.filter(pk=self.product.product_id).update(product_name='Gadget')  # No signals, no bump
+        self.assertIn(b'Widget', self.client.get('/api/products/').content)
+
+        # A run_jobs or second worker process has its own cache client, not this one
+        other_process = caches.create_connection('default')
+        self.assertIsNot(other_process, cache)
+        with mock.patch.object(response_cache, 'cache', other_process):
+            response_cache._bump_now(['products'])
+        self.assertIn(b'Gadget', self.client.get('/api/products/').content)
+
+    def test_check_warns_about_process_local_cache(self):
+        self.assertEqual(response_cache.check_shared_cache(None), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([w.id for w in response_cache.check_shared_cache(None)], ['myapp.W001'])
+
+
+class SkuIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        self.products = [Product.objects.create(product_name=name, sku=name, unit_price=1) for name in ('A', 'B')]
+        for product in self.products:
+            Inventory.objects.create(product_id=product.product_id, warehouse_id=self.warehouse.warehouse_id, quantity=10)
+        self.index = sku_index.SkuIndex()
+        self.index.lookup('A')
+        self.loads = self.enterContext(mock.patch.object(sku_index, '_load_stock', wraps=sku_index._load_stock))
+
+    def test_sale_reloads_only_the_sold_product(self):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            allocate_stock(self.products[0].product_id, 3)
+        self.assertEqual(self.index.lookup('A')['totalStock'], 7)
+        self.assertEqual([call.args for call in self.loads.call_args_list], [([self.products[0].product_id],)])
+        self.index.lookup('B')
+        self.assertEqual(self.loads.call_count, 1)  # B's counter did not move
+
+    def test_write_without_keys_rebuilds_the_stock_map(self):
+        Inventory.objects.filter(product_id=self.products[1].product_id).update(quantity=4)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            response_cache.bump_versions('inventory')
+        self.assertEqual(self.index.lookup('B')['totalStock'], 4)
+        self.assertEqual([call.args for call in self.loads.call_args_list], [()])
+
+
+class VersionCheckTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        self.inventory = Inventory.objects.create(product_id=self.product.product_id,
+                                                  warehouse_id=self.warehouse.warehouse_id, quantity=10)
+
+    def put(self, url, body, **headers):
+        return self.client.put(url, json.dumps(body), content_type='application/json', headers=headers)
+
+    def test_matching_if_match_updates_product(self):
+        version = Product.objects.get(pk=self.product.product_id).version
+        response = self.put(f'/api/products/{self.product.product_id}/update/', {'name': 'Gadget'},
+                            **{'If-Match': f'"{version}"'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response['ETag'], f'"{version + 1}"')
+        self.assertEqual(Product.objects.get(pk=self.product.product_id).product_name, 'Gadget')
+
+    def test_mismatched_if_match_is_rejected(self):
+        version = Product.objects.get(pk=self.product.product_id).version
+        response = self.put(f'/api/products/{self.product.product_id}/update/', {'name': 'Gadget'},
+                            **{'If-Match': f'"{version - 1}"'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['currentVersion'], version)
+        self.assertEqual(Product.objects.get(pk=self.product.product_id).product_name, 'Widget')
+
+    def test_stale_body_version_returns_current_version(self):
+        url = f'/api/inventory/{self.inventory.inventory_id}/update/'
+        first = self.put(url, {'quantity': 7, 'version': self.inventory.version})
+        self.assertEqual(first.status_code, 200, first.content)
+        stale = self.put(url, {'quantity': 3, 'version': self.inventory.version})
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()['currentVersion'], first.json()['version'])
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.inventory_id).quantity, 7)
+
+    def test_conditional_update_loses_race(self):
+        inventory = Inventory.objects.get(pk=self.inventory.inventory_id)
+        # Another request commits between this one's read and its UPDATE
+        Inventory.objects.filter(pk=inventory.inventory_id).update(quantity=8, version=F('version') + 1)
+        with self.assertRaises(VersionConflict) as conflict:
+            save_changes(inventory, {'quantity': 5})
+        self.assertEqual(conflict.exception.current_version, inventory.version + 1)
+        self.assertEqual(Inventory.objects.get(pk=inventory.inventory_id).quantity, 8)
+
+
+class AllocationPlanTests(SimpleTestCase):
+    def setUp(self):
+        # Locked rows as plan_allocation() receives them: 5, 8 and 8 units in warehouses 1-3
+        self.rows = [Inventory(inventory_id=n, product_id=1, warehouse_id=n, quantity=q)
+                     for n, q in ((1, 5), (2, 8), (3, 8))]
+
+    def plan(self, quantity, policy, preferred=None, held=None):
+        return [(row.inventory_id, take) for row, take in plan_allocation(self.rows, quantity, policy, preferred, held)]
+
+    def test_largest_first_breaks_ties_by_inventory_id(self):
+        self.assertEqual(self.plan(10, 'largest'), [(2, 8), (3, 2)])
+
+    def test_fewest_splits_takes_smallest_covering_row(self):
+        self.assertEqual(self.plan(5, 'fewest_splits'), [(1, 5)])
+        self.assertEqual(self.plan(6, 'fewest_splits'), [(2, 6)])  # Rows 2 and 3 tie; the lower ID wins
+        self.assertEqual(self.plan(20, 'fewest_splits'), [(2, 8), (3, 8), (1, 4)])  # No single row covers it
+
+    def test_preferred_warehouse_first(self):
+        self.assertEqual(self.plan(7, 'preferred', preferred=1), [(1, 5), (2, 2)])
+        self.assertEqual(self.plan(7, 'preferred', preferred=99), [(2, 7)])  # Not stocked there: largest first
+
+    def test_held_units_are_not_allocated(self):
+        self.assertEqual(self.plan(10, 'largest', held={2: 8}), [(3, 8), (1, 2)])
+        # Holds above a row's quantity leave it out rather than counting negative stock
+        self.assertEqual(self.plan(10, 'largest', held={2: 12}), [(3, 8), (1, 2)])
+        with self.assertRaisesMessage(InsufficientStockError, 'Available: 13, Requested: 14'):
+            self.plan(14, 'largest', held={2: 12})
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.plan(1, 'random')
+
+
+class OrderItemAllocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.rows = [Inventory.objects.create(product_id=self.product.product_id, quantity=quantity,
+                                              warehouse_id=Warehouse.objects.create(warehouse_name=name).warehouse_id)
+                     for name, quantity in (('Main', 5), ('Other', 4))]
+
+    def test_order_item_split_across_warehouses(self):
+        order = Order.objects.create(status='Pending')
+        response = self.client.post('/api/order-items/create/', json.dumps({
+            'orderId': order.order_id, 'productId': self.product.product_id, 'quantity': 7, 'unitPrice': '10',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        main, other = self.rows
+        self.assertEqual(sorted(OrderItemAllocation.objects.values_list('warehouse_id', 'quantity')),
+                         sorted([(main.warehouse_id, 5), (other.warehouse_id, 2)]))
+        self.assertEqual([Inventory.objects.get(pk=row.inventory_id).quantity for row in self.rows], [0, 2])
+        self.assertEqual(len(response.json()['orderItem']['allocations']), 2)
+
+    def test_insufficient_stock_writes_nothing(self):
+        order = Order.objects.create(status='Pending')
+        response = self.client.post('/api/order-items/create/', json.dumps({
+            'orderId': order.order_id, 'productId': self.product.product_id, 'quantity': 10, 'unitPrice': '10',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual([Inventory.objects.get(pk=row.inventory_id).quantity for row in self.rows], [5, 4])
+
+
+class StocktakeUploadTests(TestCase):
+    def setUp(self):
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10, cost_price=4)
+        Inventory.objects.create(product_id=self.product.product_id, warehouse_id=self.warehouse.warehouse_id, quantity=10)
+
+    def assert_counted(self, response, counted):
+        self.assertEqual(response.status_code, 201, response.content)
+        stocktake_id = response.json()['stocktake']['stocktake_id']
+        line = StocktakeLine.objects.get(stocktake_id=stocktake_id)
+        self.assertEqual((line.counted_quantity, line.system_quantity, line.variance), (counted, 10, counted - 10))
+
+    def test_csv_upload(self):
+        body = f"﻿warehouse_id,sku,counted\nW{self.warehouse.warehouse_id},W-1,5\n{self.warehouse.warehouse_id},W-1,2\n"
+        response = self.client.post('/api/stocktakes/?note=aisle+3', body.encode('utf-8'), content_type='text/csv')
+        self.assert_counted(response, 7)  # Duplicate lines are added together
+        self.assertEqual(Stocktake.objects.get().note, 'aisle 3')
+
+    def test_json_upload(self):
+        body = {"lines": [{"warehouseId": self.warehouse.warehouse_id, "sku": "W-1", "counted": 12}], "fullCount": True}
+        response = self.client.post('/api/stocktakes/', json.dumps(body), content_type='application/json')
+        self.assert_counted(response, 12)
+        self.assertTrue(Stocktake.objects.get().full_count)
+
+    def test_bad_csv_upload(self):
+        response = self.client.post('/api/stocktakes/', b"warehouse_id,sku\n1,W-1\n", content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(INVENTORY_SHARDS=SHARDS)
+class ShardRoutingTests(TestCase):
+    databases = {'default', *SHARDS}
+
+    def setUp(self):
+        cache.clear()  # Cached list bodies are keyed by data versions, which only move on commit
+        IdSequence.objects.create(name='inventory', next_value=1)
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.odd = Warehouse.objects.create(warehouse_name='Odd')    # ID 1 -> inventory_shard_1
+        self.even = Warehouse.objects.create(warehouse_name='Even')  # ID 2 -> inventory_shard_0
+
+    def create_row(self, warehouse, quantity):
+        response = self.client.post('/api/inventory/create/', json.dumps({
+            'productId': self.product.product_id, 'warehouseId': warehouse.warehouse_id, 'quantity': quantity,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['inventory_id']
+
+    def test_rows_live_on_their_warehouse_shard_with_distinct_ids(self):
+        odd_id = self.create_row(self.odd, 5)
+        even_id = self.create_row(self.even, 7)
+        self.assertNotEqual(odd_id, even_id)
+        self.assertTrue(Inventory.objects.using('inventory_shard_1').filter(pk=odd_id, quantity=5).exists())
+        self.assertTrue(Inventory.objects.using('inventory_shard_0').filter(pk=even_id, quantity=7).exists())
+        self.assertFalse(Inventory.objects.using('default').exists())
+        self.assertEqual(find_inventory(even_id)._state.db, 'inventory_shard_0')
+
+    def test_list_and_update_address_one_row(self):
+        odd_id = self.create_row(self.odd, 5)
+        even_id = self.create_row(self.even, 7)
+        rows = self.client.get('/api/inventory/').json()['inventories']
+        self.assertEqual(sorted(row['inventory_id'] for row in rows), sorted([odd_id, even_id]))
+
+        response = self.client.put(f'/api/inventory/{even_id}/update/', json.dumps({'quantity': 9}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Inventory.objects.using('inventory_shard_0').get(pk=even_id).quantity, 9)
+        self.assertEqual(Inventory.objects.using('inventory_shard_1').get(pk=odd_id).quantity, 5)
+
+    def test_moving_a_row_to_another_shard_keeps_its_id(self):
+        odd_id = self.create_row(self.odd, 5)
+        response = self.client.put(f'/api/inventory/{odd_id}/update/', json.dumps({'warehouseId': self.even.warehouse_id}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(Inventory.objects.using('inventory_shard_1').filter(pk=odd_id).exists())
+        self.assertEqual(Inventory.objects.using('inventory_shard_0').get(pk=odd_id).warehouse_id, self.even.warehouse_id)
+
+    def test_stocktake_rows_take_ids_from_the_sequence(self):
+        odd_id = self.create_row(self.odd, 5)
+        stocktake, _, _ = create_stocktake([self.odd.warehouse_id, self.even.warehouse_id], ['W-1', 'W-1'], [5, 3])
+        apply_stocktake(stocktake.stocktake_id)
+        created = Inventory.objects.using('inventory_shard_0').get(warehouse_id=self.even.warehouse_id)
+        self.assertEqual(created.quantity, 3)
+        self.assertNotEqual(created.inventory_id, odd_id)
+        self.assertEqual(IdSequence.objects.get(name='inventory').next_value, created.inventory_id + 1)
+
+
+@override_settings(INVENTORY_SHARDS=SHARDS, SHARD_READ_REPLICAS={'inventory_shard_0': ['inventory_shard_0_replica']})
+class ShardReplicaTests(SimpleTestCase):
+    def setUp(self):
+        # Every configured replica is treated as caught up
+        self.enterContext(mock.patch.object(replicas, 'healthy_replicas', side_effect=replicas.replica_aliases))
+
+    def test_fan_out_reads_each_shard_from_its_replica(self):
+        self.assertEqual(fan_out(lambda qs: [qs.db]), SHARDS)
+        with replicas.replica_reads():
+            self.assertEqual(fan_out(lambda qs: [qs.db]), ['inventory_shard_0_replica', 'inventory_shard_1'])
+
+    def test_find_inventory_reads_the_replica_unless_locking(self):
+        used = []
+
+        def first(queryset):
+            used.append(queryset.db)
+            return None
+
+        with replicas.replica_reads(), mock.patch('django.db.models.query.QuerySet.first', first):
+            with self.assertRaises(Inventory.DoesNotExist):
+                find_inventory(1)
+            self.assertEqual(used, ['inventory_shard_0_replica', 'inventory_shard_1'])
+            used.clear()
+            with self.assertRaises(Inventory.DoesNotExist):
+                find_inventory(1, for_update=True)
+            self.assertEqual(used, SHARDS)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Hot', sku='H-1', unit_price=10)
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        self.inventory = Inventory.objects.create(product_id=self.product.product_id,
+                                                  warehouse_id=self.warehouse.warehouse_id, quantity=100)
+        self.enterContext(override_settings(STOCK_RESERVATION_PRODUCTS=[self.product.product_id],
+                                            STOCK_RESERVATION_BLOCK=10, STOCK_RESERVATION_WAIT_SECONDS=0))
+        # Drive the pool by hand: no background thread, no exit hook
+        self.enterContext(mock.patch.object(ReservationPool, '_run', lambda pool: None))
+        self.enterContext(mock.patch.object(reservations.atexit, 'register'))
+        self.pool = ReservationPool()
+        self.enterContext(mock.patch.object(reservations, 'pool', self.pool))
+        self.pool.start()
+        self.pool.reserve(self.product.product_id, 10)
+        self.pool.flush()  # Takes the lease that lets the budget be sold from
+        self.slot = self.pool._slots[self.product.product_id][self.inventory.inventory_id]
+
+    def sell(self, quantity):
+        with transaction.atomic(), allocated_stock(self.product.product_id, quantity) as plan:
+            return plan
+
+    def assert_stock(self, quantity, reserved):
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.inventory_id).quantity, quantity)
+        self.assertEqual(StockReservation.objects.get().reserved, reserved)
+
+    def test_sales_are_journalled_then_flushed(self):
+        self.sell(3)
+        self.assertEqual(StockReservationUse.objects.get().quantity, 3)
+        self.assertEqual(self.slot.budget, 7)
+        self.assert_stock(100, 10)  # Nothing touches the inventory row until the flush
+
+        self.pool.flush()
+        self.assert_stock(97, 7)
+        self.assertFalse(StockReservationUse.objects.exists())
+        self.assertEqual((self.slot.admitted, self.slot.budget), (0, 7))
+
+    def test_reserved_sale_books_rollups_at_flush(self):
+        order = Order.objects.create(status='Pending')
+        response = self.client.post('/api/order-items/create/', json.dumps({
+            'orderId': order.order_id, 'productId': self.product.product_id, 'quantity': 3, 'unitPrice': '10',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        # The sale locks no rollup row: its delta waits in the journal
+        self.assertFalse(DailyProductSales.objects.exists())
+        self.assertFalse(DailyWarehouseSales.objects.exists())
+
+        self.pool.flush()
+        self.assertEqual(DailyProductSales.objects.values_list('product_id', 'units', 'revenue').get(),
+                         (self.product.product_id, 3, 30))
+        self.assertEqual(DailyWarehouseSales.objects.values_list('warehouse_id', 'units', 'revenue').get(),
+                         (self.warehouse.warehouse_id, 3, 30))
+
+    def test_held_units_are_not_sold_twice(self):
+        with self.assertRaises(InsufficientStockError), transaction.atomic():
+            allocate_stock(self.product.product_id, 91)  # Only 90 of the 100 units are free
+        self.sell(10)
+        with self.assertRaises(InsufficientStockError):
+            self.pool.admit(self.product.product_id, 1)
+        self.pool.flush()
+        self.assert_stock(90, 0)
+
+    def test_rolled_back_sale_returns_to_the_budget(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            with allocated_stock(self.product.product_id, 4):
+                raise RuntimeError("order item failed")
+        self.assertFalse(StockReservationUse.objects.exists())
+        self.assertEqual(self.slot.budget, 6)  # Until the journal shows the sale never committed
+
+        self.slot.uses = {use_id: (units, written_at - 60) for use_id, (units, written_at) in self.slot.uses.items()}
+        self.pool.flush()
+        self.assertEqual(self.slot.budget, 10)
+        self.assert_stock(100, 10)
+
+    def test_reconcile_applies_expired_reservations(self):
+        self.sell(2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reconcile(), (1, 2))
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.inventory_id).quantity, 98)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(StockReservationUse.objects.exists())
+
+    def test_manual_update_cannot_undercut_held_units(self):
+        url = f'/api/inventory/{self.inventory.inventory_id}/update/'
+        response = self.client.put(url, json.dumps({'quantity': 5}), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        response = self.client.put(url, json.dumps({'quantity': 10}), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_stock(10, 10)
+
+    def test_stocktake_cannot_undercut_held_units(self):
+        stocktake, _, _ = create_stocktake([self.warehouse.warehouse_id], ['H-1'], [4])
+        with self.assertRaises(InsufficientStockError):
+            apply_stocktake(stocktake.stocktake_id)
+        self.assert_stock(100, 10)
+
+    def test_deleting_inventory_deletes_its_reservations(self):
+        self.sell(1)
+        response = self.client.delete(f'/api/inventory/{self.inventory.inventory_id}/delete/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(StockReservationUse.objects.exists())
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.old = Order.objects.create(customer_name='Old', status='Pending', total_amount=0)
+        self.untouched = Order.objects.create(customer_name='Untouched', status='Pending', total_amount=0)
+        last_month = timezone.now() - timedelta(days=30)
+        Order.objects.update(order_date=last_month, updated_at=last_month)
+        self.since = (timezone.now() - timedelta(days=1)).timestamp()
+
+    def test_changed_orders_are_returned(self):
+        response = self.client.put(f'/api/orders/{self.old.order_id}/update/', json.dumps({'status': 'Completed'}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        orders = self.client.get(f'/api/orders/?since={self.since}').json()['orders']
+        self.assertEqual([(order['order_id'], order['status']) for order in orders], [(self.old.order_id, 'Completed')])
+
+    def test_items_added_to_old_orders_are_returned(self):
+        item = OrderItem.objects.create(order_id=self.old.order_id, product_id=1, quantity=2, unit_price=5, subtotal=10)
+        items = self.client.get(f'/api/order-items/?since={self.since}').json()['orderItems']
+        self.assertEqual([row['order_item_id'] for row in items], [item.order_item_id])
+
+    def test_deltas_read_only_the_rows_they_reference(self):
+        category = Category.objects.create(category_name='Tools')
+        Product.objects.create(product_name='Old', sku='O-1', unit_price=1, category_id=category.category_id)
+        Product.objects.update(updated_at=timezone.now() - timedelta(days=30))
+        product = Product.objects.create(product_name='New', sku='N-1', unit_price=1, category_id=category.category_id)
+        warehouse = Warehouse.objects.create(warehouse_name='Main')
+        Inventory.objects.create(product_id=product.product_id, warehouse_id=warehouse.warehouse_id, quantity=3)
+        since = timezone.now() - timedelta(days=1)
+
+        with self.assertNumQueries(2):  # Changed products, then their categories by ID
+            self.assertEqual([row['sku'] for row in product_rows(Lookups(), since)], ['N-1'])
+        with self.assertNumQueries(4):  # Changed rows, then their products, warehouses and categories by ID
+            self.assertEqual([row['sku'] for row in inventory_rows(Lookups(), since)], ['N-1'])
+
+    def test_orders_archived_with_a_short_horizon_stay_listed(self):
+        self.assertEqual(archive_orders(days=10), 2)  # Younger than ORDER_ARCHIVE_DAYS
+        start = (timezone.localdate() - timedelta(days=40)).isoformat()
+        orders = self.client.get(f'/api/orders/?start={start}').json()['orders']
+        self.assertEqual(sorted(order['order_id'] for order in orders), [self.old.order_id, self.untouched.order_id])
+        self.assertEqual(self.client.get('/api/orders/').json()['orders'], [])
+
+    def test_malformed_since_is_a_bad_request(self):
+        for path in ('products', 'suppliers', 'warehouses', 'inventory', 'orders', 'order-items'):
+            response = self.client.get(f'/api/{path}/?since=yesterday')
+            self.assertEqual(response.status_code, 400, path)
+        self.assertEqual(self.client.get('/api/batch/?resources=orders&since=yesterday').status_code, 400)
+
+    def test_transferred_rows_show_up_in_the_inventory_delta(self):
+        product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        source, dest = Warehouse.objects.create(warehouse_name='A'), Warehouse.objects.create(warehouse_name='B')
+        Inventory.objects.create(product_id=product.product_id, warehouse_id=source.warehouse_id, quantity=5)
+        Inventory.objects.create(product_id=product.product_id, warehouse_id=dest.warehouse_id, quantity=0)
+        Inventory.objects.update(last_updated=timezone.now() - timedelta(days=30))
+        response = self.client.post('/api/inventory/transfer/', json.dumps({
+            'productId': product.product_id, 'fromWarehouseId': source.warehouse_id,
+            'toWarehouseId': dest.warehouse_id, 'quantity': 2,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = self.client.get(f'/api/inventory/?since={self.since}').json()['inventories']
+        self.assertEqual(len(rows), 2)
+
+
+class EventStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.enterContext(override_settings(EVENT_POLL_SECONDS=0.05))
+        self.enterContext(mock.patch.object(views, 'SSE_HEARTBEAT_SECONDS', 0.1))
+
+    def read_until(self, stream, text):
+        for chunk in itertools.islice(stream, 50):  # Keep-alives arrive every 0.1s meanwhile
+            if text in chunk:
+                return chunk
+        self.fail(f"{text!r} never arrived")
+
+    def test_event_published_elsewhere_reaches_wsgi_stream(self):
+        response = self.client.get('/api/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), b"retry: 3000\n\n")
+
+        # Another worker or run_jobs: a different thread with its own database connection
+        def other_process():
+            events.publish('inventory.changed', {'inventory_id': 1})
+            connections.close_all()
+        writer = threading.Thread(target=other_process)
+        writer.start()
+        writer.join()
+        event = self.read_until(stream, b'event: inventory.changed')
+
+        # A client reconnecting with Last-Event-ID is replayed what it missed
+        event_id = int(event.split(b'\n')[0].removeprefix(b'id: '))
+        replay = self.client.get('/api/events/', headers={'Last-Event-ID': str(event_id - 1)})
+        replayed = iter(replay.streaming_content)
+        next(replayed)
+        self.assertIn(f'id: {event_id}'.encode(), next(replayed))
+        replay.close()
+        response.close()  # What the WSGI server does when the browser goes away
+        self.assertEqual(broadcaster.subscriber_count, 0)
+
+
+class CascadeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.main = Warehouse.objects.create(warehouse_name='Main')
+        self.other = Warehouse.objects.create(warehouse_name='Other')
+        for warehouse in (self.main, self.other):
+            Inventory.objects.create(product_id=self.product.product_id, warehouse_id=warehouse.warehouse_id, quantity=50)
+
+    def sell(self, order, quantity, split=None):
+        item = OrderItem.objects.create(order_id=order.order_id, product_id=self.product.product_id,
+                                        quantity=quantity, unit_price=10, subtotal=10 * quantity)
+        for warehouse, units in (split or {}).items():
+            OrderItemAllocation.objects.create(order_item_id=item.order_item_id, order_id=order.order_id,
+                                               product_id=self.product.product_id, inventory_id=0,
+                                               warehouse_id=warehouse.warehouse_id, quantity=units)
+        apply_order_item_delta(order.order_id, self.product.product_id, quantity, 10,
+                               {w.warehouse_id: units for w, units in split.items()} if split else None)
+
+    def test_deleting_orders_subtracts_only_their_sales(self):
+        kept, deleted = Order.objects.create(status='Pending'), Order.objects.create(status='Pending')
+        self.sell(kept, 1)
+        self.sell(deleted, 2)
+        self.sell(deleted, 3, {self.main: 1, self.other: 2})
+
+        delete_orders([deleted.order_id])
+        self.assertEqual(DailyProductSales.objects.get().units, 1)
+        self.assertEqual(dict(DailyWarehouseSales.objects.values_list('warehouse_id', 'units')),
+                         {self.main.warehouse_id: 1, self.other.warehouse_id: 0})
+        self.assertEqual(DailyProductSales.objects.get().revenue, 10)
+
+    def test_deleting_an_archived_order_removes_it_and_its_sales(self):
+        kept = Order.objects.create(status='Pending')
+        old = Order.objects.create(status='Delivered')
+        Order.objects.filter(pk=old.order_id).update(order_date=timezone.now() - timedelta(days=400))
+        self.sell(kept, 1)
+        self.sell(old, 3, {self.main: 1, self.other: 2})
+        self.assertEqual(archive_orders(days=365), 1)
+
+        response = self.client.delete(f'/api/orders/{old.order_id}/delete/')
+        self.assertEqual(response.status_code, 200, response.content)
+        for model in (ArchivedOrder, ArchivedOrderItem, ArchivedOrderItemAllocation):
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertTrue(Order.objects.filter(pk=kept.order_id).exists())
+        self.assertEqual(sum(DailyProductSales.objects.values_list('units', flat=True)), 1)
+        self.assertEqual(sum(DailyWarehouseSales.objects.values_list('units', flat=True)), 1)
+        self.assertTrue(DeletedRecord.objects.filter(table_name='orders', record_id=old.order_id).exists())
+
+    def test_deleting_products_sends_no_per_row_delete_signals(self):
+        signals = []
+
+        def receiver(instance, **kwargs):
+            signals.append(instance)
+
+        post_delete.connect(receiver, sender=Inventory)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Inventory)
+
+        result = delete_products([self.product.product_id])
+        self.assertEqual(len(result['inventory']), 2)
+        self.assertFalse(Inventory.objects.exists())
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(signals, [])
+
+
+class SalesReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        Inventory.objects.create(product_id=self.product.product_id, warehouse_id=self.warehouse.warehouse_id, quantity=100)
+
+    def sell(self, day, quantity):
+        order = Order.objects.create(status='Pending')
+        noon = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=12))
+        Order.objects.filter(pk=order.order_id).update(order_date=noon)
+        response = self.client.post('/api/order-items/create/', {
+            'orderId': order.order_id, 'productId': self.product.product_id, 'quantity': quantity, 'unitPrice': '₱10.00',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def report(self, **params):
+        response = self.client.get('/api/reports/sales/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(row['period'], row['units'], row['revenueValue']) for row in response.json()['sales']]
+
+    def test_report_buckets_rollup_rows(self):
+        self.sell(date(2026, 3, 2), 2)   # Monday
+        self.sell(date(2026, 3, 4), 3)   # Same week
+        self.sell(date(2026, 3, 10), 1)  # Next week
+        self.assertEqual(self.report(), [('2026-03-02', 2, 20.0), ('2026-03-04', 3, 30.0), ('2026-03-10', 1, 10.0)])
+        self.assertEqual(self.report(bucket='week'), [('2026-03-02', 5, 50.0), ('2026-03-09', 1, 10.0)])
+        self.assertEqual(self.report(bucket='month', group='warehouse', start='2026-03-03'), [('2026-03-01', 4, 40.0)])
+
+        # The report reads the rollups, which a rebuild from order items reproduces
+        DailyProductSales.objects.all().delete()
+        self.assertEqual(self.report(), [])
+        rollups.rebuild_rollups()
+        self.assertEqual(self.report(bucket='week'), [('2026-03-02', 5, 50.0), ('2026-03-09', 1, 10.0)])
+        self.assertEqual(self.client.get('/api/reports/sales/', {'bucket': 'year'}).status_code, 400)
+
+
+class OrderTotalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        Inventory.objects.create(product_id=self.product.product_id, warehouse_id=self.warehouse.warehouse_id, quantity=100)
+        self.order = Order.objects.create(status='Pending', total_amount=0)
+        self.other = Order.objects.create(status='Pending', total_amount=0)
+
+    def add_item(self, quantity, unit_price):
+        response = self.client.post('/api/order-items/create/', {
+            'orderId': self.order.order_id, 'productId': self.product.product_id,
+            'quantity': quantity, 'unitPrice': unit_price,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['orderItem']['order_item_id']
+
+    def total(self, order):
+        return Order.objects.values_list('total_amount', flat=True).get(pk=order.order_id)
+
+    def test_items_keep_subtotals_and_order_totals(self):
+        first = self.add_item(2, '₱10.25')
+        self.add_item(3, '1.10')
+        self.assertEqual(sorted(OrderItem.objects.values_list('subtotal', flat=True)), [Decimal('3.30'), Decimal('20.50')])
+        self.assertEqual(self.total(self.order), Decimal('23.80'))
+
+        # A client-supplied total is ignored once the order has items
+        response = self.client.put(f'/api/orders/{self.order.order_id}/update/', {'totalAmount': '₱1.00'},
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.total(self.order), Decimal('23.80'))
+
+        # Moving an item updates both orders
+        response = self.client.put(f'/api/order-items/{first}/update/', {'orderId': self.other.order_id, 'quantity': 1},
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((self.total(self.order), self.total(self.other)), (Decimal('3.30'), Decimal('10.25')))
+
+        self.assertEqual(self.client.delete(f'/api/order-items/{first}/delete/').status_code, 200)
+        self.assertEqual(self.total(self.other), Decimal('0.00'))
+
+    def test_backfill_fixes_stale_totals(self):
+        self.add_item(2, '5.00')
+        OrderItem.objects.update(subtotal=0)
+        Order.objects.update(total_amount=99)
+        self.assertEqual(backfill_order_totals(batch_size=1), (1, 2))
+        self.assertEqual(OrderItem.objects.get().subtotal, Decimal('10.00'))
+        self.assertEqual((self.total(self.order), self.total(self.other)), (Decimal('10.00'), Decimal('0.00')))
+
+
+class WarmUpTests(TestCase):
+    databases = {'default', *SHARDS}  # The connect phase opens every configured database
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.index = self.enterContext(mock.patch.object(sku_index, 'sku_index', sku_index.SkuIndex()))
+
+    def test_phases_prime_the_response_cache_and_sku_index(self):
+        logger = mock.Mock()
+        timings = warmup.warm_up(logger=logger)
+        self.assertEqual(list(timings), ['import', 'connect', 'prime'])
+        logger.warning.assert_not_called()
+        self.assertEqual(self.index._products['W-1'][0], self.product.product_id)
+
+        # The first client request is answered from the body the prime phase cached
+        Product.objects.filter(pk=self.product.product_id).update(product_name='Gadget')  # No signals, no bump
+        self.assertIn(b'Widget', self.client.get('/api/products/').content)
+
+    def test_failing_phase_is_logged_and_the_rest_still_run(self):
+        logger = mock.Mock()
+        phases = [('import', warmup.import_modules), ('connect', mock.Mock(side_effect=RuntimeError('MySQL is down'))),
+                  ('prime', warmup.prime_caches)]
+        with mock.patch.object(warmup, 'PHASES', phases):
+            timings = warmup.warm_up(logger=logger)
+        self.assertEqual(list(timings), ['import', 'connect', 'prime'])
+        logger.warning.assert_called_once_with("Warm-up phase %s failed: %s", 'connect', mock.ANY)
+        self.assertIn('W-1', self.index._products)
+
+
+@override_settings(PROFILING_TOKEN='s3cret', PROFILING_SAMPLE_RATE=0)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(override_settings(PROFILES_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+
+    def test_only_requests_with_the_token_are_profiled(self):
+        response = self.client.get('/api/products/', headers={'X-Profile': 's3cret'})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        summary = self.client.get(f'/api/profiles/{profile_id}/', headers={'X-Profile': 's3cret'}).json()
+        self.assertEqual(summary['path'], '/api/products/')
+        self.assertTrue(any('products' in query['sql'] for query in summary['sql']))
+
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/products/', headers={'X-Profile': 'guess'}))
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/products/'))
+
+    def test_profile_endpoints_require_the_token(self):
+        profile_id = self.client.get('/api/products/', headers={'X-Profile': 's3cret'})['X-Profile-Id']
+        for path in ('/api/profiles/', f'/api/profiles/{profile_id}/', f'/api/profiles/{profile_id}/download/',
+                     '/api/admin/slow-queries/'):
+            self.assertEqual(self.client.get(path).status_code, 403, path)
+            self.assertEqual(self.client.get(path, headers={'X-Profile': 'guess'}).status_code, 403, path)
+        listed = self.client.get('/api/profiles/', headers={'X-Profile': 's3cret'}).json()['profiles']
+        self.assertEqual([profile['id'] for profile in listed], [profile_id])
+        with override_settings(PROFILING_TOKEN=''):  # No token configured: nobody gets in
+            self.assertEqual(self.client.get('/api/profiles/', headers={'X-Profile': ''}).status_code, 403)
+
+
+@override_settings(PROFILING_TOKEN='s3cret', SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        warehouse = Warehouse.objects.create(warehouse_name='Main')
+        Inventory.objects.create(product_id=product.product_id, warehouse_id=warehouse.warehouse_id, quantity=3)
+        slow_queries.clear()  # Only the requests below are logged
+        self.addCleanup(slow_queries.clear)
+
+    def test_slow_queries_are_logged_with_view_and_plan(self):
+        self.assertTrue(any(getattr(w, 'slow_query_log', False) for w in connections['default'].execute_wrappers))
+        self.assertEqual(self.client.get('/api/inventory/').status_code, 200)
+
+        response = self.client.get('/api/admin/slow-queries/', {'view': 'get_inventory'}, headers={'X-Profile': 's3cret'})
+        self.assertEqual(response.status_code, 200)
+        logged = response.json()['queries']
+        inventory_reads = [row for row in logged if 'FROM "inventory"' in row['sql']]
+        self.assertTrue(inventory_reads, logged)
+        self.assertEqual({row['view'] for row in logged}, {'get_inventory'})
+        self.assertTrue(inventory_reads[0]['plan'])  # EXPLAIN QUERY PLAN rows on SQLite
+        self.assertTrue(inventory_reads[0]['source'])
+
+        response = self.client.delete('/api/admin/slow-queries/', headers={'X-Profile': 's3cret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(slow_queries.entries(), [])
+
+    def test_queries_under_the_threshold_are_not_logged(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=60_000):
+            self.client.get('/api/inventory/')
+        self.assertEqual(slow_queries.entries(), [])
+
+
+class OrderPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.order_ids = []
+        for n in range(5):
+            order = Order.objects.create(status='Pending')
+            OrderItem.objects.create(order_id=order.order_id, product_id=self.product.product_id,
+                                     quantity=n + 1, unit_price=10, subtotal=10 * (n + 1))
+            self.order_ids.append(order.order_id)
+        # The two oldest orders are archived
+        Order.objects.filter(order_id__in=self.order_ids[:2]).update(order_date=timezone.now() - timedelta(days=400))
+        archive_orders(days=365)
+        self.start = (timezone.localdate() - timedelta(days=500)).isoformat()
+
+    def page(self, page, page_size):
+        response = self.client.get('/api/orders/', {'include': 'items', 'start': self.start,
+                                                    'page': page, 'pageSize': page_size})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_pages_run_newest_first_across_hot_and_archived_orders(self):
+        body = self.page(2, 2)
+        self.assertEqual((body['total'], body['totalPages']), (5, 3))
+        # The page starts in the hot table and continues in the archive
+        self.assertEqual([order['order_id'] for order in body['orders']], [self.order_ids[2], self.order_ids[1]])
+        self.assertEqual([[(item['quantity'], item['productName']) for item in order['items']] for order in body['orders']],
+                         [[(3, 'Widget')], [(2, 'Widget')]])
+        self.assertEqual([order['order_id'] for order in self.page(3, 2)['orders']], [self.order_ids[0]])
+        self.assertEqual(self.page(4, 2)['orders'], [])
+
+    def test_query_count_does_not_grow_with_the_page_size(self):
+        # Both pages span the hot and archive tables
+        with CaptureQueriesContext(connections['default']) as small:
+            self.page(2, 2)
+        with CaptureQueriesContext(connections['default']) as large:
+            self.page(1, 5)
+        self.assertEqual(len(large), len(small))
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        Inventory.objects.create(product_id=self.product.product_id, warehouse_id=self.warehouse.warehouse_id, quantity=4)
+        self.order = Order.objects.create(status='Pending')
+
+    def test_batch_returns_the_same_lists_as_the_list_endpoints(self):
+        response = self.client.get('/api/batch/', {'resources': 'products,inventory,warehouses'})
+        self.assertEqual(response.status_code, 200, response.content)
+        batch = response.json()
+        self.assertEqual(set(batch), {'products', 'inventory', 'warehouses'})
+        self.assertEqual(batch['products']['products'], self.client.get('/api/products/').json()['products'])
+        self.assertEqual(batch['inventory']['inventories'], self.client.get('/api/inventory/').json()['inventories'])
+        self.assertIn('syncToken', batch['products'])
+
+    def test_post_sub_requests_and_bad_resources(self):
+        response = self.client.post('/api/batch/', {'requests': [{'resource': 'orders'}, 'categories']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([order['order_id'] for order in response.json()['orders']['orders']], [self.order.order_id])
+        self.assertEqual(self.client.get('/api/batch/', {'resources': 'products,nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/batch/', {'resources': 'products,products'}).status_code, 400)
+
+
+@override_settings(RATE_LIMIT_ENABLED=True, RATE_LIMITS={'read': (1, 2)}, HEAVY_REQUEST_CONCURRENCY=1)
+class RateLimitTests(SimpleTestCase):
+    def test_burst_then_429_with_retry_after(self):
+        middleware = RateLimitMiddleware(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/api/jobs/')
+        self.assertEqual([middleware(request).status_code for _ in range(2)], [200, 200])
+        response = middleware(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        # Other clients have their own bucket
+        self.assertEqual(middleware(RequestFactory().get('/api/jobs/', REMOTE_ADDR='10.0.0.2')).status_code, 200)
+
+    def test_heavy_request_over_concurrency_gets_503(self):
+        overlapping = []
+
+        def view(request):
+            if not overlapping:
+                # A second heavy request arrives while this one still holds the only slot
+                overlapping.append(middleware(RequestFactory().get('/api/products/', REMOTE_ADDR='10.0.0.2')))
+            return HttpResponse('ok')
+
+        middleware = RateLimitMiddleware(view)
+        self.assertEqual(middleware(RequestFactory().get('/api/inventory/')).status_code, 200)
+        self.assertEqual(overlapping[0].status_code, 503)
+        self.assertEqual(overlapping[0]['Retry-After'], '1')
+        self.assertEqual(middleware(RequestFactory().get('/api/products/')).status_code, 200)  # Slot released
+
+
+@override_settings(IDEMPOTENCY_WAIT_SECONDS=0.2)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10)
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        self.key = hashlib.sha256(b"POST /api/inventory/create/ retry-1").hexdigest()
+        # Responses stored by earlier tests would otherwise be replayed from this process's LRU
+        self.enterContext(mock.patch.object(idempotency, '_cache', idempotency.ResponseCache(10)))
+
+    def create_row(self):
+        return self.client.post('/api/inventory/create/', json.dumps({
+            'productId': self.product.product_id, 'warehouseId': self.warehouse.warehouse_id, 'quantity': 1,
+        }), content_type='application/json', headers={'Idempotency-Key': 'retry-1'})
+
+    def claim(self, age):
+        IdempotencyKey.objects.create(key=self.key, fingerprint='', claimed_at=timezone.now() - age)
+
+    def test_running_claim_blocks_the_key(self):
+        self.claim(timedelta(seconds=5))
+        self.assertEqual(self.create_row().status_code, 409)
+        self.assertFalse(Inventory.objects.exists())
+
+    def test_dead_workers_claim_is_taken_over(self):
+        self.claim(timedelta(minutes=10))
+        self.assertEqual(self.create_row().status_code, 200)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+        replay = self.create_row()
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Inventory.objects.count(), 1)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        self.enterContext(override_settings(JOB_RESULTS_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.warehouse = Warehouse.objects.create(warehouse_name='Main')
+        self.product = Product.objects.create(product_name='Widget', sku='W-1', unit_price=10, cost_price=4)
+        self.inventory = Inventory.objects.create(product_id=self.product.product_id,
+                                                  warehouse_id=self.warehouse.warehouse_id, quantity=10)
+
+    def run_next(self):
+        return jobs.run_job(jobs.claim_next_job())
+
+    def test_import_job_sets_quantities_from_uploaded_csv(self):
+        body = f"warehouse_id,sku,quantity\n{self.warehouse.warehouse_id},W-1,25\n"
+        response = self.client.post('/api/jobs/import/', body.encode('utf-8'), content_type='text/csv')
+        self.assertEqual(response.status_code, 202, response.content)
+        job = self.run_next()
+        self.assertEqual(job.status, 'succeeded', job.message)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 25)
+        self.assertEqual(Stocktake.objects.get().status, 'applied')
+        self.assertEqual(list(jobs.results_dir().iterdir()), [])  # The staged upload is removed
+
+    def test_rollup_rebuild_stops_between_windows_when_cancelled(self):
+        job = jobs.submit('rebuild_sales_rollups', {'window_days': 7})
+
+        def rebuild(*args, **kwargs):
+            BackgroundJob.objects.filter(job_id=job.job_id).update(cancel_requested=True)
+            return 0, 0
+
+        self.enterContext(mock.patch.object(rollups, 'sales_date_bounds', return_value=(date(2026, 1, 1), date(2026, 3, 1))))
+        rebuilt = self.enterContext(mock.patch.object(rollups, 'rebuild_rollups', side_effect=rebuild))
+        self.assertEqual(self.run_next().status, 'cancelled')
+        self.assertEqual(rebuilt.call_count, 1)
+        self.assertEqual(rebuilt.call_args.args, (None, date(2026, 1, 7)))
+
+    def test_create_job_rejects_unknown_and_invalid_params(self):
+        def create(params):
+            return self.client.post('/api/jobs/create/', {'type': 'forecast_demand', 'params': params},
+                                    content_type='application/json')
+
+        response = create({'history_days': 30, 'product_ids': [1], 'output': '/tmp/x'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('output', response.json()['error'])
+        self.assertEqual(create({'alpha': 2}).status_code, 400)
+        self.assertEqual(create({'method': 'arima'}).status_code, 400)
+        self.assertFalse(BackgroundJob.objects.exists())
+
+        self.assertEqual(create({'history_days': '30', 'product_ids': [self.product.product_id]}).status_code, 202)
+        self.assertEqual(json.loads(BackgroundJob.objects.get().params),
+                         {'history_days': 30, 'product_ids': [self.product.product_id]})
+        job = self.run_next()
+        self.assertEqual(job.status, 'succeeded', job.message)
+
+    def test_reorder_suggestion_limit_is_range_checked(self):
+        gadget = Product.objects.create(product_name='Gadget', sku='G-1', unit_price=10, cost_price=4)
+        Inventory.objects.create(product_id=gadget.product_id, warehouse_id=self.warehouse.warehouse_id, quantity=3)
+        for limit in ('0', '-1', '5001'):
+            self.assertEqual(self.client.get('/api/forecast/reorder/', {'limit': limit}).status_code, 400, limit)
+        response = self.client.get('/api/forecast/reorder/', {'limit': '1'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['suggestions']), 1)
+
+    def test_sweep_fails_dead_jobs_and_deletes_old_files(self):
+        stale = BackgroundJob.objects.create(job_type='export_inventory', status='running',
+                                             heartbeat_at=timezone.now() - timedelta(hours=1))
+        old, new = jobs.results_dir() / 'job_1.csv', jobs.results_dir() / 'job_2.csv'
+        for path in (old, new):
+            path.write_text('x')
+        eight_days_ago = time.time() - 8 * 24 * 60 * 60
+        os.utime(old, (eight_days_ago, eight_days_ago))
+        call_command('run_jobs', '--once', stdout=io.StringIO())
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertEqual(list(jobs.results_dir().iterdir()), [new])
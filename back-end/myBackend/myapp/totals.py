@@ -0,0 +1,61 @@
+"""
+Server-maintained order totals.
+
+order_items.subtotal is always quantity * unit_price and orders.total_amount
+is always the sum of its items' subtotals. Both are written by the server so
+reports can read them directly instead of recomputing from items. The bulk
+UPDATEs here set updated_at themselves (QuerySet.update() skips auto_now) so
+delta-sync clients see the new totals.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum, Value, OuterRef, Subquery, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, OrderItem
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+def line_subtotal(quantity, unit_price):
+    return (Decimal(str(unit_price)) * int(quantity)).quantize(Decimal('0.01'))
+
+
+def refresh_order_totals(order_ids):
+    """Recompute total_amount for the given orders with one UPDATE ... SET = (SELECT SUM)"""
+    order_ids = [order_id for order_id in set(order_ids) if order_id is not None]
+    if not order_ids:
+        return 0
+    item_totals = (OrderItem.objects.filter(order_id=OuterRef('order_id'))
+                   .order_by()
+                   .values('order_id')
+                   .annotate(total=Sum('subtotal'))
+                   .values('total'))
+    return Order.objects.filter(order_id__in=order_ids).update(
+        total_amount=Coalesce(Subquery(item_totals, output_field=MONEY), Value(Decimal('0.00')), output_field=MONEY),
+        updated_at=timezone.now(),
+    )
+
+
+def backfill_order_totals(batch_size=1000, stdout=None):
+    """Fix subtotals and totals for all orders, one order_id range per transaction"""
+    bounds = Order.objects.order_by('order_id').values_list('order_id', flat=True)
+    first_id, last_id = bounds.first(), bounds.last()
+    if first_id is None:
+        return 0, 0
+    items_fixed = orders_fixed = 0
+    for low in range(first_id, last_id + 1, batch_size):
+        high = low + batch_size
+        with transaction.atomic():
+            items_fixed += OrderItem.objects.filter(order_id__gte=low, order_id__lt=high).update(
+                subtotal=ExpressionWrapper(F('quantity') * F('unit_price'), output_field=MONEY),
+                updated_at=timezone.now(),
+            )
+            order_ids = Order.objects.filter(order_id__gte=low, order_id__lt=high).values_list('order_id', flat=True)
+            orders_fixed += refresh_order_totals(list(order_ids))
+        if stdout is not None:
+            stdout.write(f"Orders {low}-{high - 1}: {items_fixed} items, {orders_fixed} orders updated so far")
+    return items_fixed, orders_fixed
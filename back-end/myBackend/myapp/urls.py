@@ -21,6 +21,7 @@ urlpatterns = [
     path('api/products/create/', views.create_product, name='create_product'),  # Create a new product
     path('api/products/<int:product_id>/update/', views.update_product, name='update_product'),  # Update a product
     path('api/products/<int:product_id>/delete/', views.delete_product, name='delete_product'),  # Delete a product
+    path('api/products/bulk-delete/', views.bulk_delete_products, name='bulk_delete_products'),  # Delete several products
     
     # Category endpoints
     path('api/categories/', views.get_categories, name='get_categories'),  # Get all categories
@@ -39,19 +40,23 @@ urlpatterns = [
     path('api/warehouses/create/', views.create_warehouse, name='create_warehouse'),  # Create a new warehouse
     path('api/warehouses/<int:warehouse_id>/update/', views.update_warehouse, name='update_warehouse'),  # Update a warehouse
     path('api/warehouses/<int:warehouse_id>/delete/', views.delete_warehouse, name='delete_warehouse'),  # Delete a warehouse
+    path('api/warehouses/bulk-delete/', views.bulk_delete_warehouses, name='bulk_delete_warehouses'),  # Delete several warehouses
     
     # Inventory endpoints
     path('api/inventory/', views.get_inventory, name='get_inventory'),  # Get all inventory
     path('api/inventory/create/', views.create_inventory, name='create_inventory'),  # Create a new inventory entry
     path('api/inventory/<int:inventory_id>/update/', views.update_inventory, name='update_inventory'),  # Update an inventory entry
     path('api/inventory/<int:inventory_id>/delete/', views.delete_inventory, name='delete_inventory'),  # Delete an inventory entry
+    path('api/inventory/transfer/', views.transfer_inventory, name='transfer_inventory'),  # Move stock between warehouses (single or batch)
 
     
     # Order endpoints
-    path('api/orders/', views.get_orders, name='get_orders'),  # Get all orders
+    path('api/orders/', views.get_orders, name='get_orders'),  # Get all orders (?include=items&page= for paged orders with items)
     path('api/orders/create/', views.create_order, name='create_order'),  # Create a new order
+    path('api/orders/<int:order_id>/', views.get_order, name='get_order'),  # One order with its items nested
     path('api/orders/<int:order_id>/update/', views.update_order, name='update_order'),  # Update an order
     path('api/orders/<int:order_id>/delete/', views.delete_order, name='delete_order'),  # Delete an order
+    path('api/orders/bulk-delete/', views.bulk_delete_orders, name='bulk_delete_orders'),  # Delete several orders
     
     # Order Item endpoints
     path('api/order-items/', views.get_order_items, name='get_order_items'),  # Get all order items
@@ -59,6 +64,46 @@ urlpatterns = [
     path('api/order-items/<int:order_item_id>/update/', views.update_order_item, name='update_order_item'),  # Update an order item
     path('api/order-items/<int:order_item_id>/delete/', views.delete_order_item, name='delete_order_item'),  # Delete an order item
     
+    # Several lists in one request
+    path('api/batch/', views.get_batch, name='get_batch'),  # ?resources=products,warehouses,... or POST sub-requests
+    
+    # Reports
+    path('api/reports/sales/', views.get_sales_report, name='get_sales_report'),  # Sales by day/week/month from rollups
+    
+    # Demand forecasting
+    path('api/forecast/reorder/', views.get_reorder_suggestions, name='get_reorder_suggestions'),  # Forecasts and reorder quantities
+    
+    # Analytics
+    path('api/analytics/inventory/', views.get_inventory_analytics, name='get_inventory_analytics'),  # Stock valuation and ABC classes
+    
+    # Background jobs (run by `manage.py run_jobs`)
+    path('api/jobs/', views.get_jobs, name='get_jobs'),  # List recent jobs
+    path('api/jobs/create/', views.create_job, name='create_job'),  # Queue a job
+    path('api/jobs/import/', views.create_import_job, name='create_import_job'),  # Upload a CSV and queue its import
+    path('api/jobs/<int:job_id>/', views.get_job, name='get_job'),  # Job status and progress
+    path('api/jobs/<int:job_id>/cancel/', views.cancel_job, name='cancel_job'),  # Cancel a job
+    path('api/jobs/<int:job_id>/result/', views.download_job_result, name='download_job_result'),  # Download a job's result file
+    
+    # Stocktakes (physical counts)
+    path('api/stocktakes/', views.upload_stocktake, name='upload_stocktake'),  # Upload a count and compute variances
+    path('api/stocktakes/<int:stocktake_id>/', views.get_stocktake, name='get_stocktake'),  # Summary and largest variances
+    path('api/stocktakes/<int:stocktake_id>/apply/', views.approve_stocktake, name='approve_stocktake'),  # Book approved variances
+    
+    # Barcode scanner SKU lookups
+    path('api/sku/lookup/', views.lookup_skus, name='lookup_skus'),  # Batch lookup of up to 1000 SKUs
+    path('api/sku/<str:sku>/', views.get_sku, name='get_sku'),  # Product and per-warehouse stock for one SKU
+    
+    # Request profiles (X-Profile token required)
+    path('api/profiles/', views.get_profiles, name='get_profiles'),  # List stored profiles
+    path('api/profiles/<str:profile_id>/', views.get_profile, name='get_profile'),  # Profile summary and SQL log
+    path('api/profiles/<str:profile_id>/download/', views.download_profile, name='download_profile'),  # Raw .prof file
+    
+    # Slow-query log (X-Profile token required)
+    path('api/admin/slow-queries/', views.slow_query_log, name='slow_query_log'),  # Slow queries with EXPLAIN plans
+    
+    # Live change stream (Server-Sent Events, served through ASGI)
+    path('api/events/', views.event_stream, name='event_stream'),  # Inventory and order change events
+    
     # User endpoints
     path('api/users/', views.get_users, name='get_users'),  # Get all users
     path('api/users/create/', views.create_user, name='create_user'),  # Create a new user
@@ -1,19 +1,74 @@
 # 
 
-# Import JsonResponse to send JSON data as a response
-from django.http import JsonResponse
+# Import json to parse request bodies
+import json
+# Module logger for unexpected failures in the views
+import logging
+# asyncio and a thread-safe queue timeout for the Server-Sent Events endpoint
+import asyncio
+from queue import Empty
+# Import datetime for formatting dates and parsing ?start=/?end= filters
+from datetime import date, datetime, timezone as dt_timezone
+# Exact money values parsed from request bodies
+from decimal import Decimal
+
+# Import JsonResponse to send JSON data as a response; streaming and file responses
+# for Server-Sent Events and job result downloads
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+# ASGI requests stream events from the event loop, WSGI ones from a worker thread
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 # Decorator to allow requests without CSRF token (for APIs)
 from django.views.decorators.csrf import csrf_exempt
 # Decorator to specify allowed HTTP methods for a view
 from django.views.decorators.http import require_http_methods
 # Exception for when an object is not found in the database
 from django.core.exceptions import ObjectDoesNotExist
-# Import json to parse request bodies
-import json
+# Transactions and integrity errors for multi-row stock updates
+from django.db import transaction, IntegrityError
+# F expressions let the database do arithmetic on the current column value; the rest build report aggregates
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Abs, TruncDay, TruncWeek, TruncMonth
+# Timezone helpers for parsing ?since= sync tokens
+from django.utils import timezone
+
 # Import all models used in the app
-from .models import Product, Category, Supplier, Warehouse, Inventory, Order, OrderItem, User
-# Import datetime for formatting dates
-from datetime import datetime
+from .models import (BackgroundJob, Category, DailyProductSales, DailyWarehouseSales, DeletedRecord, Inventory, Order,
+                     OrderItem, OrderItemAllocation, Product, Stocktake, StocktakeLine, Supplier, User, Warehouse)
+# Background jobs, demand forecasting, inventory analytics, request profiling and the slow-query log
+from . import analytics, forecasting, jobs, profiling, slow_queries
+# Change events, delivered to streams in every process through the change_events outbox
+from .events import broadcaster, publish_on_commit, publish_inventory_change
+# Daily sales rollups maintained on order item writes
+from .rollups import apply_order_item_delta, warehouse_split_for_item
+# Server-maintained order item subtotals and order totals
+from .totals import line_subtotal, refresh_order_totals
+# Replay stored responses for retried requests carrying an Idempotency-Key
+from .idempotency import idempotent
+# Pre-serialized, pre-compressed responses for hot read endpoints
+from .response_cache import cached_response, bump_versions
+# Splitting order item quantities across warehouses
+from .allocation import ensure_holds_covered, held_quantities, reservations_enabled, InsufficientStockError
+# Hot SKUs are sold from per-worker reserved budgets instead of row locks
+from .reservations import allocated_stock, drop_reservations, rollups_deferred
+# Inventory rows live on the shard database of their warehouse
+from .sharding import (atomic_shards, fan_out, find_inventory, inventory_for_warehouse,
+                       shard_for_warehouse, sharding_enabled)
+# Old orders live in archive tables; date-filtered lists read them too
+from .archive import find_order, items_between, items_for_orders, order_page, orders_between
+# Version checks (If-Match) and changed-fields-only updates
+from .concurrency import VersionConflict, etag, expected_version, save_changes
+# SKU -> product and stock index for barcode scanners
+from .sku_index import sku_index
+# Physical count upload and reconciliation
+from .stocktake import apply_stocktake, create_stocktake, read_count_csv, stocktake_summary
+# Set-based deletes that take dependent rows with them
+from .cascades import delete_orders, delete_products, delete_warehouses, record_deletion
+# Category/supplier/product/warehouse maps shared by the list builders
+from .lookups import Lookups
+
+
+logger = logging.getLogger(__name__)
 
 
 # Helper function to format datetime objects to 12-hour format with AM/PM
@@ -23,6 +78,77 @@ def format_datetime_12hr(dt):
     return ""  # Return empty string if no date
 
 
+# Helper function to turn IDs like "P001", "W002" or 3 into plain integers
+def parse_prefixed_id(value, prefix):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.upper().startswith(prefix):
+            value = value[len(prefix):]
+    return int(value)
+
+
+# Helper function to read the ?since= delta-sync parameter.
+# Accepts an ISO 8601 timestamp or a sync token (epoch seconds) returned by a
+# previous list call. Returns None when the parameter is absent.
+def parse_since(request):
+    return parse_since_value(request.GET.get('since'))
+
+
+def parse_since_value(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+    except ValueError:
+        pass
+    value = value.replace('Z', '+00:00')
+    if 'T' in value and ' ' in value:
+        value = value.replace(' ', '+')  # An unencoded '+' in the query string arrives as a space
+    since = datetime.fromisoformat(value)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+# Helper function to read the optional ?start=&end= order-date filter.
+# Both are YYYY-MM-DD and inclusive; returns (start, end) as aware datetimes or None.
+def parse_date_range(request):
+    return parse_date_values(request.GET.get('start'), request.GET.get('end'))
+
+
+def parse_date_values(start, end):
+    start = timezone.make_aware(datetime.combine(date.fromisoformat(start), datetime.min.time())) if start else None
+    end = timezone.make_aware(datetime.combine(date.fromisoformat(end), datetime.max.time())) if end else None
+    return start, end
+
+
+# Helper function to build the sync fields added to list responses.
+# The token is taken before the rows are read so that a row committed while the
+# response is being built is returned again on the next sync instead of lost.
+def sync_fields(table_name, since, sync_started):
+    fields = {"syncToken": f"{sync_started.timestamp():.6f}"}
+    if since is not None:
+        fields["deleted"] = list(
+            DeletedRecord.objects.filter(table_name=table_name, deleted_at__gte=since)
+            .values_list('record_id', flat=True)
+        )
+    return fields
+
+
+# Helper function to read the "ids" list of a bulk delete request.
+# IDs may be plain numbers or the prefixed form returned by the API ("P001").
+def parse_bulk_ids(request, prefix):
+    ids = json.loads(request.body).get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("ids must be a non-empty list")
+    return [parse_prefixed_id(value, prefix) for value in ids]
+
+
+# Helper function to report what a cascading delete removed
+def deleted_counts(deleted):
+    return {table: len(ids) for table, ids in deleted.items()}
+
+
 # Health check endpoint to verify backend is running
 @csrf_exempt
 @require_http_methods(["GET"])
@@ -38,42 +164,55 @@ def health_check(request):
 # Get all products from the database
 @csrf_exempt
 @require_http_methods(["GET"])
+@cached_response('products', 'categories')  # Served from cache until either table changes
 def get_products(request):
     try:
-        products = Product.objects.all()  # Query all products
-        products_list = []  # List to store product data
-        
-        for product in products:
-            # Look up category name if category_id exists
-            category_name = ""
-            if product.category_id:
-                try:
-                    category = Category.objects.get(category_id=product.category_id)
-                    category_name = category.category_name
-                except Category.DoesNotExist:
-                    category_name = ""
-            
-            # Add each product's details to the list
-            products_list.append({
-                "id": f"P{str(product.product_id).zfill(3)}",  # Custom product ID with leading zeros
-                "product_id": product.product_id,  # Database product ID
-                "name": product.product_name,  # Product name
-                "description": product.description or "",  # Description or empty
-                "categoryId": str(product.category_id) if product.category_id else "",  # Category ID as string
-                "categoryName": category_name,  # Category name
-                "supplierId": str(product.supplier_id) if product.supplier_id else "",  # Supplier ID as string
-                "unitPrice": f"₱{float(product.unit_price):,.2f}",  # Price formatted with peso sign
-                "sku": product.sku,  # SKU code
-                "costPrice": f"₱{float(product.cost_price):,.2f}" if product.cost_price else "₱0.00",  # Cost price
-                "createdAt": format_datetime_12hr(product.created_at),  # Created date
-                "updatedAt": format_datetime_12hr(product.updated_at)  # Updated date
-            })
-        
-        return JsonResponse({"products": products_list})  # Return all products as JSON
+        since = parse_since(request)  # Optional delta-sync timestamp
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid since parameter: {str(e)}"}, status=400)
+    try:
+        sync_started = timezone.now()
+        products_list = product_rows(Lookups(), since)
+        return JsonResponse({"products": products_list, **sync_fields('products', since, sync_started)})  # Return all products as JSON
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)  # Return error if any
 
 
+# Helper function to build the product list, optionally only rows changed since a sync
+def product_rows(lookups, since=None):
+    if since is None:
+        products = lookups.products.values()  # All products
+        categories = lookups.categories
+    else:
+        products = list(Product.objects.filter(updated_at__gte=since))  # Only rows changed since last sync
+        categories = lookups.rows_by_id(Category, {p.category_id for p in products if p.category_id})
+    products_list = []  # List to store product data
+    
+    for product in products:
+        # Look up category name if category_id exists
+        category = categories.get(product.category_id) if product.category_id else None
+        category_name = category.category_name if category else ""
+        
+        # Add each product's details to the list
+        products_list.append({
+            "id": f"P{str(product.product_id).zfill(3)}",  # Custom product ID with leading zeros
+            "product_id": product.product_id,  # Database product ID
+            "name": product.product_name,  # Product name
+            "description": product.description or "",  # Description or empty
+            "categoryId": str(product.category_id) if product.category_id else "",  # Category ID as string
+            "categoryName": category_name,  # Category name
+            "supplierId": str(product.supplier_id) if product.supplier_id else "",  # Supplier ID as string
+            "unitPrice": f"₱{float(product.unit_price):,.2f}",  # Price formatted with peso sign
+            "sku": product.sku,  # SKU code
+            "costPrice": f"₱{float(product.cost_price):,.2f}" if product.cost_price else "₱0.00",  # Cost price
+            "createdAt": format_datetime_12hr(product.created_at),  # Created date
+            "updatedAt": format_datetime_12hr(product.updated_at),  # Updated date
+            "version": product.version,  # Send back in If-Match when updating
+        })
+    
+    return products_list
+
+
 # Create a new product in the database
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["POST"])  # Only allow POST requests
@@ -114,7 +253,8 @@ def create_product(request):
                 "sku": product.sku,  # SKU
                 "costPrice": f"₱{float(product.cost_price):,.2f}" if product.cost_price else "₱0.00",  # Cost price formatted
                 "createdAt": format_datetime_12hr(product.created_at),  # Created date
-                "updatedAt": format_datetime_12hr(product.updated_at)  # Updated date
+                "updatedAt": format_datetime_12hr(product.updated_at),  # Updated date
+                "version": product.version,  # Send back in If-Match when updating
             }
         }, status=201)
     except Exception as e:
@@ -133,25 +273,28 @@ def update_product(request, product_id):
         # Parse the JSON body from the request
         data = json.loads(request.body)
         
-        # Update product name if provided, otherwise keep the old value
-        product.product_name = data.get('name', product.product_name)
-        # Update description if provided
-        product.description = data.get('description', product.description)
-        # Update category ID if provided
-        product.category_id = int(data.get('categoryId')) if data.get('categoryId') else product.category_id
-        # Update supplier ID if provided
-        product.supplier_id = int(data.get('supplierId')) if data.get('supplierId') else product.supplier_id
-        # Update unit price (convert from string with peso sign/commas to float)
-        product.unit_price = float(data.get('unitPrice', product.unit_price).replace('₱', '').replace(',', ''))
-        # Update SKU if provided
-        product.sku = data.get('sku', product.sku)
-        # Update cost price (convert from string with peso sign/commas to float)
-        product.cost_price = float(data.get('costPrice', product.cost_price).replace('₱', '').replace(',', ''))
-        
-        product.save()  # Save the updated product to the database
+        changes = {}  # Only the fields sent in the request are written
+        if 'name' in data:
+            changes['product_name'] = data['name']  # Product name
+        if 'description' in data:
+            changes['description'] = data['description']  # Description
+        if data.get('categoryId'):
+            changes['category_id'] = int(data['categoryId'])  # Category ID
+        if data.get('supplierId'):
+            changes['supplier_id'] = int(data['supplierId'])  # Supplier ID
+        if 'unitPrice' in data:
+            # Convert from string with peso sign/commas to a decimal
+            changes['unit_price'] = Decimal(str(data['unitPrice']).replace('₱', '').replace(',', ''))
+        if 'sku' in data:
+            changes['sku'] = data['sku']  # SKU
+        if 'costPrice' in data:
+            changes['cost_price'] = Decimal(str(data['costPrice']).replace('₱', '').replace(',', ''))
+        
+        # Conditional UPDATE of the changed columns; fails if the product changed since the client read it
+        save_changes(product, changes, expected_version(request, data))
         
         # Return a JSON response with the updated product's details
-        return JsonResponse({
+        response = JsonResponse({
             "success": True,  # Indicate success
             "product": {
                 "id": f"P{str(product.product_id).zfill(3)}",  # Custom product ID with leading zeros
@@ -164,12 +307,18 @@ def update_product(request, product_id):
                 "sku": product.sku,  # SKU
                 "costPrice": f"₱{float(product.cost_price):,.2f}" if product.cost_price else "₱0.00",  # Cost price formatted
                 "createdAt": format_datetime_12hr(product.created_at),  # Created date
-                "updatedAt": format_datetime_12hr(product.updated_at)  # Updated date
+                "updatedAt": format_datetime_12hr(product.updated_at),  # Updated date
+                "version": product.version,  # Send back in If-Match when updating
             }
         })
+        response['ETag'] = etag(product)
+        return response
     except ObjectDoesNotExist:
         # If the product does not exist, return a 404 error
         return JsonResponse({"error": "Product not found"}, status=404)
+    except VersionConflict as e:
+        # Someone else updated the product first
+        return JsonResponse({"error": str(e), "currentVersion": e.current_version}, status=409)
     except Exception as e:
         # If any other error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=400)
@@ -181,18 +330,29 @@ def update_product(request, product_id):
 def delete_product(request, product_id):
     """Delete a product"""
     try:
-        # Find the product in the database by its ID
-        product = Product.objects.get(product_id=product_id)
-        product.delete()  # Delete the product from the database
+        # Delete the product and its inventory rows in one transaction
+        deleted = delete_products([product_id])
+        if not deleted['products']:
+            # If the product does not exist, return a 404 error
+            return JsonResponse({"error": "Product not found"}, status=404)
         # Return a success message
-        return JsonResponse({"success": True, "message": "Product deleted successfully"})
-    except ObjectDoesNotExist:
-        # If the product does not exist, return a 404 error
-        return JsonResponse({"error": "Product not found"}, status=404)
+        return JsonResponse({"success": True, "message": "Product deleted successfully", "deleted": deleted_counts(deleted)})
     except Exception as e:
         # If any other error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=400)
 
+# Delete several products (and their inventory) at once
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def bulk_delete_products(request):
+    """Delete the products listed in {"ids": [...]}"""
+    try:
+        deleted = delete_products(parse_bulk_ids(request, 'P'))
+        return JsonResponse({"success": True, "message": f"{len(deleted['products'])} products deleted", "deleted": deleted_counts(deleted)})
+    except Exception as e:
+        # If any error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=400)
+
 # ==================== CATEGORY VIEWS ====================
 
 # Get all categories from the database
@@ -201,24 +361,29 @@ def delete_product(request, product_id):
 def get_categories(request):
     """Get all categories"""
     try:
-        categories = Category.objects.all()  # Query all categories
-        categories_list = []  # List to store category data
-        
-        for cat in categories:
-            # Add each category's details to the list
-            categories_list.append({
-                "id": f"C{str(cat.category_id).zfill(3)}",  # Custom category ID with leading zeros
-                "category_id": cat.category_id,  # Database category ID
-                "name": cat.category_name,  # Category name (send as 'name' to frontend)
-                "description": cat.description or ""  # Description or empty
-            })
-        
+        categories_list = category_rows(Lookups())
         return JsonResponse({"categories": categories_list})  # Return all categories as JSON
     except Exception as e:
         # If any error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=500)
 
 
+# Helper function to build the category list
+def category_rows(lookups):
+    categories_list = []  # List to store category data
+    
+    for cat in lookups.categories.values():
+        # Add each category's details to the list
+        categories_list.append({
+            "id": f"C{str(cat.category_id).zfill(3)}",  # Custom category ID with leading zeros
+            "category_id": cat.category_id,  # Database category ID
+            "name": cat.category_name,  # Category name (send as 'name' to frontend)
+            "description": cat.description or ""  # Description or empty
+        })
+    
+    return categories_list
+
+
 # Create a new category in the database
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["POST"])  # Only allow POST requests
@@ -292,6 +457,7 @@ def delete_category(request, category_id):
     try:
         category = Category.objects.get(category_id=category_id)
         category.delete()
+        record_deletion('categories', category_id)
         return JsonResponse({"success": True, "message": "Category deleted successfully"})
     except ObjectDoesNotExist:
         return JsonResponse({"error": "Category not found"}, status=404)
@@ -304,27 +470,41 @@ def delete_category(request, category_id):
 def get_suppliers(request):
     """Get all suppliers"""
     try:
-        suppliers = Supplier.objects.all()  # Query all suppliers from the database
-        suppliers_list = []  # List to store supplier data
-        
-        for sup in suppliers:
-            # Add each supplier's details to the list
-            suppliers_list.append({
-                "id": f"S{str(sup.supplier_id).zfill(3)}",  # Custom supplier ID with leading zeros
-                "supplier_id": sup.supplier_id,  # Database supplier ID
-                "name": sup.supplier_name,  # Supplier name
-                "email": getattr(sup, 'email', '') or "",  # Email or empty string
-                "phone": sup.phone or "",  # Phone or empty string
-                "address": sup.address or "",  # Address or empty string
-                "createdAt": format_datetime_12hr(getattr(sup, 'created_at', None)),  # Created date
-                "updatedAt": format_datetime_12hr(getattr(sup, 'updated_at', None))  # Updated date
-            })
-        
-        return JsonResponse({"suppliers": suppliers_list})  # Return all suppliers as JSON
+        since = parse_since(request)  # Optional delta-sync timestamp
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid since parameter: {str(e)}"}, status=400)
+    try:
+        sync_started = timezone.now()
+        suppliers_list = supplier_rows(Lookups(), since)
+        return JsonResponse({"suppliers": suppliers_list, **sync_fields('suppliers', since, sync_started)})  # Return all suppliers as JSON
     except Exception as e:
         # If any error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=500)
 
+
+# Helper function to build the supplier list, optionally only rows changed since a sync
+def supplier_rows(lookups, since=None):
+    if since is None:
+        suppliers = lookups.suppliers.values()  # All suppliers
+    else:
+        suppliers = Supplier.objects.filter(updated_at__gte=since)  # Only rows changed since last sync
+    suppliers_list = []  # List to store supplier data
+    
+    for sup in suppliers:
+        # Add each supplier's details to the list
+        suppliers_list.append({
+            "id": f"S{str(sup.supplier_id).zfill(3)}",  # Custom supplier ID with leading zeros
+            "supplier_id": sup.supplier_id,  # Database supplier ID
+            "name": sup.supplier_name,  # Supplier name
+            "email": getattr(sup, 'email', '') or "",  # Email or empty string
+            "phone": sup.phone or "",  # Phone or empty string
+            "address": sup.address or "",  # Address or empty string
+            "createdAt": format_datetime_12hr(getattr(sup, 'created_at', None)),  # Created date
+            "updatedAt": format_datetime_12hr(getattr(sup, 'updated_at', None))  # Updated date
+        })
+    
+    return suppliers_list
+
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["POST"])  # Only allow POST requests
 def create_supplier(request):
@@ -409,6 +589,7 @@ def delete_supplier(request, supplier_id):
     try:
         supplier = Supplier.objects.get(supplier_id=supplier_id)  # Find the supplier by its ID
         supplier.delete()  # Delete the supplier from the database
+        record_deletion('suppliers', supplier_id)  # Tombstone for delta-sync clients
         # Return a success message
         return JsonResponse({"success": True, "message": "Supplier deleted successfully"})
     except ObjectDoesNotExist:
@@ -424,25 +605,39 @@ def delete_supplier(request, supplier_id):
 def get_warehouses(request):
     """Get all warehouses"""
     try:
-        warehouses = Warehouse.objects.all()  # Query all warehouses from the database
-        warehouses_list = []  # List to store warehouse data
-        
-        for wh in warehouses:
-            # Add each warehouse's details to the list
-            warehouses_list.append({
-                "id": f"W{str(wh.warehouse_id).zfill(3)}",  # Custom warehouse ID with leading zeros
-                "warehouse_id": wh.warehouse_id,  # Database warehouse ID
-                "name": wh.warehouse_name,  # Warehouse name
-                "location": wh.location or "",  # Location or empty string
-                "createdAt": format_datetime_12hr(wh.created_at),  # Created date
-                "updatedAt": format_datetime_12hr(wh.updated_at)  # Updated date
-            })
-        
-        return JsonResponse({"warehouses": warehouses_list})  # Return all warehouses as JSON
+        since = parse_since(request)  # Optional delta-sync timestamp
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid since parameter: {str(e)}"}, status=400)
+    try:
+        sync_started = timezone.now()
+        warehouses_list = warehouse_rows(Lookups(), since)
+        return JsonResponse({"warehouses": warehouses_list, **sync_fields('warehouses', since, sync_started)})  # Return all warehouses as JSON
     except Exception as e:
         # If any error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=500)
 
+
+# Helper function to build the warehouse list, optionally only rows changed since a sync
+def warehouse_rows(lookups, since=None):
+    if since is None:
+        warehouses = lookups.warehouses.values()  # All warehouses
+    else:
+        warehouses = Warehouse.objects.filter(updated_at__gte=since)  # Only rows changed since last sync
+    warehouses_list = []  # List to store warehouse data
+    
+    for wh in warehouses:
+        # Add each warehouse's details to the list
+        warehouses_list.append({
+            "id": f"W{str(wh.warehouse_id).zfill(3)}",  # Custom warehouse ID with leading zeros
+            "warehouse_id": wh.warehouse_id,  # Database warehouse ID
+            "name": wh.warehouse_name,  # Warehouse name
+            "location": wh.location or "",  # Location or empty string
+            "createdAt": format_datetime_12hr(wh.created_at),  # Created date
+            "updatedAt": format_datetime_12hr(wh.updated_at)  # Updated date
+        })
+    
+    return warehouses_list
+
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["POST"])  # Only allow POST requests
 def create_warehouse(request):
@@ -510,37 +705,68 @@ def update_warehouse(request, warehouse_id):
 def delete_warehouse(request, warehouse_id):
     """Delete a warehouse"""
     try:
-        warehouse = Warehouse.objects.get(warehouse_id=warehouse_id)  # Find the warehouse by its ID
-        warehouse.delete()  # Delete the warehouse from the database
+        # Delete the warehouse and its inventory rows in one transaction
+        deleted = delete_warehouses([warehouse_id])
+        if not deleted['warehouses']:
+            # If the warehouse does not exist, return a 404 error
+            return JsonResponse({"error": "Warehouse not found"}, status=404)
         # Return a success message
-        return JsonResponse({"success": True, "message": "Warehouse deleted successfully"})
-    except ObjectDoesNotExist:
-        # If the warehouse does not exist, return a 404 error
-        return JsonResponse({"error": "Warehouse not found"}, status=404)
+        return JsonResponse({"success": True, "message": "Warehouse deleted successfully", "deleted": deleted_counts(deleted)})
     except Exception as e:
         # If any other error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=400)
 
+# Delete several warehouses (and their inventory) at once
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def bulk_delete_warehouses(request):
+    """Delete the warehouses listed in {"ids": [...]}"""
+    try:
+        deleted = delete_warehouses(parse_bulk_ids(request, 'W'))
+        return JsonResponse({"success": True, "message": f"{len(deleted['warehouses'])} warehouses deleted", "deleted": deleted_counts(deleted)})
+    except Exception as e:
+        # If any error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=400)
+
 
 # ==================== INVENTORY VIEWS ====================
 @require_http_methods(["GET"])
+@cached_response('inventory', 'products', 'categories', 'suppliers', 'warehouses')  # Served from cache until any source table changes
 def get_inventory(request):
     """Get all inventory items with related product, category, supplier, and warehouse data"""
-    inventories = Inventory.objects.all()
-    
-    # Get all related data in one query each for efficiency
-    product_ids = [inv.product_id for inv in inventories]
-    warehouse_ids = [inv.warehouse_id for inv in inventories]
-    
-    products = {p.product_id: p for p in Product.objects.filter(product_id__in=product_ids)}
-    warehouses = {w.warehouse_id: w for w in Warehouse.objects.filter(warehouse_id__in=warehouse_ids)}
-    
-    # Get category and supplier IDs from products
-    category_ids = [p.category_id for p in products.values() if p.category_id]
-    supplier_ids = [p.supplier_id for p in products.values() if p.supplier_id]
+    try:
+        since = parse_since(request)  # Optional delta-sync timestamp
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid since parameter: {str(e)}'}, status=400)
+    sync_started = timezone.now()
+    data = inventory_rows(Lookups(), since)
+    return JsonResponse({'inventories': data, **sync_fields('inventory', since, sync_started)}, safe=False)
+
+
+# Helper function to build the inventory list with product, category, supplier and
+# warehouse details, optionally only rows changed since a sync
+def inventory_rows(lookups, since=None):
+    def shard_rows(queryset):
+        if since is not None:
+            queryset = queryset.filter(last_updated__gte=since)  # Only rows changed since last sync
+        return queryset
+
+    inventories = fan_out(shard_rows)  # Query every warehouse shard and merge the rows
+    if sharding_enabled():
+        inventories.sort(key=lambda inv: inv.inventory_id)
     
-    categories = {c.category_id: c for c in Category.objects.filter(category_id__in=category_ids)}
-    suppliers = {s.supplier_id: s for s in Supplier.objects.filter(supplier_id__in=supplier_ids)}
+    if since is None:
+        # Related data comes from the shared maps: one query per table, however many lists use it
+        products = lookups.products
+        warehouses = lookups.warehouses
+        categories = lookups.categories
+        suppliers = lookups.suppliers
+    else:
+        # A delta references few rows: fetch just those instead of whole tables
+        products = lookups.rows_by_id(Product, {inv.product_id for inv in inventories})
+        warehouses = lookups.rows_by_id(Warehouse, {inv.warehouse_id for inv in inventories})
+        categories = lookups.rows_by_id(Category, {p.category_id for p in products.values() if p.category_id})
+        suppliers = lookups.rows_by_id(Supplier, {p.supplier_id for p in products.values() if p.supplier_id})
     
     data = []
     for inv in inventories:
@@ -568,12 +794,14 @@ def get_inventory(request):
             'unit_price': str(product.unit_price),
             'cost_price': str(product.cost_price) if product.cost_price else '0',
             'sku': product.sku,
+            'version': inv.version,  # Send back in If-Match when updating
         })
     
-    return JsonResponse({'inventories': data}, safe=False)
+    return data
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@idempotent  # Retries with the same Idempotency-Key replay the first response
 def create_inventory(request):
     """Create new inventory item"""
     data = json.loads(request.body)
@@ -594,33 +822,36 @@ def create_inventory(request):
         else:
             warehouse_id_value = int(warehouse_id_value)
         
-        inventory = Inventory.objects.create(
+        inventory = inventory_for_warehouse(warehouse_id_value).create(
             product_id=product_id_value,
             warehouse_id=warehouse_id_value,
             quantity=data.get('quantity', 0)
         )
+        publish_inventory_change(inventory)  # Notify live clients
         
         return JsonResponse({
             'success': True,
             'status': 'success',
-            'inventory_id': inventory.inventory_id
+            'inventory_id': inventory.inventory_id,
+            'version': inventory.version,
         })
     except Exception as e:
         return JsonResponse({'success': False, 'status': 'error', 'message': str(e)}, status=400)
 
 @csrf_exempt
 @require_http_methods(["PUT"])
+@idempotent  # Retries with the same Idempotency-Key replay the first response
 def update_inventory(request, inventory_id):
     """Update inventory item"""
     try:
         data = json.loads(request.body)
-        print(f"Update inventory {inventory_id} with data: {data}")  # Debug logging
-        
-        inventory = Inventory.objects.get(pk=inventory_id)
+        inventory = find_inventory(inventory_id)
+        version = expected_version(request, data)  # Version the client edited, if it sent one
+        changes = {}  # Only the fields sent in the request are written
         
         # Update quantity if provided
         if 'quantity' in data:
-            inventory.quantity = int(data['quantity'])
+            changes['quantity'] = int(data['quantity'])
         
         # Update warehouse_id if provided (handle different formats)
         if 'warehouse_id' in data or 'warehouseId' in data:
@@ -642,20 +873,54 @@ def update_inventory(request, inventory_id):
             # Verify warehouse exists
             try:
                 Warehouse.objects.get(warehouse_id=warehouse_id_value)
-                inventory.warehouse_id = warehouse_id_value
+                changes['warehouse_id'] = warehouse_id_value
             except Warehouse.DoesNotExist:
                 return JsonResponse({'success': False, 'status': 'error', 'message': f'Warehouse with ID {warehouse_id_value} does not exist'}, status=400)
         
-        inventory.save()
-        print(f"Successfully updated inventory {inventory_id}")  # Debug logging
-        
-        return JsonResponse({'success': True, 'status': 'success'})
+        target_shard = shard_for_warehouse(changes.get('warehouse_id', inventory.warehouse_id))
+        # Hot-SKU reservation holds live on 'default'; lock them with the row so the
+        # edit cannot take the quantity below the units workers are still selling
+        held_aliases = ['default'] if reservations_enabled() else []
+        if target_shard != inventory._state.db:
+            # The new warehouse lives on another shard: move the row, keeping its ID
+            source_shard = inventory._state.db
+            with atomic_shards([source_shard, target_shard, *held_aliases]):
+                inventory = find_inventory(inventory_id, for_update=True)
+                if version is not None and version != inventory.version:
+                    raise VersionConflict(inventory.version)
+                ensure_holds_covered(inventory, changes.get('quantity'), changes['warehouse_id'])
+                Inventory.objects.using(source_shard).filter(pk=inventory.inventory_id).delete()
+                for name, value in changes.items():
+                    setattr(inventory, name, value)
+                inventory.version += 1
+                inventory._state.db = None
+                inventory.save(using=target_shard, force_insert=True)
+        else:
+            with atomic_shards([inventory._state.db, *held_aliases]):
+                if held_aliases:
+                    ensure_holds_covered(find_inventory(inventory_id, for_update=True),
+                                         changes.get('quantity'), changes.get('warehouse_id'))
+                changed = save_changes(inventory, changes, version)
+            if not changed:
+                return JsonResponse({'success': True, 'status': 'success', 'version': inventory.version})  # Nothing changed
+        publish_inventory_change(inventory)  # Notify live clients
+        logger.info("Updated inventory %s fields %s", inventory_id, sorted(changes))
+        
+        response = JsonResponse({'success': True, 'status': 'success', 'version': inventory.version})
+        response['ETag'] = etag(inventory)
+        return response
     except Inventory.DoesNotExist:
         return JsonResponse({'success': False, 'status': 'error', 'message': 'Inventory not found'}, status=404)
+    except VersionConflict as e:
+        # Someone else updated the row first
+        return JsonResponse({'success': False, 'status': 'conflict', 'message': str(e), 'currentVersion': e.current_version}, status=409)
+    except InsufficientStockError as e:
+        # The change would undercut units reserved for hot-SKU sales
+        return JsonResponse({'success': False, 'status': 'conflict', 'message': str(e)}, status=409)
     except ValueError as e:
         return JsonResponse({'success': False, 'status': 'error', 'message': f'Invalid data format: {str(e)}'}, status=400)
     except Exception as e:
-        print(f"Error updating inventory: {str(e)}")  # Debug logging
+        logger.exception("Updating inventory %s failed", inventory_id)
         return JsonResponse({'success': False, 'status': 'error', 'message': str(e)}, status=400)
 
 @csrf_exempt
@@ -663,14 +928,165 @@ def update_inventory(request, inventory_id):
 def delete_inventory(request, inventory_id):
     """Delete inventory item"""
     try:
-        inventory = Inventory.objects.get(pk=inventory_id)
-        inventory.delete()
+        inventory = find_inventory(inventory_id)
+        alias = inventory._state.db
+        with atomic_shards([alias, 'default']):
+            inventory.delete()
+            drop_reservations([inventory_id])  # Holds on a deleted row can never be sold from
+            record_deletion('inventory', inventory_id)
+            publish_on_commit('inventory.deleted', {'inventory_id': inventory_id}, using=alias)
         return JsonResponse({'success': True, 'status': 'success', 'message': 'Inventory deleted successfully'})
     except Inventory.DoesNotExist:
         return JsonResponse({'success': False, 'status': 'error', 'message': 'Inventory not found'}, status=404)
     except Exception as e:
         return JsonResponse({'success': False, 'status': 'error', 'message': str(e)}, status=400)
 
+def _transfer_stock(transfers):
+    """Move stock between warehouses in one transaction per shard.
+
+    Every (product_id, warehouse_id) row touched by the batch is locked up
+    front in a fixed order so that two concurrent batches can never wait on
+    each other's locks in opposite order. The decrement itself is a
+    conditional UPDATE so the quantity can never go negative.
+    """
+    pairs = set()
+    for t in transfers:
+        pairs.add((t['product_id'], t['from_warehouse_id']))
+        pairs.add((t['product_id'], t['to_warehouse_id']))
+    # Group the rows by the shard database that holds their warehouse
+    shard_pairs = {}
+    for product_id, warehouse_id in pairs:
+        shard_pairs.setdefault(shard_for_warehouse(warehouse_id), set()).add((product_id, warehouse_id))
+
+    results = []
+    # Hot-SKU reservation holds live on 'default'; lock them in a transaction there too
+    with atomic_shards([*shard_pairs, 'default'] if reservations_enabled() else shard_pairs):
+        rows = {}
+        locked_rows = []
+        # Lock all involved rows in (shard, product_id, warehouse_id, inventory_id) order
+        for alias in sorted(shard_pairs):
+            shard_product_ids = sorted({p for p, _ in shard_pairs[alias]})
+            # QuerySet.update() sends no signals, so invalidate explicitly
+            bump_versions('inventory', using=alias, keys=shard_product_ids)
+            shard_warehouse_ids = sorted({w for _, w in shard_pairs[alias]})
+            locked = (Inventory.objects.using(alias).select_for_update()
+                      .filter(product_id__in=shard_product_ids, warehouse_id__in=shard_warehouse_ids)
+                      .order_by('product_id', 'warehouse_id', 'inventory_id'))
+            for inv in locked:
+                rows.setdefault((inv.product_id, inv.warehouse_id), inv.inventory_id)
+                locked_rows.append(inv)
+        held = held_quantities(locked_rows)  # Units reserved for hot-SKU sales cannot be moved
+
+        for t in transfers:
+            source_key = (t['product_id'], t['from_warehouse_id'])
+            dest_key = (t['product_id'], t['to_warehouse_id'])
+            source_rows = inventory_for_warehouse(t['from_warehouse_id'])
+            dest_rows = inventory_for_warehouse(t['to_warehouse_id'])
+            quantity = t['quantity']
+
+            source_pk = rows.get(source_key)
+            updated = 0
+            if source_pk is not None:
+                updated = source_rows.filter(
+                    pk=source_pk, quantity__gte=quantity + held.get(source_pk, 0)
+                ).update(quantity=F('quantity') - quantity, version=F('version') + 1, last_updated=timezone.now())
+            if not updated:
+                available = source_rows.filter(pk=source_pk).values_list('quantity', flat=True).first() if source_pk else 0
+                available = (available or 0) - held.get(source_pk, 0)
+                raise InsufficientStockError(
+                    f"Insufficient inventory for product ID {t['product_id']} in warehouse ID "
+                    f"{t['from_warehouse_id']}. Available: {available or 0}, Requested: {quantity}"
+                )
+
+            dest_pk = rows.get(dest_key)
+            dest_alias = shard_for_warehouse(t['to_warehouse_id'])
+            if dest_pk is None:
+                try:
+                    # Savepoint so a lost insert race does not abort the whole batch
+                    with transaction.atomic(using=dest_alias):
+                        dest = dest_rows.create(
+                            product_id=t['product_id'],
+                            warehouse_id=t['to_warehouse_id'],
+                            quantity=quantity,
+                        )
+                    dest_pk = dest.inventory_id
+                except IntegrityError:
+                    dest_pk = (dest_rows.select_for_update()
+                               .filter(product_id=t['product_id'], warehouse_id=t['to_warehouse_id'])
+                               .order_by('inventory_id')
+                               .values_list('inventory_id', flat=True).first())
+                    dest_rows.filter(pk=dest_pk).update(quantity=F('quantity') + quantity, version=F('version') + 1,
+                                                        last_updated=timezone.now())
+                rows[dest_key] = dest_pk
+            else:
+                dest_rows.filter(pk=dest_pk).update(quantity=F('quantity') + quantity, version=F('version') + 1,
+                                                    last_updated=timezone.now())
+
+            source_quantity = source_rows.filter(pk=source_pk).values_list('quantity', flat=True).first()
+            dest_quantity = dest_rows.filter(pk=dest_pk).values_list('quantity', flat=True).first()
+            for pk, warehouse_id, new_quantity in ((source_pk, t['from_warehouse_id'], source_quantity),
+                                                   (dest_pk, t['to_warehouse_id'], dest_quantity)):
+                publish_on_commit('inventory.changed', {
+                    'inventory_id': pk,
+                    'product_id': t['product_id'],
+                    'warehouse_id': warehouse_id,
+                    'quantity': new_quantity,
+                }, using=shard_for_warehouse(warehouse_id))
+            results.append({
+                'productId': t['product_id'],
+                'fromWarehouseId': t['from_warehouse_id'],
+                'toWarehouseId': t['to_warehouse_id'],
+                'quantity': quantity,
+                'sourceInventoryId': source_pk,
+                'sourceQuantity': source_quantity,
+                'destinationInventoryId': dest_pk,
+                'destinationQuantity': dest_quantity,
+            })
+    return results
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent  # Retries with the same Idempotency-Key replay the first response
+def transfer_inventory(request):
+    """Transfer stock between warehouses (single transfer or a batch)"""
+    try:
+        data = json.loads(request.body)
+        # Accept either {"transfers": [...]} or a single transfer object
+        raw_transfers = data.get('transfers') if isinstance(data, dict) and 'transfers' in data else [data]
+        if not isinstance(raw_transfers, list) or not raw_transfers:
+            return JsonResponse({'success': False, 'status': 'error', 'message': 'No transfers provided'}, status=400)
+
+        transfers = []
+        for raw in raw_transfers:
+            transfer = {
+                'product_id': parse_prefixed_id(raw.get('product_id') or raw.get('productId'), 'P'),
+                'from_warehouse_id': parse_prefixed_id(raw.get('from_warehouse_id') or raw.get('fromWarehouseId'), 'W'),
+                'to_warehouse_id': parse_prefixed_id(raw.get('to_warehouse_id') or raw.get('toWarehouseId'), 'W'),
+                'quantity': int(raw.get('quantity', 0)),
+            }
+            if transfer['quantity'] <= 0:
+                return JsonResponse({'success': False, 'status': 'error', 'message': 'Transfer quantity must be greater than zero'}, status=400)
+            if transfer['from_warehouse_id'] == transfer['to_warehouse_id']:
+                return JsonResponse({'success': False, 'status': 'error', 'message': 'Source and destination warehouse must be different'}, status=400)
+            transfers.append(transfer)
+
+        # Verify every destination warehouse exists before touching stock
+        warehouse_ids = {t['to_warehouse_id'] for t in transfers}
+        existing = set(Warehouse.objects.filter(warehouse_id__in=warehouse_ids).values_list('warehouse_id', flat=True))
+        missing = sorted(warehouse_ids - existing)
+        if missing:
+            return JsonResponse({'success': False, 'status': 'error', 'message': f'Warehouse with ID {missing[0]} does not exist'}, status=400)
+
+        results = _transfer_stock(transfers)
+        return JsonResponse({'success': True, 'status': 'success', 'transfers': results})
+    except InsufficientStockError as e:
+        return JsonResponse({'success': False, 'status': 'error', 'message': str(e)}, status=400)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'success': False, 'status': 'error', 'message': f'Invalid data format: {str(e)}'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'status': 'error', 'message': str(e)}, status=400)
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def update_product_category(request, product_id):
@@ -681,9 +1097,8 @@ def update_product_category(request, product_id):
         product = Product.objects.get(pk=product_id)
         # Verify category exists
         Category.objects.get(pk=data['category_id'])
-        # Update category_id as integer
-        product.category_id = data['category_id']
-        product.save()
+        # Update only category_id (and bump the version)
+        save_changes(product, {'category_id': int(data['category_id'])})
         
         return JsonResponse({'status': 'success'})
     except (Product.DoesNotExist, Category.DoesNotExist) as e:
@@ -692,33 +1107,100 @@ def update_product_category(request, product_id):
 
 
 # ==================== ORDER VIEWS ====================
+ORDER_PAGE_SIZE = 50  # Orders per page in the list-with-items mode
+ORDER_PAGE_MAX_SIZE = 200
+
+
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["GET"])  # Only allow GET requests
 def get_orders(request):
     """Get all orders from the Database"""
     try:
-        orders = Order.objects.all()  # Query all orders from the database
-        orders_list = []  # List to store order data
-        
-        for order in orders:
-            # Add each order's details to the list
-            orders_list.append({
-                "id": f"O{str(order.order_id).zfill(3)}",  # Custom order ID with leading zeros
-                "order_id": order.order_id,  # Database order ID
-                "orderDate": format_datetime_12hr(order.order_date),  # Order date formatted
-                "supplierId": str(order.supplier_id) if order.supplier_id else "",  # Supplier ID as string
-                "customerName": order.customer_name or "",  # Customer name
-                "status": order.status or "Pending",  # Status or default to Pending
-                "totalAmount": f"₱{float(order.total_amount):,.2f}" if order.total_amount else "₱0.00",  # Total amount formatted
-            })
-        
-        return JsonResponse({"orders": orders_list})  # Return all orders as JSON
+        since = parse_since(request)  # Optional delta-sync timestamp
+        start, end = parse_date_range(request)  # Optional order-date filter
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid since, start or end parameter: {str(e)}"}, status=400)
+    try:
+        sync_started = timezone.now()
+        if request.GET.get('include') == 'items':
+            return orders_page_response(request, since, start, end, sync_started)
+        orders_list = order_rows(since, start, end)
+        return JsonResponse({"orders": orders_list, **sync_fields('orders', since, sync_started)})  # Return all orders as JSON
+    except Exception as e:
+        # If any error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# Helper function for GET /api/orders/?include=items: one page of orders, newest
+# first, with nested line items. ?page= (from 1) and ?pageSize= (up to ORDER_PAGE_MAX_SIZE).
+def orders_page_response(request, since, start, end, sync_started):
+    page = max(1, int(request.GET.get('page', 1)))
+    page_size = min(max(1, int(request.GET.get('pageSize', ORDER_PAGE_SIZE))), ORDER_PAGE_MAX_SIZE)
+    orders, total = order_page(start, end, page, page_size, since)  # Only orders changed since last sync
+    return JsonResponse({
+        "orders": orders_with_items(orders),  # Orders with their items nested
+        "page": page,
+        "pageSize": page_size,
+        "total": total,  # Orders across all pages
+        "totalPages": (total + page_size - 1) // page_size,
+        **sync_fields('orders', since, sync_started),
+    })
+
+
+# Helper function to build the order list for an optional date range and sync timestamp
+def order_rows(since=None, start=None, end=None):
+    # Hot orders only, plus archived ones when start reaches past the archive horizon;
+    # with since, only orders changed since last sync (status, total or new items)
+    orders = orders_between(start, end, since)
+    return [order_document(order) for order in orders]  # Each order's details
+
+
+# Helper function to serialize one order (hot or archived)
+def order_document(order):
+    return {
+        "id": f"O{str(order.order_id).zfill(3)}",  # Custom order ID with leading zeros
+        "order_id": order.order_id,  # Database order ID
+        "orderDate": format_datetime_12hr(order.order_date),  # Order date formatted
+        "supplierId": str(order.supplier_id) if order.supplier_id else "",  # Supplier ID as string
+        "customerName": order.customer_name or "",  # Customer name
+        "status": order.status or "Pending",  # Status or default to Pending
+        "totalAmount": f"₱{float(order.total_amount):,.2f}" if order.total_amount else "₱0.00",  # Total amount formatted
+    }
+
+
+# Helper function to serialize orders with their line items nested under "items".
+# Always three queries: the orders (already loaded by the caller), their items
+# with order_id IN (...) and the items' product names with product_id IN (...).
+def orders_with_items(orders):
+    items = items_for_orders(orders)
+    product_ids = {item.product_id for order_items in items.values() for item in order_items}
+    product_names = dict(Product.objects.filter(product_id__in=product_ids).values_list('product_id', 'product_name'))
+    orders_list = []
+    for order in orders:
+        order_items = []
+        for item in items.get(order.order_id, []):
+            item_data = order_item_document(item)
+            item_data["productName"] = product_names.get(item.product_id, "Unknown Product")  # Product name
+            order_items.append(item_data)
+        orders_list.append({**order_document(order), "items": order_items})
+    return orders_list
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_order(request, order_id):
+    """Get one order with its line items, product names and subtotals"""
+    try:
+        order = find_order(order_id)  # Hot table first, then the archive
+        return JsonResponse({"order": orders_with_items([order])[0]})
+    except Order.DoesNotExist:
+        return JsonResponse({"error": "Order not found"}, status=404)
     except Exception as e:
         # If any error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=500)
 
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["POST"])  # Only allow POST requests
+@idempotent  # Retries with the same Idempotency-Key replay the first response
 def create_order(request):
     """Create a new order"""
     try:
@@ -735,18 +1217,21 @@ def create_order(request):
         )
         order.save()  # Save the order to the database
         
+        order_data = {
+            "id": f"O{str(order.order_id).zfill(3)}",  # Custom order ID with leading zeros
+            "order_id": order.order_id,  # Database order ID
+            "orderDate": format_datetime_12hr(order.order_date),  # Order date formatted
+            "supplierId": str(order.supplier_id) if order.supplier_id else "",  # Supplier ID as string
+            "customerName": order.customer_name or "",  # Customer name
+            "status": order.status,  # Status
+            "totalAmount": f"₱{float(order.total_amount):,.2f}" if order.total_amount else "₱0.00"  # Total amount formatted
+        }
+        publish_on_commit('order.created', order_data)  # Notify live clients
+        
         # Return a JSON response with the new order's details
         return JsonResponse({
             "success": True,  # Indicate success
-            "order": {
-                "id": f"O{str(order.order_id).zfill(3)}",  # Custom order ID with leading zeros
-                "order_id": order.order_id,  # Database order ID
-                "orderDate": format_datetime_12hr(order.order_date),  # Order date formatted
-                "supplierId": str(order.supplier_id) if order.supplier_id else "",  # Supplier ID as string
-                "customerName": order.customer_name or "",  # Customer name
-                "status": order.status,  # Status
-                "totalAmount": f"₱{float(order.total_amount):,.2f}" if order.total_amount else "₱0.00"  # Total amount formatted
-            }
+            "order": order_data
         }, status=201)
     except Exception as e:
         # If any error occurs, return an error message
@@ -762,9 +1247,16 @@ def update_order(request, order_id):
         
         order.supplier_id = int(data.get('supplierId')) if data.get('supplierId') else order.supplier_id  # Update supplier ID if provided
         order.status = data.get('status', order.status)  # Update status if provided
-        order.total_amount = float(data.get('totalAmount', order.total_amount).replace('₱', '').replace(',', ''))  # Update total amount
+        # Once an order has items its total is computed by the server, so only
+        # accept a client-supplied total for orders without items
+        has_items = OrderItem.objects.filter(order_id=order_id).exists()
+        if not has_items and 'totalAmount' in data:
+            order.total_amount = float(str(data['totalAmount']).replace('₱', '').replace(',', ''))  # Update total amount
         
         order.save()  # Save the updated order to the database
+        if has_items:
+            refresh_order_totals([order.order_id])
+            order.refresh_from_db(fields=['total_amount'])
         
         # Return a JSON response with the updated order's details
         return JsonResponse({
@@ -790,44 +1282,71 @@ def update_order(request, order_id):
 def delete_order(request, order_id):
     """Delete an order"""
     try:
-        order = Order.objects.get(order_id=order_id)  # Find the order by its ID
-        order.delete()  # Delete the order from the database
+        # Delete the order with its items and allocations in one transaction
+        deleted = delete_orders([order_id])
+        if not deleted['orders']:
+            # If the order does not exist, return a 404 error
+            return JsonResponse({"error": "Order not found"}, status=404)
         # Return a success message
-        return JsonResponse({"success": True, "message": "Order deleted successfully"})
-    except ObjectDoesNotExist:
-        # If the order does not exist, return a 404 error
-        return JsonResponse({"error": "Order not found"}, status=404)
+        return JsonResponse({"success": True, "message": "Order deleted successfully", "deleted": deleted_counts(deleted)})
     except Exception as e:
         # If any other error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=400)
 
+# Delete several orders (and their items) at once
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def bulk_delete_orders(request):
+    """Delete the orders listed in {"ids": [...]}"""
+    try:
+        deleted = delete_orders(parse_bulk_ids(request, 'O'))
+        return JsonResponse({"success": True, "message": f"{len(deleted['orders'])} orders deleted", "deleted": deleted_counts(deleted)})
+    except Exception as e:
+        # If any error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=400)
+
 # ==================== ORDER ITEM VIEWS ====================
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["GET"])  # Only allow GET requests
 def get_order_items(request):
     """Get all order items"""
     try:
-        order_items = OrderItem.objects.all()  # Query all order items from the database
-        order_items_list = []  # List to store order item data
-        
-        for item in order_items:
-            # Add each order item's details to the list
-            order_items_list.append({
-                "id": f"OI{str(item.order_item_id).zfill(3)}",  # Custom order item ID with leading zeros
-                "order_item_id": item.order_item_id,  # Database order item ID
-                "orderId": str(item.order_id),  # Order ID as string
-                "productId": str(item.product_id),  # Product ID as string
-                "quantity": item.quantity,  # Quantity
-                "unitPrice": f"₱{float(item.unit_price):,.2f}",  # Unit price formatted
-            })
-        
-        return JsonResponse({"orderItems": order_items_list})  # Return all order items as JSON
+        since = parse_since(request)  # Optional delta-sync timestamp
+        start, end = parse_date_range(request)  # Optional order-date filter
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid since, start or end parameter: {str(e)}"}, status=400)
+    try:
+        sync_started = timezone.now()
+        order_items_list = order_item_rows(since, start, end)
+        return JsonResponse({"orderItems": order_items_list, **sync_fields('order_items', since, sync_started)})  # Return all order items as JSON
     except Exception as e:
         # If any error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=500)
 
+
+# Helper function to build the order item list for an optional date range and sync timestamp
+def order_item_rows(since=None, start=None, end=None):
+    # Hot items only, plus archived ones when start reaches past the archive horizon;
+    # with since, only items added or changed since last sync, whatever their order's date
+    order_items = items_between(start, end, since)
+    return [order_item_document(item) for item in order_items]  # Each order item's details
+
+
+# Helper function to serialize one order item (hot or archived)
+def order_item_document(item):
+    return {
+        "id": f"OI{str(item.order_item_id).zfill(3)}",  # Custom order item ID with leading zeros
+        "order_item_id": item.order_item_id,  # Database order item ID
+        "orderId": str(item.order_id),  # Order ID as string
+        "productId": str(item.product_id),  # Product ID as string
+        "quantity": item.quantity,  # Quantity
+        "unitPrice": f"₱{float(item.unit_price):,.2f}",  # Unit price formatted
+        "subtotal": f"₱{float(item.subtotal):,.2f}" if item.subtotal is not None else f"₱{float(item.quantity * item.unit_price):,.2f}",  # Line total formatted
+    }
+
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["POST"])  # Only allow POST requests
+@idempotent  # Retries with the same Idempotency-Key replay the first response
 def create_order_item(request):
     """Create a new order item"""
     try:
@@ -837,22 +1356,12 @@ def create_order_item(request):
         quantity = int(data.get('quantity', 0))  # Convert quantity to int
         product_id = int(data.get('productId'))  # Get product ID
         
-        # Update inventory - reduce quantity
-        inventory_records = Inventory.objects.filter(product_id=product_id)
-        if inventory_records.exists():
-            # Update the first matching inventory record
-            inventory = inventory_records.first()
-            if inventory.quantity >= quantity:
-                inventory.quantity -= quantity
-                inventory.save()
-            else:
-                return JsonResponse({
-                    "error": f"Insufficient inventory. Available: {inventory.quantity}, Requested: {quantity}"
-                }, status=400)
-        else:
-            return JsonResponse({
-                "error": f"No inventory record found for product ID {product_id}"
-            }, status=400)
+        # Optional allocation settings: policy and preferred warehouse
+        policy = data.get('allocationPolicy')  # 'largest', 'fewest_splits' or 'preferred'
+        preferred = data.get('warehouseId') or data.get('warehouse_id')
+        preferred_warehouse_id = parse_prefixed_id(preferred, 'W') if preferred else None
+        if preferred_warehouse_id is not None and not policy:
+            policy = 'preferred'
         
         # Create a new OrderItem object with the provided data
         order_item = OrderItem(
@@ -860,21 +1369,56 @@ def create_order_item(request):
             product_id=product_id,  # Set product ID
             quantity=quantity,  # Set quantity
             unit_price=unit_price,  # Set unit price
+            subtotal=line_subtotal(quantity, unit_price),  # Line total computed by the server
         )
-        order_item.save()  # Save the order item to the database
+        with transaction.atomic():
+            # Take the quantity from one or more warehouses: a conditional decrement of every row,
+            # or for hot SKUs this worker's reserved budget (see reservations.py)
+            with allocated_stock(product_id, quantity, policy, preferred_warehouse_id,
+                                 sale=(order_item.order_id, unit_price)) as plan:
+                order_item.save()  # Save the order item to the database
+                OrderItemAllocation.objects.bulk_create([
+                    OrderItemAllocation(
+                        order_item_id=order_item.order_item_id,
+                        order_id=order_item.order_id,
+                        product_id=product_id,
+                        inventory_id=inventory.inventory_id,
+                        warehouse_id=inventory.warehouse_id,
+                        quantity=taken,
+                    ) for inventory, taken in plan
+                ])
+                refresh_order_totals([order_item.order_id])  # Keep the order's total_amount in step
+                # Add this sale to the daily rollups under the warehouses it shipped from; hot-SKU
+                # sales are booked by the reservation flush so they do not queue on the day's rows
+                if not rollups_deferred(product_id):
+                    split = {}
+                    for inventory, taken in plan:
+                        split[inventory.warehouse_id] = split.get(inventory.warehouse_id, 0) + taken
+                    apply_order_item_delta(order_item.order_id, product_id, quantity, unit_price,
+                                           warehouse_quantities=split)
+        
+        order_item_data = {
+            "id": f"OI{str(order_item.order_item_id).zfill(3)}",  # Custom order item ID with leading zeros
+            "order_item_id": order_item.order_item_id,  # Database order item ID
+            "orderId": str(order_item.order_id),  # Order ID as string
+            "productId": str(order_item.product_id),  # Product ID as string
+            "quantity": order_item.quantity,  # Quantity
+            "unitPrice": f"₱{float(order_item.unit_price):,.2f}",  # Unit price formatted
+            "subtotal": f"₱{float(order_item.subtotal):,.2f}",  # Line total formatted
+            "allocations": [  # Stock taken from each warehouse
+                {"warehouseId": inventory.warehouse_id, "inventoryId": inventory.inventory_id, "quantity": taken}
+                for inventory, taken in plan
+            ],
+        }
+        publish_on_commit('order_item.created', order_item_data)  # Notify live clients
         
         # Return a JSON response with the new order item's details
         return JsonResponse({
             "success": True,  # Indicate success
-            "orderItem": {
-                "id": f"OI{str(order_item.order_item_id).zfill(3)}",  # Custom order item ID with leading zeros
-                "order_item_id": order_item.order_item_id,  # Database order item ID
-                "orderId": str(order_item.order_id),  # Order ID as string
-                "productId": str(order_item.product_id),  # Product ID as string
-                "quantity": order_item.quantity,  # Quantity
-                "unitPrice": f"₱{float(order_item.unit_price):,.2f}",  # Unit price formatted
-            }
+            "orderItem": order_item_data
         }, status=201)
+    except InsufficientStockError as e:
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
         # If any error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=400)
@@ -886,13 +1430,23 @@ def update_order_item(request, order_item_id):
     try:
         order_item = OrderItem.objects.get(order_item_id=order_item_id)  # Find the order item by its ID
         data = json.loads(request.body)  # Parse the JSON body from the request
+        # Remember the old values so the rollups can be corrected
+        old_values = (order_item.order_id, order_item.product_id, order_item.quantity, order_item.unit_price)
+        old_split = warehouse_split_for_item(order_item_id, order_item.product_id, order_item.quantity)
         
         order_item.order_id = int(data.get('orderId', order_item.order_id))  # Update order ID if provided
         order_item.product_id = int(data.get('productId', order_item.product_id))  # Update product ID if provided
         order_item.quantity = int(data.get('quantity', order_item.quantity))  # Update quantity if provided
-        order_item.unit_price = float(data.get('unitPrice', order_item.unit_price).replace('₱', '').replace(',', ''))  # Update unit price
+        order_item.unit_price = float(str(data.get('unitPrice', order_item.unit_price)).replace('₱', '').replace(',', ''))  # Update unit price
+        order_item.subtotal = line_subtotal(order_item.quantity, order_item.unit_price)  # Recompute line total
         
-        order_item.save()  # Save the updated order item to the database
+        with transaction.atomic():
+            order_item.save()  # Save the updated order item to the database
+            refresh_order_totals([old_values[0], order_item.order_id])  # Old and new order if the item moved
+            # Move the item's contribution from its old values to its new ones
+            apply_order_item_delta(*old_values, warehouse_quantities=old_split, sign=-1)
+            apply_order_item_delta(order_item.order_id, order_item.product_id, order_item.quantity, order_item.unit_price,
+                                   warehouse_quantities=warehouse_split_for_item(order_item_id, order_item.product_id, order_item.quantity))
         
         # Return a JSON response with the updated order item's details
         return JsonResponse({
@@ -904,6 +1458,7 @@ def update_order_item(request, order_item_id):
                 "productId": str(order_item.product_id),  # Product ID as string
                 "quantity": order_item.quantity,  # Quantity
                 "unitPrice": f"₱{float(order_item.unit_price):,.2f}",  # Unit price formatted
+                "subtotal": f"₱{float(order_item.subtotal):,.2f}",  # Line total formatted
             }
         })
     except ObjectDoesNotExist:
@@ -919,7 +1474,15 @@ def delete_order_item(request, order_item_id):
     """Delete an order item"""
     try:
         order_item = OrderItem.objects.get(order_item_id=order_item_id)  # Find the order item by its ID
-        order_item.delete()  # Delete the order item from the database
+        split = warehouse_split_for_item(order_item_id, order_item.product_id, order_item.quantity)
+        with transaction.atomic():
+            order_item.delete()  # Delete the order item from the database
+            OrderItemAllocation.objects.filter(order_item_id=order_item_id).delete()
+            refresh_order_totals([order_item.order_id])  # Drop the item from the order's total
+            # Remove the item's contribution from the daily rollups
+            apply_order_item_delta(order_item.order_id, order_item.product_id, order_item.quantity, order_item.unit_price,
+                                   warehouse_quantities=split, sign=-1)
+        record_deletion('order_items', order_item_id)  # Tombstone for delta-sync clients
         # Return a success message
         return JsonResponse({"success": True, "message": "Order item deleted successfully"})
     except ObjectDoesNotExist:
@@ -929,6 +1492,546 @@ def delete_order_item(request, order_item_id):
         # If any other error occurs, return an error message
         return JsonResponse({"error": str(e)}, status=400)
 
+# ==================== BATCH VIEWS ====================
+# Lists /api/batch/ can build: resource -> (response key, table for the sync fields,
+# tables a cached batch depends on or None if the list cannot be cached, row builder).
+# Each resource returns the same document as its own list endpoint.
+BATCH_RESOURCES = {
+    'products': ('products', 'products', ('products', 'categories'),
+                 lambda lookups, since, start, end: product_rows(lookups, since)),
+    'categories': ('categories', None, ('categories',),
+                   lambda lookups, since, start, end: category_rows(lookups)),
+    'suppliers': ('suppliers', 'suppliers', ('suppliers',),
+                  lambda lookups, since, start, end: supplier_rows(lookups, since)),
+    'warehouses': ('warehouses', 'warehouses', ('warehouses',),
+                   lambda lookups, since, start, end: warehouse_rows(lookups, since)),
+    'inventory': ('inventories', 'inventory', ('inventory', 'products', 'categories', 'suppliers', 'warehouses'),
+                  lambda lookups, since, start, end: inventory_rows(lookups, since)),
+    'orders': ('orders', 'orders', None,
+               lambda lookups, since, start, end: order_rows(since, start, end)),
+    'order-items': ('orderItems', 'order_items', None,
+                    lambda lookups, since, start, end: order_item_rows(since, start, end)),
+}
+
+
+# Helper function to read the sub-requests of a batch: ?resources=products,orders with
+# since/start/end applying to all of them, or a POST body
+# {"requests": [{"resource": "orders", "since": ..., "start": ..., "end": ...}, "products"]}.
+# Returns [(resource, since, start, end)]; raises ValueError for a bad request.
+def parse_batch_requests(request):
+    if request.method == 'POST':
+        entries = json.loads(request.body).get('requests')
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("requests must be a non-empty list")
+        entries = [entry if isinstance(entry, dict) else {'resource': entry} for entry in entries]
+    else:
+        names = [name.strip() for name in request.GET.get('resources', '').split(',') if name.strip()]
+        if not names:
+            raise ValueError("resources is required, e.g. ?resources=products,warehouses")
+        entries = [{'resource': name, 'since': request.GET.get('since'),
+                    'start': request.GET.get('start'), 'end': request.GET.get('end')} for name in names]
+
+    sub_requests = []
+    for entry in entries:
+        name = entry.get('resource')
+        if name not in BATCH_RESOURCES:
+            raise ValueError(f"Unknown resource '{name}'. Use one of: {', '.join(BATCH_RESOURCES)}")
+        if any(name == seen for seen, *_ in sub_requests):
+            raise ValueError(f"Resource '{name}' is requested more than once")
+        start, end = parse_date_values(entry.get('start'), entry.get('end'))
+        sub_requests.append((name, parse_since_value(entry.get('since')), start, end))
+    return sub_requests
+
+
+# Helper function to build every list of a batch from one set of lookup maps
+def render_batch(request, sub_requests):
+    lookups = Lookups()  # Categories, suppliers, products and warehouses are read once for all lists
+    sync_started = timezone.now()  # Taken before any rows are read, as in the list views
+    document = {}
+    failed = False
+    for name, since, start, end in sub_requests:
+        key, sync_table, _, build = BATCH_RESOURCES[name]
+        try:
+            document[name] = {key: build(lookups, since, start, end)}
+            if sync_table:
+                document[name].update(sync_fields(sync_table, since, sync_started))
+        except Exception as e:
+            document[name] = {"error": str(e)}  # The other lists are still returned
+            failed = True
+    return JsonResponse(document, status=500 if failed else 200)
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET", "POST"])  # GET with ?resources=, or POST a list of sub-requests
+def get_batch(request):
+    """Build several list responses in one request, sharing the lookup queries between them"""
+    try:
+        sub_requests = parse_batch_requests(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # A plain GET of lists whose tables all bump a data version is cached like the list endpoints
+    tables = set()
+    for name, since, start, end in sub_requests:
+        cache_tables = BATCH_RESOURCES[name][2]
+        if cache_tables is None or since or start or end:
+            tables = None
+            break
+        tables.update(cache_tables)
+    if request.method == 'GET' and tables:
+        return cached_response(*sorted(tables), vary_on_query=True)(render_batch)(request, sub_requests)
+    return render_batch(request, sub_requests)
+
+# ==================== SALES REPORT VIEWS ====================
+REPORT_BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_sales_report(request):
+    """Units and revenue per day/week/month, read from the daily rollup tables"""
+    try:
+        bucket = request.GET.get('bucket', 'day')  # day, week or month
+        group = request.GET.get('group', 'product')  # product or warehouse
+        if bucket not in REPORT_BUCKETS:
+            return JsonResponse({"error": "bucket must be one of day, week, month"}, status=400)
+        if group not in ('product', 'warehouse'):
+            return JsonResponse({"error": "group must be product or warehouse"}, status=400)
+
+        model, key = (DailyProductSales, 'product_id') if group == 'product' else (DailyWarehouseSales, 'warehouse_id')
+        rows = model.objects.all()
+        if request.GET.get('start'):
+            rows = rows.filter(sales_date__gte=date.fromisoformat(request.GET['start']))
+        if request.GET.get('end'):
+            rows = rows.filter(sales_date__lte=date.fromisoformat(request.GET['end']))
+        if request.GET.get('id'):
+            rows = rows.filter(**{key: parse_prefixed_id(request.GET['id'], 'P' if group == 'product' else 'W')})
+
+        buckets = (rows.annotate(period=REPORT_BUCKETS[bucket]('sales_date'))
+                   .values('period', key)
+                   .annotate(units=Sum('units'), revenue=Sum('revenue'))
+                   .order_by('period', key))
+
+        report = []
+        for row in buckets:
+            period = row['period']
+            report.append({
+                "period": (period.date() if isinstance(period, datetime) else period).isoformat(),  # Start of bucket
+                "productId" if group == 'product' else "warehouseId": row[key],
+                "units": row['units'],
+                "revenue": f"₱{float(row['revenue']):,.2f}",  # Revenue formatted with peso sign
+                "revenueValue": float(row['revenue']),  # Raw number for charts
+            })
+
+        return JsonResponse({"bucket": bucket, "group": group, "sales": report})
+    except ValueError as e:
+        return JsonResponse({"error": f"Invalid date or ID: {str(e)}"}, status=400)
+    except Exception as e:
+        # If any error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=500)
+
+# ==================== FORECAST VIEWS ====================
+SUGGESTION_LIMIT = 500  # Suggestions returned when no limit is given
+SUGGESTION_MAX_LIMIT = 5000
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_reorder_suggestions(request):
+    """Forecast daily demand for every product and suggest reorder quantities"""
+    try:
+        def number(name, cast):
+            return cast(request.GET[name]) if request.GET.get(name) else None
+
+        limit = number('limit', int)
+        if limit is None:
+            limit = SUGGESTION_LIMIT
+        if not 1 <= limit <= SUGGESTION_MAX_LIMIT:
+            return JsonResponse({"error": f"limit must be between 1 and {SUGGESTION_MAX_LIMIT}"}, status=400)
+
+        params, all_ids, daily, stock, cover, reorder = forecasting.reorder_suggestions(
+            method=request.GET.get('method'),  # 'ses' (default) or 'sma'
+            alpha=number('alpha', float),
+            window=number('window', int),
+            history_days=number('history', int),
+            lead_time_days=number('lead_time', int),
+            review_days=number('review', int),
+            service_z=number('z', float),
+        )
+        rows = forecasting.suggestion_rows(
+            all_ids, daily, stock, cover, reorder,
+            only_reorder=request.GET.get('only_reorder') in ('1', 'true'),
+            limit=limit,
+        )
+        return JsonResponse({"parameters": params, "productCount": len(all_ids), "suggestions": rows})
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+# ==================== ANALYTICS VIEWS ====================
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+@cached_response('inventory', 'products', 'categories', 'warehouses', 'daily_product_sales', vary_on_query=True)  # Recomputed only when the data changes
+def get_inventory_analytics(request):
+    """Stock valuation per warehouse and category, plus ABC classification by revenue"""
+    try:
+        days = int(request.GET.get('days', 365))  # Revenue window for the ABC split
+        if days < 1:
+            return JsonResponse({"error": "days must be positive"}, status=400)
+        return JsonResponse({
+            "valuation": analytics.inventory_valuation(),
+            "abc": analytics.abc_classification(days),
+        })
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+# ==================== BACKGROUND JOB VIEWS ====================
+def serialize_job(job):
+    return {
+        "id": f"J{str(job.job_id).zfill(3)}",  # Custom job ID with leading zeros
+        "job_id": job.job_id,  # Database job ID
+        "type": job.job_type,  # Handler name
+        "status": job.status,  # queued, running, succeeded, failed or cancelled
+        "progress": job.progress,  # Percent complete
+        "message": job.message or "",  # Latest progress or result message
+        "cancelRequested": job.cancel_requested,
+        "hasResult": bool(job.result_file),  # True when a file can be downloaded
+        "createdAt": format_datetime_12hr(job.created_at),
+        "startedAt": format_datetime_12hr(job.started_at),
+        "finishedAt": format_datetime_12hr(job.finished_at),
+    }
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_jobs(request):
+    """Get the most recent background jobs"""
+    try:
+        job_list = [serialize_job(job) for job in BackgroundJob.objects.order_by('-job_id')[:100]]
+        return JsonResponse({"jobs": job_list, "jobTypes": sorted(jobs.JOB_HANDLERS)})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def create_job(request):
+    """Queue a background job; `manage.py run_jobs` picks it up"""
+    try:
+        data = json.loads(request.body)
+        job = jobs.submit(data.get('type'), data.get('params') or {})
+        return JsonResponse({"success": True, "job": serialize_job(job)}, status=202)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def create_import_job(request):
+    """Queue an inventory import from a warehouse_id,sku,counted CSV body (?apply=false leaves it for review)"""
+    try:
+        if 'csv' not in request.content_type:
+            return JsonResponse({"error": "Upload the import as text/csv"}, status=400)
+        # Streamed to disk in chunks: an import can be far larger than DATA_UPLOAD_MAX_MEMORY_SIZE
+        name = jobs.save_upload(iter(lambda: request.read(64 * 1024), b''), '.csv')
+        params = {
+            'file': name,
+            'apply': request.GET.get('apply', 'true').lower() not in ('0', 'false'),
+            'note': request.GET.get('note'),
+        }
+        job = jobs.submit('import_inventory', params)
+        return JsonResponse({"success": True, "job": serialize_job(job)}, status=202)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_job(request, job_id):
+    """Get the status and progress of one job"""
+    try:
+        job = BackgroundJob.objects.get(job_id=job_id)
+        return JsonResponse({"job": serialize_job(job)})
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def cancel_job(request, job_id):
+    """Cancel a queued job, or ask a running job to stop at its next progress check"""
+    try:
+        job = BackgroundJob.objects.get(job_id=job_id)
+        if job.status in ('succeeded', 'failed', 'cancelled'):
+            return JsonResponse({"error": f"Job already {job.status}"}, status=409)
+        # A queued job is cancelled immediately; a running one when the handler next checks
+        BackgroundJob.objects.filter(job_id=job_id, status='queued').update(
+            status='cancelled', message='Cancelled', finished_at=timezone.now(),
+        )
+        BackgroundJob.objects.filter(job_id=job_id).update(cancel_requested=True)
+        job.refresh_from_db()
+        return JsonResponse({"success": True, "job": serialize_job(job)})
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def download_job_result(request, job_id):
+    """Download the file produced by a finished job"""
+    try:
+        job = BackgroundJob.objects.get(job_id=job_id)
+        if job.status != 'succeeded' or not job.result_file:
+            return JsonResponse({"error": "Job has no result to download"}, status=404)
+        path = jobs.results_dir() / job.result_file
+        if not path.is_file():
+            return JsonResponse({"error": "Result file no longer exists"}, status=410)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=job.result_file)
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+# ==================== STOCKTAKE VIEWS ====================
+def serialize_stocktake(stocktake):
+    return {
+        "id": f"ST{str(stocktake.stocktake_id).zfill(3)}",  # Custom stocktake ID with leading zeros
+        "stocktake_id": stocktake.stocktake_id,
+        "status": stocktake.status,
+        "fullCount": stocktake.full_count,
+        "note": stocktake.note or "",
+        "lineCount": stocktake.line_count,
+        "createdAt": format_datetime_12hr(stocktake.created_at),
+        "appliedAt": format_datetime_12hr(stocktake.applied_at),
+    }
+
+
+# Read count lines from a CSV body (warehouse_id,sku,counted header) or a JSON body
+# ({"lines": [{"warehouseId", "sku", "counted"}], "fullCount", "note"}).
+# The body is read as a stream: a 200k-line count is larger than DATA_UPLOAD_MAX_MEMORY_SIZE.
+def parse_stocktake_upload(request):
+    warehouse_ids, skus, counted = [], [], []
+    if 'csv' in request.content_type:
+        # Iterating the request yields the body line by line; utf-8-sig drops a leading BOM
+        warehouse_ids, skus, counted = read_count_csv(line.decode('utf-8-sig') for line in request)
+        options = request.GET  # CSV uploads pass fullCount and note in the query string
+    else:
+        options = json.load(request)
+        for line in options.get('lines') or []:
+            warehouse_ids.append(parse_prefixed_id(line['warehouseId'], 'W'))
+            skus.append(str(line['sku']).strip())
+            counted.append(int(line['counted']))
+    if not skus:
+        raise ValueError("No count lines uploaded")
+    if any(quantity < 0 for quantity in counted):
+        raise ValueError("Counted quantities cannot be negative")
+    full_count = str(options.get('fullCount', '')).lower() in ('1', 'true')
+    return warehouse_ids, skus, counted, full_count, options.get('note')
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def upload_stocktake(request):
+    """Upload counted quantities and compute variances against system stock"""
+    try:
+        warehouse_ids, skus, counted, full_count, note = parse_stocktake_upload(request)
+        stocktake, summary, unknown = create_stocktake(warehouse_ids, skus, counted, full_count, note)
+        return JsonResponse({
+            "success": True,
+            "stocktake": serialize_stocktake(stocktake),
+            "summary": summary,
+            "unknownSkus": unknown[:100],  # SKUs that match no product were skipped
+            "unknownSkuCount": len(unknown),
+        }, status=201)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid stocktake upload: {str(e)}"}, status=400)
+    except Exception as e:
+        # If any other error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_stocktake(request, stocktake_id):
+    """Stocktake summary and its largest variances by value"""
+    try:
+        stocktake = Stocktake.objects.get(stocktake_id=stocktake_id)
+        limit = int(request.GET.get('limit', 100))  # Variance lines returned
+        lines = (StocktakeLine.objects.filter(stocktake_id=stocktake_id).exclude(variance=0)
+                 .annotate(abs_value=Abs(ExpressionWrapper(F('variance') * F('unit_cost'), output_field=DecimalField(max_digits=16, decimal_places=2))))
+                 .order_by('-abs_value')[:limit])
+        variances = [{
+            "lineId": line.stocktake_line_id,
+            "warehouseId": line.warehouse_id,
+            "productId": line.product_id,
+            "counted": line.counted_quantity,
+            "system": line.system_quantity,
+            "variance": line.variance,
+            "varianceValue": round(float(line.variance * line.unit_cost), 2),
+            "applied": line.applied,
+        } for line in lines]
+        return JsonResponse({
+            "stocktake": serialize_stocktake(stocktake),
+            "summary": stocktake_summary(stocktake_id),
+            "variances": variances,
+        })
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Stocktake not found"}, status=404)
+    except Exception as e:
+        # If any other error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=500)
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+@idempotent  # Retries with the same Idempotency-Key replay the first response
+def approve_stocktake(request, stocktake_id):
+    """Apply approved variances to inventory; {"lineIds": [...]} applies only those lines"""
+    try:
+        data = json.loads(request.body) if request.body else {}
+        line_ids = [int(i) for i in data['lineIds']] if data.get('lineIds') is not None else None
+    except (TypeError, ValueError) as e:
+        return JsonResponse({"error": f"Invalid lineIds: {str(e)}"}, status=400)
+    try:
+        applied = apply_stocktake(stocktake_id, line_ids=line_ids)
+        publish_on_commit('stocktake.applied', {'stocktake_id': stocktake_id, 'lines': applied})
+        return JsonResponse({"success": True, "message": f"Applied {applied} inventory adjustments", "applied": applied})
+    except ObjectDoesNotExist:
+        return JsonResponse({"error": "Stocktake not found"}, status=404)
+    except (ValueError, InsufficientStockError) as e:
+        # Already applied, or a count would undercut units reserved for hot-SKU sales
+        return JsonResponse({"error": str(e)}, status=409)
+    except Exception as e:
+        # If any other error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=400)
+
+# ==================== SKU LOOKUP VIEWS ====================
+SKU_LOOKUP_MAX_BATCH = 1000  # SKUs accepted by one batch lookup
+
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_sku(request, sku):
+    """Resolve one scanned SKU to its product and per-warehouse stock"""
+    entry = sku_index.lookup(sku)  # In-memory index, no query unless a write invalidated it
+    if entry is None:
+        return JsonResponse({"error": "SKU not found"}, status=404)
+    return JsonResponse(entry)
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["POST"])  # Only allow POST requests
+def lookup_skus(request):
+    """Resolve up to SKU_LOOKUP_MAX_BATCH SKUs sent as {"skus": [...]}"""
+    try:
+        skus = json.loads(request.body).get('skus')
+        if not isinstance(skus, list) or not skus:
+            return JsonResponse({"error": "skus must be a non-empty list"}, status=400)
+        if len(skus) > SKU_LOOKUP_MAX_BATCH:
+            return JsonResponse({"error": f"At most {SKU_LOOKUP_MAX_BATCH} SKUs per request"}, status=400)
+        found, missing = sku_index.lookup_many(skus)
+        return JsonResponse({"results": found, "missing": missing})
+    except Exception as e:
+        # If any error occurs, return an error message
+        return JsonResponse({"error": str(e)}, status=400)
+
+# ==================== PROFILE VIEWS ====================
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_profiles(request):
+    """List stored request profiles, newest first"""
+    if not profiling.is_authorized(request):
+        return JsonResponse({"error": "Profiling token required"}, status=403)
+    return JsonResponse({"profiles": profiling.list_profiles()})
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def get_profile(request, profile_id):
+    """Summary of one profile: timing, SQL log and slowest functions"""
+    if not profiling.is_authorized(request):
+        return JsonResponse({"error": "Profiling token required"}, status=403)
+    path = profiling.profile_path(profile_id, '.json')
+    if path is None:
+        return JsonResponse({"error": "Profile not found"}, status=404)
+    return HttpResponse(path.read_bytes(), content_type='application/json')
+
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET"])  # Only allow GET requests
+def download_profile(request, profile_id):
+    """Download the raw cProfile stats file (open with pstats or snakeviz)"""
+    if not profiling.is_authorized(request):
+        return JsonResponse({"error": "Profiling token required"}, status=403)
+    path = profiling.profile_path(profile_id, '.prof')
+    if path is None:
+        return JsonResponse({"error": "Profile not found"}, status=404)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+# ==================== SLOW QUERY LOG VIEWS ====================
+@csrf_exempt  # Allow requests without CSRF token (for API use)
+@require_http_methods(["GET", "DELETE"])  # GET to read the log, DELETE to clear it
+def slow_query_log(request):
+    """Queries slower than SLOW_QUERY_THRESHOLD_MS with their EXPLAIN plans, newest first"""
+    if not profiling.is_authorized(request):
+        return JsonResponse({"error": "Profiling token required"}, status=403)
+    if request.method == 'DELETE':
+        slow_queries.clear()
+        return JsonResponse({"success": True, "message": "Slow query log cleared"})
+    rows = slow_queries.entries(view=request.GET.get('view'))  # Optional filter, e.g. ?view=get_inventory
+    return JsonResponse({"thresholdMs": slow_queries.threshold_ms(), "count": len(rows), "queries": rows})
+
+# ==================== LIVE EVENT STREAM ====================
+SSE_HEARTBEAT_SECONDS = 15  # Comment line sent when idle so proxies keep the connection open
+
+
+@require_http_methods(["GET"])
+def event_stream(request):
+    """Stream inventory and order changes to the browser as Server-Sent Events.
+
+    Under ASGI (myBackend/asgi.py, e.g. uvicorn) open streams wait on the event
+    loop. Under WSGI each open stream holds one worker thread, which is why
+    gunicorn.conf.py runs threaded workers.
+    """
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    async def messages():
+        # Subscribing reads the outbox (Last-Event-ID replay), which cannot run on the event loop
+        subscriber = await sync_to_async(broadcaster.subscribe)(last_event_id, loop=asyncio.get_running_loop())
+        _, queue = subscriber
+        try:
+            yield "retry: 3000\n\n"  # Tell EventSource how long to wait before reconnecting
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    # Django buffers a whole async iterator under WSGI (and a sync one under ASGI), which
+    # never ends for a stream, so the worker thread waits on a plain queue under WSGI
+    def thread_messages():
+        subscriber = broadcaster.subscribe(last_event_id)
+        _, queue = subscriber
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    stream = messages() if isinstance(request, ASGIRequest) else thread_messages()
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable nginx buffering for this response
+    return response
+
 # ==================== USER VIEWS ====================
 @csrf_exempt  # Allow requests without CSRF token (for API use)
 @require_http_methods(["GET"])  # Only allow GET requests
@@ -1026,6 +2129,7 @@ def delete_user(request, user_id):
     try:
         user = User.objects.get(user_id=user_id)  # Find the user by its ID
         user.delete()  # Delete the user from the database
+        record_deletion('users', user_id)  # Tombstone for delta-sync clients
         # Return a success message
         return JsonResponse({"success": True, "message": "User deleted successfully"})
     except ObjectDoesNotExist:
@@ -1044,8 +2148,7 @@ def update_product_category(request, product_id):
         try:
             product = Product.objects.get(pk=product_id)  # Find the product by its primary key
             Category.objects.get(pk=category_id)  # Verify the category exists
-            product.category_id = category_id  # Set the product's category_id to the new category ID
-            product.save()  # Save the updated product to the database
+            save_changes(product, {'category_id': int(category_id)})  # Write only category_id and bump the version
             return JsonResponse({'status': 'success'})  # Return success response
         except (Product.DoesNotExist, Category.DoesNotExist):
             # If either the product or category does not exist, return an error
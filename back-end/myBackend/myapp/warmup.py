@@ -0,0 +1,82 @@
+"""
+Worker warm-up.
+
+A freshly booted worker pays for importing the views, connecting to MySQL and
+filling empty caches on its first request. warm_up() does that work up front:
+gunicorn.conf.py calls it from post_worker_init, before the worker accepts
+connections, and the `startup_profile` command times each phase.
+
+Phases:
+
+- import:   import the URL conf, views and the modules they load lazily
+- connect:  open a connection to every configured database
+- prime:    GET each path in settings.WARMUP_PATHS once, which fills the
+            response cache of the cached read endpoints, and build the SKU
+            index used by the scanner lookups
+"""
+
+import importlib
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import resolve
+
+DEFAULT_WARMUP_PATHS = ['/api/products/', '/api/inventory/', '/api/categories/',
+                        '/api/suppliers/', '/api/warehouses/']
+
+# Modules imported on first use by views, jobs or the middleware
+WARMUP_MODULES = ['myBackend.urls', 'myapp.views', 'myapp.jobs', 'myapp.forecasting', 'myapp.analytics']
+
+
+def warmup_paths():
+    return list(getattr(settings, 'WARMUP_PATHS', DEFAULT_WARMUP_PATHS))
+
+
+def import_modules():
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+
+
+def connect_databases():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def request_path(path):
+    """Run one GET through the view for path (skipping middleware) and return its status code"""
+    match = resolve(path)
+    request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING='gzip, br')
+    return match.func(request, *match.args, **match.kwargs).status_code
+
+
+def prime_caches():
+    from .sku_index import sku_index
+    for path in warmup_paths():
+        request_path(path)
+    sku_index.refresh()
+
+
+PHASES = [
+    ('import', import_modules),
+    ('connect', connect_databases),
+    ('prime', prime_caches),
+]
+
+
+def warm_up(logger=None):
+    """Run every warm-up phase and return {phase: seconds}; a failing phase is logged, not raised"""
+    timings = {}
+    for name, phase in PHASES:
+        started = time.perf_counter()
+        try:
+            phase()
+        except Exception as e:
+            if logger:
+                logger.warning("Warm-up phase %s failed: %s", name, e)
+        timings[name] = time.perf_counter() - started
+    if logger:
+        logger.info("Worker warmed up in %.3fs (%s)", sum(timings.values()),
+                    ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()))
+    return timings
@@ -0,0 +1,9 @@
+-- Record when an Idempotency-Key was claimed, so a claim left by a worker that
+-- died mid-request can be taken over after IDEMPOTENCY_CLAIM_TIMEOUT seconds
+-- instead of blocking the key until the row expires
+-- Run this in your MySQL database
+
+ALTER TABLE idempotency_keys
+ADD COLUMN claimed_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6);
+
+UPDATE idempotency_keys SET claimed_at = created_at;
@@ -0,0 +1,22 @@
+-- Enforce one inventory row per (product, warehouse) pair
+-- Stock transfers upsert the destination row and rely on this key
+-- Run this in your MySQL database
+
+-- Merge any duplicate rows into the lowest inventory_id first
+UPDATE inventory keep_row
+JOIN (
+    SELECT product_id, warehouse_id, MIN(inventory_id) AS keep_id, SUM(quantity) AS total_quantity
+    FROM inventory
+    GROUP BY product_id, warehouse_id
+    HAVING COUNT(*) > 1
+) dup ON keep_row.inventory_id = dup.keep_id
+SET keep_row.quantity = dup.total_quantity;
+
+DELETE extra_row FROM inventory extra_row
+JOIN inventory keep_row
+  ON keep_row.product_id = extra_row.product_id
+ AND keep_row.warehouse_id = extra_row.warehouse_id
+ AND keep_row.inventory_id < extra_row.inventory_id;
+
+ALTER TABLE inventory
+ADD UNIQUE KEY uq_inventory_product_warehouse (product_id, warehouse_id);
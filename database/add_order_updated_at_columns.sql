@@ -0,0 +1,20 @@
+-- Add updated_at to orders and order_items so delta sync (?since=) returns
+-- orders whose status or total changed and items added to older orders,
+-- not only orders placed since the last sync. Existing rows get the time of
+-- this migration, so every client re-syncs them once.
+-- Run this in your MySQL database
+
+ALTER TABLE orders
+ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+ADD INDEX idx_orders_updated_at (updated_at);
+
+ALTER TABLE order_items
+ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+ADD INDEX idx_order_items_updated_at (updated_at);
+
+-- The archive keeps the value the row had when it was moved
+ALTER TABLE orders_archive
+ADD COLUMN updated_at DATETIME NULL;
+
+ALTER TABLE order_items_archive
+ADD COLUMN updated_at DATETIME NULL;
@@ -0,0 +1,12 @@
+-- Add rollup columns to stock_reservation_uses
+-- Hot-SKU sales journal their daily_product_sales / daily_warehouse_sales
+-- contribution here, and the reservation flush books it in bulk, so a sale
+-- no longer locks the day's rollup rows. Rows written before this script
+-- keep NULLs: their sales already updated the rollups.
+-- Run this in your MySQL database
+
+ALTER TABLE stock_reservation_uses
+    ADD COLUMN product_id INT NULL AFTER quantity,
+    ADD COLUMN warehouse_id INT NULL AFTER product_id,
+    ADD COLUMN sales_date DATE NULL AFTER warehouse_id,
+    ADD COLUMN unit_price DECIMAL(10, 2) NULL AFTER sales_date;
@@ -0,0 +1,10 @@
+-- Add version columns for optimistic concurrency on products and inventory
+-- Every write increments version; updates send the version they read (If-Match)
+-- and are rejected with 409 Conflict when the row has changed since
+-- Run this in your MySQL database (and on every inventory shard)
+
+ALTER TABLE products
+ADD COLUMN version INT NOT NULL DEFAULT 1;
+
+ALTER TABLE inventory
+ADD COLUMN version INT NOT NULL DEFAULT 1;
@@ -0,0 +1,18 @@
+-- Create background_jobs table used by the job API and `manage.py run_jobs`
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    job_type VARCHAR(64) NOT NULL,
+    params TEXT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    progress INT NOT NULL DEFAULT 0,
+    message VARCHAR(255) NULL,
+    result_file VARCHAR(255) NULL,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME NULL,
+    heartbeat_at DATETIME NULL,
+    finished_at DATETIME NULL,
+    INDEX idx_background_jobs_status (status, job_id)
+);
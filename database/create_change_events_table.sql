@@ -0,0 +1,13 @@
+-- Create change_events table: outbox for the /api/events/ Server-Sent Events stream
+-- Writers in any process insert an event after their transaction commits; each
+-- process serving streams polls for rows newer than the last one it delivered.
+-- Rows older than EVENT_RETENTION_SECONDS are deleted by the pollers and run_jobs
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS change_events (
+    event_id INT AUTO_INCREMENT PRIMARY KEY,
+    event VARCHAR(64) NOT NULL,
+    data TEXT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_change_events_created_at (created_at)
+);
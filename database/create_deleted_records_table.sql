@@ -0,0 +1,19 @@
+-- Create deleted_records table used as tombstones for delta sync
+-- List endpoints called with ?since= return the IDs deleted after that time
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS deleted_records (
+    deleted_record_id INT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    record_id INT NOT NULL,
+    deleted_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_deleted_records_table_time (table_name, deleted_at)
+);
+
+-- Indexes so ?since= filters do not scan the whole table
+CREATE INDEX idx_products_updated_at ON products (updated_at);
+CREATE INDEX idx_suppliers_updated_at ON suppliers (updated_at);
+CREATE INDEX idx_warehouses_updated_at ON warehouses (updated_at);
+CREATE INDEX idx_inventory_last_updated ON inventory (last_updated);
+CREATE INDEX idx_orders_order_date ON orders (order_date);
+CREATE INDEX idx_order_items_order_id ON order_items (order_id);
@@ -0,0 +1,13 @@
+-- Create id_sequences table that hands out inventory IDs while inventory is
+-- split across warehouse shards (myapp/sharding.py); each shard's own
+-- auto_increment would start from 1 and reuse IDs other shards hold
+-- Run this in your MySQL database (the one 'default' points at), then
+-- `python manage.py setup_inventory_shards` raises the counter past every shard's rows
+
+CREATE TABLE IF NOT EXISTS id_sequences (
+    name VARCHAR(64) PRIMARY KEY,
+    next_value BIGINT NOT NULL
+);
+
+INSERT IGNORE INTO id_sequences (name, next_value)
+SELECT 'inventory', COALESCE(MAX(inventory_id), 0) + 1 FROM inventory;
@@ -0,0 +1,12 @@
+-- Create idempotency_keys table used to replay responses for retried requests
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    `key` CHAR(64) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    status_code INT NULL,
+    content_type VARCHAR(100) NULL,
+    response_body LONGBLOB NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_idempotency_keys_created_at (created_at)
+);
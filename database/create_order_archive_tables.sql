@@ -0,0 +1,36 @@
+-- Create archive tables for old orders, their items and warehouse allocations
+-- `manage.py archive_orders` moves orders older than ORDER_ARCHIVE_DAYS here
+-- Rows keep their original IDs
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS orders_archive (
+    order_id INT PRIMARY KEY,
+    order_date DATETIME NOT NULL,
+    supplier_id INT NULL,
+    customer_name VARCHAR(255) NULL,
+    status VARCHAR(50) NULL,
+    total_amount DECIMAL(10, 2) NULL,
+    INDEX idx_orders_archive_order_date (order_date)
+);
+
+CREATE TABLE IF NOT EXISTS order_items_archive (
+    order_item_id INT PRIMARY KEY,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10, 2) NOT NULL,
+    subtotal DECIMAL(10, 2) NULL,
+    INDEX idx_order_items_archive_order_id (order_id)
+);
+
+CREATE TABLE IF NOT EXISTS order_item_allocations_archive (
+    allocation_id INT PRIMARY KEY,
+    order_item_id INT NOT NULL,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    inventory_id INT NOT NULL,
+    warehouse_id INT NOT NULL,
+    quantity INT NOT NULL,
+    INDEX idx_allocations_archive_order_item (order_item_id),
+    INDEX idx_allocations_archive_order (order_id)
+);
@@ -0,0 +1,14 @@
+-- Create order_item_allocations table recording which warehouses supplied each order item
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS order_item_allocations (
+    allocation_id INT AUTO_INCREMENT PRIMARY KEY,
+    order_item_id INT NOT NULL,
+    order_id INT NOT NULL,
+    product_id INT NOT NULL,
+    inventory_id INT NOT NULL,
+    warehouse_id INT NOT NULL,
+    quantity INT NOT NULL,
+    INDEX idx_allocations_order_item (order_item_id),
+    INDEX idx_allocations_order (order_id)
+);
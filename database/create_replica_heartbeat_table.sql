@@ -0,0 +1,11 @@
+-- Create replica_heartbeat table used to measure read-replica lag
+-- `manage.py replica_heartbeat` rewrites the row on the primary; replicas that
+-- fall more than REPLICA_MAX_LAG_SECONDS behind stop receiving reads
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS replica_heartbeat (
+    heartbeat_id INT PRIMARY KEY,
+    beat_at DATETIME(6) NOT NULL
+);
+
+INSERT IGNORE INTO replica_heartbeat (heartbeat_id, beat_at) VALUES (1, UTC_TIMESTAMP(6));
@@ -0,0 +1,21 @@
+-- Create daily sales rollup tables used by /api/reports/sales/
+-- Run this in your MySQL database, then fill them with:
+--   python manage.py rebuild_sales_rollups
+
+CREATE TABLE IF NOT EXISTS daily_product_sales (
+    rollup_id INT AUTO_INCREMENT PRIMARY KEY,
+    sales_date DATE NOT NULL,
+    product_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    UNIQUE KEY uq_daily_product_sales (sales_date, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS daily_warehouse_sales (
+    rollup_id INT AUTO_INCREMENT PRIMARY KEY,
+    sales_date DATE NOT NULL,
+    warehouse_id INT NOT NULL,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    UNIQUE KEY uq_daily_warehouse_sales (sales_date, warehouse_id)
+);
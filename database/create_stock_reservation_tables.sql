@@ -0,0 +1,27 @@
+-- Create stock_reservations and stock_reservation_uses tables for hot-SKU sales
+-- A reservation holds units of an inventory row for one worker; each sale made
+-- from it is journalled as a use and flushed to inventory in batches
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    reservation_id INT AUTO_INCREMENT PRIMARY KEY,
+    owner VARCHAR(100) NOT NULL,
+    inventory_id INT NOT NULL,
+    product_id INT NOT NULL,
+    warehouse_id INT NOT NULL,
+    reserved INT NOT NULL,
+    expires_at DATETIME(6) NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_stock_reservations_owner_inventory (owner, inventory_id),
+    INDEX idx_stock_reservations_inventory (inventory_id),
+    INDEX idx_stock_reservations_expires (expires_at)
+);
+
+CREATE TABLE IF NOT EXISTS stock_reservation_uses (
+    use_id INT AUTO_INCREMENT PRIMARY KEY,
+    reservation_id INT NOT NULL,
+    inventory_id INT NOT NULL,
+    quantity INT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_stock_reservation_uses_reservation (reservation_id)
+);
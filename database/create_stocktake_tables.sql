@@ -0,0 +1,26 @@
+-- Create stocktakes and stocktake_lines tables for physical count uploads
+-- Each line stores the counted quantity next to the system quantity at upload time
+-- Run this in your MySQL database
+
+CREATE TABLE IF NOT EXISTS stocktakes (
+    stocktake_id INT AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'open',
+    full_count BOOLEAN NOT NULL DEFAULT FALSE,
+    note VARCHAR(255) NULL,
+    line_count INT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    applied_at DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS stocktake_lines (
+    stocktake_line_id INT AUTO_INCREMENT PRIMARY KEY,
+    stocktake_id INT NOT NULL,
+    warehouse_id INT NOT NULL,
+    product_id INT NOT NULL,
+    counted_quantity INT NOT NULL,
+    system_quantity INT NOT NULL,
+    variance INT NOT NULL,
+    unit_cost DECIMAL(10, 2) NOT NULL DEFAULT 0,
+    applied BOOLEAN NOT NULL DEFAULT FALSE,
+    INDEX idx_stocktake_lines_stocktake (stocktake_id, variance)
+);
@@ -3,31 +3,27 @@
 import { useState, useEffect } from 'react';
 import { Button } from '@/components/ui/button';
 import SalesForm from './SalesForm';
-import { getOrders, getOrderItems, Order, OrderItem, getProducts, Product } from '@/lib/api';
+import { getOrdersWithItems, OrderWithItems } from '@/lib/api';
 
 export default function SalesPage() {
     const [isFormOpen, setIsFormOpen] = useState(false);
-    const [orders, setOrders] = useState<Order[]>([]);
-    const [orderItems, setOrderItems] = useState<OrderItem[]>([]);
-    const [products, setProducts] = useState<Product[]>([]);
+    const [orders, setOrders] = useState<OrderWithItems[]>([]);
+    const [page, setPage] = useState(1);
+    const [totalPages, setTotalPages] = useState(1);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
 
     useEffect(() => {
         fetchData();
-    }, []);
+    }, [page]);
 
     const fetchData = async () => {
         try {
             setLoading(true);
-            const [ordersData, itemsData, productsData] = await Promise.all([
-                getOrders(),
-                getOrderItems(),
-                getProducts()
-            ]);
-            setOrders(ordersData.orders || []);
-            setOrderItems(itemsData.orderItems || []);
-            setProducts(productsData.products || []);
+            // Orders come with their items and product names nested, one page at a time
+            const data = await getOrdersWithItems(page);
+            setOrders(data.orders || []);
+            setTotalPages(Math.max(1, data.totalPages || 1));
             setError(null);
         } catch (err: any) {
             setError(err.message);
@@ -37,18 +33,6 @@ export default function SalesPage() {
         }
     };
 
-    const getProductName = (productId: string) => {
-        const product = products.find(p => p.product_id.toString() === productId || p.id === productId);
-        return product?.name || 'Unknown Product';
-    };
-
-    const getOrderItemsForOrder = (orderId: number) => {
-        return orderItems.filter(item => {
-            const itemOrderId = typeof item.orderId === 'string' ? parseInt(item.orderId) : item.orderId;
-            return itemOrderId === orderId;
-        });
-    };
-
     if (loading) {
         return (
             <main className="p-4">
@@ -112,7 +96,7 @@ export default function SalesPage() {
                                 </tr>
                             ) : (
                                 orders.map((order) => {
-                                    const items = getOrderItemsForOrder(order.order_id);
+                                    const items = order.items;
                                     return (
                                         <tr key={order.order_id} className="hover:bg-gray-50">
                                             <td className="p-2 border text-center text-black">{order.id}</td>
@@ -139,7 +123,7 @@ export default function SalesPage() {
                                                     <div className="text-sm">
                                                         {items.map((item, idx) => (
                                                             <div key={idx} className="mb-1">
-                                                                {getProductName(item.productId)} × {item.quantity}
+                                                                {item.productName} × {item.quantity}
                                                             </div>
                                                         ))}
                                                     </div>
@@ -154,6 +138,15 @@ export default function SalesPage() {
                         </tbody>
                     </table>
                 </div>
+                <div className="flex justify-between items-center mt-4">
+                    <Button onClick={() => setPage(page - 1)} disabled={page <= 1}>
+                        Previous
+                    </Button>
+                    <span className="text-sm text-gray-600">Page {page} of {totalPages}</span>
+                    <Button onClick={() => setPage(page + 1)} disabled={page >= totalPages}>
+                        Next
+                    </Button>
+                </div>
             </div>
 
             <SalesForm
@@ -1,7 +1,7 @@
 'use client';
 
 import { useEffect, useState } from 'react';
-import { getInventory, getCategories, getProducts, getSuppliers, getWarehouses, updateProduct, createInventory, updateInventory, Inventory, Category, Product, Supplier, Warehouse } from '@/lib/api';
+import { getBatch, updateProduct, createInventory, updateInventory, Inventory, Category, Product, Supplier, Warehouse } from '@/lib/api';
 import Link from 'next/link';
 import { Button } from '@/components/ui/button';
 
@@ -25,21 +25,15 @@ export default function InventoryPage() {
         try {
             setLoading(true);
             setError(null);
-            const [invData, catData, prodData, suppData, wareData] = await Promise.all([
-                getInventory(),
-                getCategories(),
-                getProducts(),
-                getSuppliers(),
-                getWarehouses()
-            ]);
-            console.log('Inventory data:', invData);
-            console.log('Products data:', prodData);
-            // Try both possible keys for inventory
-            setInventory(invData.inventories || []);
-            setCategories(catData.categories || []);
-            setProducts(prodData.products || []);
-            setSuppliers(suppData.suppliers || []);
-            setWarehouses(wareData.warehouses || []);
+            // One request for all five lists
+            const data = await getBatch(['inventory', 'categories', 'products', 'suppliers', 'warehouses']);
+            console.log('Inventory data:', data.inventory);
+            console.log('Products data:', data.products);
+            setInventory(data.inventory?.inventories || []);
+            setCategories(data.categories?.categories || []);
+            setProducts(data.products?.products || []);
+            setSuppliers(data.suppliers?.suppliers || []);
+            setWarehouses(data.warehouses?.warehouses || []);
         } catch (err: any) {
             setError(err.message);
             console.error('Error fetching data:', err);
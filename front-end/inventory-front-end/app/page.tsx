@@ -1,7 +1,7 @@
 'use client';
 
 import { useState, useEffect } from 'react';
-import { getInventory, getProducts, getOrders, getOrderItems, getWarehouses, Inventory, Product, Order, OrderItem, Warehouse } from '@/lib/api';
+import { getBatch, Inventory, Product, Order, OrderItem, Warehouse } from '@/lib/api';
 import Link from 'next/link';
 
 export default function Dashboard() {
@@ -22,18 +22,13 @@ export default function Dashboard() {
 
   const fetchData = async () => {
     try {
-      const [invData, prodData, ordersData, itemsData, warehouseData] = await Promise.all([
-        getInventory(),
-        getProducts(),
-        getOrders(),
-        getOrderItems(),
-        getWarehouses()
-      ]);
-      setInventory(invData.inventories || []);
-      setProducts(prodData.products || []);
-      setOrders(ordersData.orders || []);
-      setOrderItems(itemsData.orderItems || []);
-      setWarehouses(warehouseData.warehouses || []);
+      // One request for all five lists
+      const data = await getBatch(['inventory', 'products', 'orders', 'order-items', 'warehouses']);
+      setInventory(data.inventory?.inventories || []);
+      setProducts(data.products?.products || []);
+      setOrders(data.orders?.orders || []);
+      setOrderItems(data['order-items']?.orderItems || []);
+      setWarehouses(data.warehouses?.warehouses || []);
     } catch (err) {
       console.error('Error fetching dashboard data:', err);
     } finally {
@@ -85,6 +85,10 @@ export interface OrderItem {
   createdAt?: string;
 }
 
+export interface OrderWithItems extends Order {
+  items: (OrderItem & { productName: string })[];
+}
+
 export interface User {
   id: string;
   user_id: number;
@@ -273,6 +277,15 @@ export async function getOrders(): Promise<{ orders: Order[] }> {
   return fetchFromBackend('/api/orders/');
 }
 
+// One page of orders, newest first, with their items nested
+export async function getOrdersWithItems(page = 1, pageSize = 50): Promise<{ orders: OrderWithItems[]; page: number; pageSize: number; total: number; totalPages: number }> {
+  return fetchFromBackend(`/api/orders/?include=items&page=${page}&pageSize=${pageSize}`);
+}
+
+export async function getOrder(orderId: number): Promise<{ order: OrderWithItems }> {
+  return fetchFromBackend(`/api/orders/${orderId}/`);
+}
+
 export async function createOrder(order: Omit<Order, 'id' | 'order_id' | 'orderDate' | 'createdAt' | 'updatedAt'>): Promise<{ success: boolean; order: Order }> {
   return fetchFromBackend('/api/orders/create/', {
     method: 'POST',
@@ -319,6 +332,23 @@ export async function deleteOrderItem(orderItemId: number): Promise<{ success: b
   });
 }
 
+// ==================== BATCH API ====================
+
+// Several lists in one request. Each key holds the same document as the list's own endpoint.
+export interface BatchResponse {
+  products?: { products: Product[] };
+  categories?: { categories: Category[] };
+  suppliers?: { suppliers: Supplier[] };
+  warehouses?: { warehouses: Warehouse[] };
+  inventory?: { inventories: Inventory[] };
+  orders?: { orders: Order[] };
+  'order-items'?: { orderItems: OrderItem[] };
+}
+
+export async function getBatch(resources: (keyof BatchResponse)[]): Promise<BatchResponse> {
+  return fetchFromBackend(`/api/batch/?resources=${resources.join(',')}`);
+}
+
 // ==================== USER API ====================
 
 export async function getUsers(): Promise<{ users: User[] }> {